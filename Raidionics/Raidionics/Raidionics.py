@@ -1,23 +1,10 @@
 from slicer.ScriptedLoadableModule import *
 import logging
-import json
-import platform
-import os
-import numpy
-import re
-import subprocess
-import shutil
-import threading
-from collections import OrderedDict
-from glob import glob
-from time import sleep
-from copy import deepcopy
 from __main__ import qt, ctk, slicer, vtk
 
-import SimpleITK as sitk
-import sitkUtils
-from src.RaidionicsLogic import *
-from src.gui.RaidionicsWidget import *
+# The heavy dependencies (numpy, SimpleITK, requests, gdown...) and the plugin code are only imported when the module
+# is opened for the first time, see RaidionicsWidget below, not when 3D Slicer starts.
+from src.utils.startup_profiler import StartupProfiler
 
 
 class Raidionics(ScriptedLoadableModule):
@@ -41,3 +28,28 @@ class Raidionics(ScriptedLoadableModule):
     self.parent.acknowledgementText = """
     This plugin is based upon the DeepInfer plugin (available at https://github.com/DeepInfer/Slicer-DeepInfer), 
     originally developed by Jean-Christophe Fillion-Robin, Kitware Inc. and Steve Pieper, Isomics, Inc.. """
+
+
+class RaidionicsWidget:
+  """
+  Lightweight entry point instantiated by 3D Slicer, importing and building the actual plugin widget
+  (src.gui.RaidionicsWidget) upon setup. Every other attribute is forwarded to the actual widget.
+  """
+  def __init__(self, parent=None):
+    self.parent = parent
+    self.widget = None
+
+  def setup(self):
+    profiler = StartupProfiler.getInstance()
+    with profiler.profile_imports('Import of the plugin code'):
+      from src.gui.RaidionicsWidget import RaidionicsWidget as RaidionicsMainWidget
+    with profiler.measure('Widget construction'):
+      self.widget = RaidionicsMainWidget(self.parent)
+    self.widget.setup()
+    profiler.log_report()
+
+  def __getattr__(self, name):
+    widget = self.__dict__.get('widget', None)
+    if widget is None:
+      raise AttributeError(name)
+    return getattr(widget, name)
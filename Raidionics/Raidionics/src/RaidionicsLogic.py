@@ -19,6 +19,7 @@ import shutil
 import threading
 import csv
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from time import sleep
 from copy import deepcopy
@@ -27,7 +28,11 @@ from __main__ import qt, ctk, slicer, vtk
 import SimpleITK as sitk
 import sitkUtils
 from src.utils.resources import SharedResources
-from src.utils.backend_utilities import generate_backend_config
+from src.utils.backend_utilities import generate_backend_config, get_pipeline_producers, get_model_version
+from src.utils.docker_utilities import docker_image_exists
+from src.logic.output_nodes_manager import OutputNodesManager
+from src.logic.results_workspace import ResultsWorkspace, compute_image_fingerprint
+from src.logic.cohort_store import CohortStore
 
 
 class RaidionicsLogic:
@@ -57,6 +62,10 @@ class RaidionicsLogic:
         self.file_extension_docker = '.nii.gz'
         self.logic_task = 'segmentation'  # segmentation or diagnosis (RADS) for now
         self.logic_target_space = "neuro_diagnosis"
+        self.staged_inputs = dict()  # Input name -> timestamp folder, staged file basename, and volume fingerprint
+        self.current_model_name = None
+        self.current_producers = dict()  # Structure class -> model (name and version) producing it in the pipeline
+        self.manual_labels = []  # Output structures manually provided for the current run
 
     def yieldPythonGIL(self, seconds=0):
         sleep(seconds)
@@ -156,6 +165,8 @@ class RaidionicsLogic:
             self.executeDocker(dockerName, modelName, dataPath, iodict, inputs, outputs, params, widgets)
             if not self.abort:
                 self.updateOutput(iodict, outputs, widgets)
+                if self.logic_task == 'diagnosis':
+                    self.__store_cohort_results()
                 # self.main_queue_stop()
                 self.stop_logic()
                 # self.cmdEndEvent()
@@ -223,7 +234,9 @@ class RaidionicsLogic:
         """
         Inspect the list of local Docker images. If the requested docker_image_name exists locally, the method will
         return True, otherwise False.
-        For an existing local image, a pull operation is performed to have an up-to-date version.
+        The inspection runs on a worker thread, the user interface being kept responsive meanwhile. A missing image is
+        obtained through the DownloadDialog, loading it from the Docker image tarball cache if possible, and pulling it
+        from the registry otherwise.
 
         Parameters
         ----------
@@ -235,18 +248,15 @@ class RaidionicsLogic:
         bool
             Boolean asserting whether the requested Docker image exists locally or not.
         """
-        result = False
-        cmd_docker = [self.dockerPath, 'image', 'inspect', docker_image_name]
-        p = subprocess.Popen(cmd_docker, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = p.communicate()
-
-        if 'Error: No such image' not in stderr.decode("utf-8"):
-            result = True
-        else:
-            # If the image exists already, we make sure it is up-to-date (minimal download time overhead)
-            cmd_docker = [self.dockerPath, 'pull', docker_image_name]
-            p = subprocess.Popen(cmd_docker, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            stdout, stderr = p.communicate()
+        results = []
+        thread = threading.Thread(target=lambda: results.append(docker_image_exists(self.dockerPath,
+                                                                                    docker_image_name)))
+        thread.daemon = True
+        thread.start()
+        while thread.is_alive():
+            slicer.app.processEvents()
+            thread.join(0.05)
+        result = len(results) != 0 and results[0]
 
         # res_lines = ""
         # while True:
@@ -288,6 +298,19 @@ class RaidionicsLogic:
 
         # if widgetPresent:
         #     self.cmdStartEvent()
+        # The inputs are read from the scene on the main thread, while their compressed export to disk is spread
+        # over a pool of threads (SimpleITK releases the GIL), and completed before starting the container.
+        input_export_jobs = dict()
+        input_node_names = dict()
+        manual_labels = dict()
+        self.staged_inputs = dict()
+        self.current_model_name = modelName
+        self.current_producers = get_pipeline_producers(iodict, self.logic_task, modelName)
+        if self.logic_task == 'segmentation':
+            # The requested structures are produced by the selected model, even if not listed in its pipeline file
+            for item in [x for x in iodict.keys() if iodict[x]["iotype"] == "output"]:
+                self.current_producers.setdefault(item, {'model': modelName, 'version': get_model_version(modelName)})
+        input_export_executor = ThreadPoolExecutor(max_workers=max(1, min(4, os.cpu_count() or 1)))
         try:
             inputDict = dict()
             outputDict = dict()
@@ -296,41 +319,27 @@ class RaidionicsLogic:
                 if iodict[item]["iotype"] == "output":
                     if iodict[item]["type"] == "volume":
                         outputDict[item] = item
-                        # curr_output = outputs[item]
-                        nodes = slicer.util.getNodes(outputDict[item])
-                        manual_node = widgets[[x.accessibleName == item + '_combobox' for x in widgets].index(True)].currentNode()
-                        if len(nodes) == 0 and manual_node is None:
-                            # If the output volume is not set, a new one is created
-                            node = slicer.vtkMRMLLabelMapVolumeNode()
-                            node.SetName(outputDict[item])
-                            slicer.mrmlScene.AddNode(node)
-                            node.CreateDefaultDisplayNodes()
-                            if iodict[item]["voltype"] == "LabelMap":
-                                imageData = vtk.vtkImageData()
-                                imageData.SetDimensions((150, 150, 150))
-                                imageData.AllocateScalars(vtk.VTK_SHORT, 1)
-                                node.SetAndObserveImageData(imageData)
+                        combobox_widget = widgets[[x.accessibleName == item + '_combobox' for x in widgets].index(True)]
+                        manual_node = combobox_widget.currentNode()
+                        if manual_node is None or OutputNodesManager.is_managed(manual_node):
+                            # The output node is created (or reused from a previous run) without image data, and
+                            # filled in with the results once available.
+                            node = OutputNodesManager.getInstance().get_labelmap_node(outputDict[item])
                             outputs[item] = node
 
                             # Select the correct item in the combobox upon creation
-                            combobox_widget = widgets[[x.accessibleName == item + '_combobox' for x in widgets].index(True)]
                             combobox_widget.setCurrentNode(node)
-                        elif not manual_node is None and not manual_node.GetImageData() is None:
+                        elif manual_node.GetImageData() is not None:
                             # If the node links to a manually imported volume, used as input (e.g., for faster diagnosis)
                             # Working only if pointing to a file, not if a new empty LabelMapVolume was created.
                             outputs[item] = manual_node
                             output_node_name = outputs[item].GetName()
-                            img = sitk.ReadImage(sitkUtils.GetSlicerITKReadWriteAddress(output_node_name))
-                            fileName = item + self.file_extension_docker
-                            # inputDict[item] = fileName
-                            SharedResources.getInstance().user_diagnosis_configuration['Neuro'][item.lower() + '_segmentation_filename'] = os.path.join(dataPath, 'data', fileName)
-                            sitk.WriteImage(img, str(os.path.join(SharedResources.getInstance().data_path, fileName)))
-                        elif manual_node.GetImageData() is None:
-                            # If the placeholder was manually created, but not linked to an image container
-                            imageData = vtk.vtkImageData()
-                            imageData.SetDimensions((150, 150, 150))
-                            imageData.AllocateScalars(vtk.VTK_SHORT, 1)
-                            manual_node.SetAndObserveImageData(imageData)
+                            # Staged next to the matching input volumes once exported, see __stage_manual_labels
+                            manual_labels[item] = sitk.ReadImage(sitkUtils.GetSlicerITKReadWriteAddress(output_node_name))
+                        else:
+                            # If the placeholder was manually created, but not linked to an image container, it will
+                            # be filled in with the results.
+                            outputs[item] = manual_node
 
                     elif iodict[item]["type"] == "point_vec":
                         outputDict[item] = item + '.fcsv'
@@ -343,6 +352,7 @@ class RaidionicsLogic:
                     if iodict[item]["type"] == "volume":
                         # print(inputs[item])
                         input_node_name = inputs[item].GetName()
+                        input_node_names[item] = input_node_name
                         try:
                             img = sitk.ReadImage(sitkUtils.GetSlicerITKReadWriteAddress(input_node_name))
                             input_sequence_type = iodict[item]["sequence_type"]
@@ -354,8 +364,10 @@ class RaidionicsLogic:
                             input_timestamp_order = iodict[item]["timestamp_order"]
                             os.makedirs(str(os.path.join(SharedResources.getInstance().data_path,
                                                          "T" + input_timestamp_order)), exist_ok=True)
-                            sitk.WriteImage(img, str(os.path.join(SharedResources.getInstance().data_path,
-                                                                  "T" + input_timestamp_order, fileName)))
+                            input_export_jobs[item] = input_export_executor.submit(
+                                self.__export_input_volume, img,
+                                str(os.path.join(SharedResources.getInstance().data_path, "T" + input_timestamp_order,
+                                                 fileName)))
                             if input_timestamp_order == "1" and not os.path.exists(os.path.join(SharedResources.getInstance().data_path, "T0")):
                                 os.makedirs(os.path.join(SharedResources.getInstance().data_path, "T0"))
                         except Exception as e:
@@ -370,6 +382,23 @@ class RaidionicsLogic:
             print("Error during inputs preparation before Docker call.")
             print(traceback.format_exc())
 
+        for item in input_export_jobs.keys():
+            try:
+                fingerprint = input_export_jobs[item].result()
+                self.staged_inputs[item] = {'folder': "T" + iodict[item]["timestamp_order"],
+                                            'basename': inputDict[item].split('.')[0], 'fingerprint': fingerprint,
+                                            'node_name': input_node_names[item]}
+            except Exception:
+                print("Issue exporting input volume {}.".format(item))
+                print(traceback.format_exc())
+        input_export_executor.shutdown(wait=True)
+        self.manual_labels = list(manual_labels.keys())
+        if self.logic_task == 'diagnosis':
+            self.__stage_retained_artifacts(iodict, excluded_labels=self.manual_labels)
+            self.__stage_manual_labels(iodict, manual_labels)
+        else:
+            self.__stage_retained_artifacts(iodict)
+
         self.cmdLogEvent('Docker run command:')
 
         cmd = list()
@@ -404,6 +433,121 @@ class RaidionicsLogic:
                 self.cmdProgressEvent(progress, line)
             # print(line)
 
+    def __export_input_volume(self, image, filename):
+        """
+        Writes an input volume in the backend input folder, and returns its fingerprint. Run from a worker thread.
+        """
+        sitk.WriteImage(image, filename)
+        return compute_image_fingerprint(image)
+
+    def __stage_retained_artifacts(self, iodict, excluded_labels=None):
+        """
+        Provides the backend with the segmentations retained from earlier runs on the same input volumes (e.g., the
+        preoperative timepoint in a follow-up case, or the tumor segmented right before running RADS), such that only
+        the new data is processed. Only the segmentations produced by the same models and versions as in the current
+        pipeline are reused.
+        The structures explicitly requested from a segmentation model, or manually provided, are never staged.
+        """
+        excluded_labels = list(excluded_labels) if excluded_labels is not None else []
+        if self.logic_task == 'segmentation':
+            excluded_labels.extend([x for x in iodict.keys() if iodict[x]["iotype"] == "output"])
+        for item in self.staged_inputs.keys():
+            try:
+                staged = ResultsWorkspace.getInstance().stage_artifacts(
+                    self.staged_inputs[item]['fingerprint'],
+                    os.path.join(SharedResources.getInstance().data_path, self.staged_inputs[item]['folder']),
+                    self.staged_inputs[item]['basename'], self.current_producers, excluded_labels=excluded_labels)
+                if len(staged) != 0:
+                    self.cmdLogEvent('Reusing previous results for {}: {}.'.format(item, ', '.join(staged)))
+            except Exception:
+                logging.warning("Unable to stage the previous results for {}.".format(item))
+                logging.warning(traceback.format_exc())
+
+    def __stage_manual_labels(self, iodict, manual_labels):
+        """
+        Provides the backend with the segmentations manually selected as outputs, following the same naming convention
+        as the retained artifacts, next to every input volume of the matching timestamp. They are not retained in the
+        workspace, and are only used again when explicitly selected for a later run.
+        """
+        for item in manual_labels.keys():
+            folder = "T" + str(iodict[item]["timestamp_order"]) if "timestamp_order" in iodict[item].keys() else "T0"
+            for staged_input in [x for x in self.staged_inputs.values() if x['folder'] == folder]:
+                try:
+                    label_filename = os.path.join(SharedResources.getInstance().data_path, folder,
+                                                  staged_input['basename'] + '_label_' + item + '.nii.gz')
+                    sitk.WriteImage(manual_labels[item], label_filename)
+                    self.cmdLogEvent('Using the provided {} segmentation for {}.'.format(item, staged_input['basename']))
+                except Exception:
+                    logging.warning("Unable to stage the provided {} segmentation.".format(item))
+                    logging.warning(traceback.format_exc())
+
+    def __retain_artifacts(self, iodict, output_volume_files):
+        """
+        Saves in the workspace the label volumes computed for each staged input volume, for later runs, together with
+        the model having produced them. Atlas-based outputs, manually provided ones, and the ones from no known model
+        of the pipeline are not retained, and probability maps are binarized first.
+        """
+        for output_volume in output_volume_files.keys():
+            try:
+                if "atlas_category" in iodict[output_volume].keys() or \
+                        ("description" in iodict[output_volume].keys() and iodict[output_volume]["description"] == 'True'):
+                    continue
+                ts_path = os.path.basename(os.path.dirname(output_volume_files[output_volume]))
+                output_basename = os.path.basename(output_volume_files[output_volume])
+                staged_input = next((x for x in self.staged_inputs.values() if x['folder'] == ts_path and
+                                     output_basename.startswith(x['basename'] + '_')), None)
+                if staged_input is None or output_volume in self.manual_labels or \
+                        output_volume not in self.current_producers.keys():
+                    continue
+                producer = self.current_producers[output_volume]
+                reader = sitk.ImageFileReader()
+                reader.SetFileName(output_volume_files[output_volume])
+                reader.ReadImageInformation()
+                if reader.GetPixelID() in [sitk.sitkFloat32, sitk.sitkFloat64]:
+                    # Probability maps are retained once binarized with the recommended threshold of the model
+                    if "threshold" not in iodict[output_volume].keys():
+                        continue
+                    threshold = float(str(iodict[output_volume]["threshold"]))
+                    label = sitk.Cast(reader.Execute() >= threshold, sitk.sitkUInt8)
+                    ResultsWorkspace.getInstance().store_artifact_image(staged_input['fingerprint'], output_volume,
+                                                                        label, producer)
+                    continue
+                ResultsWorkspace.getInstance().store_artifact(staged_input['fingerprint'], output_volume,
+                                                              output_volume_files[output_volume], producer)
+            except Exception:
+                logging.warning("Unable to retain the results for {}.".format(output_volume))
+                logging.warning(traceback.format_exc())
+        ResultsWorkspace.getInstance().prune()
+
+    def __store_cohort_results(self):
+        """
+        Appends the clinical reports produced by a RADS run to the cohort results store, one entry per timepoint, for
+        which the patient is identified by the name of the input volume.
+        """
+        output_path = SharedResources.getInstance().output_path
+        report_filenames = [os.path.join(output_path, x) for x in os.listdir(output_path)
+                            if x.endswith('clinical_report.json')]
+        for d in sorted(os.listdir(output_path)):
+            ts_path = os.path.join(output_path, d)
+            if re.match(r'^T[0-9]+$', d) and os.path.isdir(ts_path):
+                report_filenames.extend([os.path.join(ts_path, x) for x in os.listdir(ts_path)
+                                         if x.endswith('clinical_report.json')])
+        for report_filename in report_filenames:
+            # Reports located at the root of the output folder describe the earliest timepoint
+            folder = os.path.basename(os.path.dirname(report_filename))
+            if folder not in [x['folder'] for x in self.staged_inputs.values()]:
+                folder = min([x['folder'] for x in self.staged_inputs.values()], default='T0')
+            staged_input = next((x for x in self.staged_inputs.values() if x['folder'] == folder), None)
+            if staged_input is None:
+                continue
+            report_id = CohortStore.getInstance().append_report(report_filename, task=self.logic_target_space,
+                                                                patient_id=staged_input['node_name'], timepoint=folder,
+                                                                fingerprint=staged_input['fingerprint'],
+                                                                model_name=self.current_model_name)
+            if report_id is not None:
+                self.cmdLogEvent('Report stored in the cohort results for {} ({}).'.format(staged_input['node_name'],
+                                                                                          folder))
+
     def updateOutput(self, iodict, outputs, widgets):
         output_volume_files = dict()
         output_fiduciallist_files = dict()
@@ -454,17 +598,16 @@ class RaidionicsLogic:
                 logging.warning(traceback.format_exc())
                 continue
 
+        self.__retain_artifacts(iodict, output_volume_files)
+
         for output_volume in output_volume_files.keys():
             try:
                 result = sitk.ReadImage(output_volume_files[output_volume])
                 # print(result.GetPixelIDTypeAsString())
                 self.output_raw_values[output_volume] = deepcopy(sitk.GetArrayFromImage(result))
                 output_node = outputs[output_volume]
-                output_node_name = output_node.GetName()
-                # if iodict[output_volume]["voltype"] == 'LabelMap':
-                nodeWriteAddress = sitkUtils.GetSlicerITKReadWriteAddress(output_node_name)
-                self.display_port = nodeWriteAddress
-                sitk.WriteImage(result, nodeWriteAddress)
+                OutputNodesManager.getInstance().update_volume_node(output_node, result,
+                                                                    label=output_node.IsA('vtkMRMLLabelMapVolumeNode'))
                 applicationLogic = slicer.app.applicationLogic()
                 selectionNode = applicationLogic.GetSelectionNode()
 
@@ -54,10 +54,9 @@ class BaseDiagnosisWidget(qt.QTabWidget):
 
         self.diagnosis_results_stackedwidget = qt.QStackedWidget()
         self.diagnosis_results_stackedwidget.setVisible(True)
-        self.diagnosis_results_neuro_widget = DiagnosisNeuroResultsWidget(parent=self)
-        self.diagnosis_results_stackedwidget.addWidget(self.diagnosis_results_neuro_widget)
-        self.diagnosis_results_mediastinum_widget = DiagnosisMediastinumResultsWidget(parent=self)
-        self.diagnosis_results_stackedwidget.addWidget(self.diagnosis_results_mediastinum_widget)
+        # The results panels are only built once their task is selected, see get_results_widget
+        self.diagnosis_results_neuro_widget = None
+        self.diagnosis_results_mediastinum_widget = None
         self.base_layout.addWidget(self.diagnosis_results_stackedwidget)
         self.base_layout.addStretch(1)
 
@@ -82,14 +81,31 @@ class BaseDiagnosisWidget(qt.QTabWidget):
 
         self.diagnosis_interface_widget.diagnosis_available_signal.connect(self.diagnosis_execution_widget.on_diagnosis_available)
 
+    def get_results_widget(self, task):
+        """
+        Returns the results panel for the given diagnosis task, built and added to the stacked widget upon first use,
+        or None for an unknown task.
+        """
+        if task == 'neuro_diagnosis':
+            if self.diagnosis_results_neuro_widget is None:
+                self.diagnosis_results_neuro_widget = DiagnosisNeuroResultsWidget(parent=self)
+                self.diagnosis_results_stackedwidget.addWidget(self.diagnosis_results_neuro_widget)
+                NeuroDiagnosisSlicerInterface.getInstance().add_statistics_listener(
+                    self.diagnosis_results_neuro_widget.refresh_results)
+            return self.diagnosis_results_neuro_widget
+        elif task == 'mediastinum_diagnosis':
+            if self.diagnosis_results_mediastinum_widget is None:
+                self.diagnosis_results_mediastinum_widget = DiagnosisMediastinumResultsWidget(parent=self)
+                self.diagnosis_results_stackedwidget.addWidget(self.diagnosis_results_mediastinum_widget)
+            return self.diagnosis_results_mediastinum_widget
+        return None
+
     def update_results_area(self):
-        if SharedResources.getInstance().user_diagnosis_configuration['Default']['task'] == 'neuro_diagnosis':
-            #@TODO. Should collapse everything except the results box, for better viewing?
-            self.diagnosis_results_stackedwidget.setCurrentWidget(self.diagnosis_results_neuro_widget)
-            self.diagnosis_results_neuro_widget.update_results()
-        elif SharedResources.getInstance().user_diagnosis_configuration['Default']['task'] == 'mediastinum_diagnosis':
-            self.diagnosis_results_stackedwidget.setCurrentWidget(self.diagnosis_results_mediastinum_widget)
-            self.diagnosis_results_mediastinum_widget.update_results()
+        #@TODO. Should collapse everything except the results box, for better viewing?
+        results_widget = self.get_results_widget(SharedResources.getInstance().user_diagnosis_configuration['Default']['task'])
+        if results_widget is not None:
+            self.diagnosis_results_stackedwidget.setCurrentWidget(results_widget)
+            results_widget.update_results()
         self.diagnosis_results_stackedwidget.setVisible(True)
 
     def on_run_diagnosis(self):
@@ -105,7 +121,7 @@ class BaseDiagnosisWidget(qt.QTabWidget):
         self.diagnosis_execution_widget.generate_segments_pushbutton.setEnabled(False)
 
     def on_generate_segments(self):
-        # @TODO. Indication that the generation is ongoing, can take 30sec...
+        # The closed surfaces are generated in the background, only for the segments displayed in 3D.
         self.diagnosis_execution_widget.generate_segments_pushbutton.setEnabled(False)
         if SharedResources.getInstance().user_diagnosis_configuration['Default']['task'] == 'neuro_diagnosis':
             NeuroDiagnosisSlicerInterface.getInstance().generate_segmentations_from_labelmaps(self.diagnosis_interface_widget.diagnosis_model_parameters)
@@ -121,7 +137,8 @@ class BaseDiagnosisWidget(qt.QTabWidget):
     def on_logic_event_start(self):
         self.diagnosis_execution_widget.on_logic_event_start()
         if SharedResources.getInstance().user_diagnosis_configuration['Default']['task'] == 'neuro_diagnosis':
-            self.diagnosis_results_neuro_widget.on_logic_event_start()
+            NeuroDiagnosisSlicerInterface.getInstance().unwatch_tumor_edits()
+            self.get_results_widget('neuro_diagnosis').on_logic_event_start()
         else:
             pass
 
@@ -129,10 +146,14 @@ class BaseDiagnosisWidget(qt.QTabWidget):
     def on_logic_event_end(self):
         self.diagnosis_execution_widget.on_logic_event_end()
         if SharedResources.getInstance().user_diagnosis_configuration['Default']['task'] == 'neuro_diagnosis':
-            self.diagnosis_results_neuro_widget.on_logic_event_end()
+            self.get_results_widget('neuro_diagnosis').on_logic_event_end()
         else:
             pass
         self.update_results_area()
+        if SharedResources.getInstance().user_diagnosis_configuration['Default']['task'] == 'neuro_diagnosis':
+            # Later edits of the tumor label map update the displayed statistics without running the backend again
+            NeuroDiagnosisSlicerInterface.getInstance().watch_tumor_edits(
+                self.diagnosis_interface_widget.diagnosis_model_parameters)
 
     def on_logic_event_progress(self, progress, log):
         self.diagnosis_execution_widget.on_logic_event_progress(progress, log)
@@ -143,6 +164,9 @@ class BaseDiagnosisWidget(qt.QTabWidget):
         if SharedResources.getInstance().user_diagnosis_configuration['Default']['task'] == 'neuro_diagnosis':
             NeuroDiagnosisSlicerInterface.getInstance().on_optimal_display(
                 self.diagnosis_interface_widget.diagnosis_model_parameters)
+        elif SharedResources.getInstance().user_diagnosis_configuration['Default']['task'] == 'mediastinum_diagnosis':
+            MediastinumDiagnosisSlicerInterface.getInstance().on_optimal_display(
+                self.diagnosis_interface_widget.diagnosis_model_parameters)
         else:
             pass
         return
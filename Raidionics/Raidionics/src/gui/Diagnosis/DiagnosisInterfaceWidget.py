@@ -9,9 +9,13 @@ if sys.version_info.major == 3:
     from functools import reduce
 
 from src.utils.resources import SharedResources
+from src.utils.local_registry import LocalRegistry
+from src.utils.cloud_catalog import CloudCatalog
 from src.logic.model_parameters import *
 from src.RaidionicsLogic import RaidionicsLogic
-from src.utils.io_utilities import get_available_cloud_diagnoses_list, download_cloud_diagnosis, check_local_diagnosis_for_update
+from src.logic.prefetch_service import PrefetchService
+from src.logic.model_update_scanner import ModelUpdateScanner
+from src.utils.io_utilities import get_available_cloud_diagnoses_list, download_cloud_diagnosis
 from src.gui.UtilsWidgets.DownloadDialog import DownloadDialog
 
 
@@ -34,7 +38,10 @@ class DiagnosisInterfaceWidget(qt.QWidget):
         # self.on_diagnosis_selection(0)
         self.json_diagnoses = []
         self.populate_local_diagnosis()
-        self.populate_cloud_diagnosis()
+        # The last known catalog is displayed right away, and refreshed in the background
+        self.populate_cloud_diagnosis(offline=True)
+        self.cloud_catalog_refresh_thread = CloudCatalog.getInstance().refresh_in_background(['diagnoses'])
+        qt.QTimer.singleShot(500, self.on_cloud_catalog_refresh_poll)
 
     def setup_cloud_diagnosis_area(self):
         self.cloud_diagnosis_area_groupbox = ctk.ctkCollapsibleGroupBox()
@@ -73,6 +80,11 @@ class DiagnosisInterfaceWidget(qt.QWidget):
         self.local_diagnosis_moreinfo_pushbutton = qt.QPushButton('Press to display')
         self.modelsFormLayout.addRow("Details:", self.local_diagnosis_moreinfo_pushbutton)
 
+        # Badge only shown when the background update scan found a newer version of the selected item
+        self.local_diagnosis_update_pushbutton = qt.QPushButton('Update available, press to download')
+        self.modelsFormLayout.addRow(self.local_diagnosis_update_pushbutton)
+        self.local_diagnosis_update_pushbutton.setVisible(False)
+
     def setup_diagnosis_parameters_area(self):
         # The ctk collapsible group box is the overall container, within which a scrollable area is set.
         # Ctk => Layout => scroll area => dummy widget => form layout => Content from ModelParameters
@@ -96,6 +108,8 @@ class DiagnosisInterfaceWidget(qt.QWidget):
         self.local_diagnosis_area_searchbox.connect("textChanged(QString)", self.on_local_diagnosis_search)
         self.local_diagnosis_selector_combobox.connect('currentIndexChanged(int)', self.on_diagnosis_selection)
         self.local_diagnosis_moreinfo_pushbutton.connect('clicked()', self.on_diagnosis_details_selected)
+        self.local_diagnosis_update_pushbutton.connect('clicked()', self.on_diagnosis_update_selected)
+        ModelUpdateScanner.getInstance().add_listener(self.refresh_update_badge)
         self.cloud_diagnosis_download_pushbutton.clicked.connect(self.on_cloud_diagnosis_download_selected)
 
     def get_existing_digests(self):
@@ -122,13 +136,19 @@ class DiagnosisInterfaceWidget(qt.QWidget):
             print("Exception: {}".format(e))
         return digests
 
-    def populate_cloud_diagnosis(self):
+    def on_cloud_catalog_refresh_poll(self):
+        if self.cloud_catalog_refresh_thread.is_alive():
+            qt.QTimer.singleShot(500, self.on_cloud_catalog_refresh_poll)
+            return
+        self.populate_cloud_diagnosis(offline=True)
+
+    def populate_cloud_diagnosis(self, offline=False):
         self.cloud_diagnosis_list = []
         self.cloud_diagnosis_selector_combobox.clear()
-        cloud_diagnosis_list = get_available_cloud_diagnoses_list()
+        cloud_diagnosis_list = get_available_cloud_diagnoses_list(offline=offline)
+        local_names = set(LocalRegistry.getInstance().get_names())
         for idx, model in enumerate(cloud_diagnosis_list):
-            already_local = True if True in [x["name"] == model[0] for x in self.json_diagnoses] else False
-            if not already_local:
+            if model[0] not in local_names:
                 self.cloud_diagnosis_list.append(model)
                 self.cloud_diagnosis_selector_combobox.addItem(model[0], idx)
 
@@ -140,29 +160,16 @@ class DiagnosisInterfaceWidget(qt.QWidget):
     def populate_local_diagnosis(self):
         self.local_diagnosis_selector_combobox.clear()
         self.local_diagnosis_selector_combobox.addItem("", 0)
-        jsonFiles = glob(SharedResources.getInstance().json_local_dir + "/*.json")
-        jsonFiles = sorted(jsonFiles)
-        self.json_diagnoses = []
-        for fname in jsonFiles:
-            if 'Diagnosis' in fname:
-                with open(fname, "r") as fp:
-                    j = json.load(fp, object_pairs_hook=OrderedDict)
-
-                self.json_diagnoses.append(j)
+        # Only the configuration files added or modified since the last refresh are parsed
+        LocalRegistry.getInstance().refresh()
+        self.json_diagnoses = LocalRegistry.getInstance().get_configs(task='Diagnosis')
         for idx, j in enumerate(self.json_diagnoses):
-            name = j["name"]
-            if 'task' in j and j['task'] == 'Diagnosis':
-                self.local_diagnosis_selector_combobox.addItem(name, idx + 1)
+            self.local_diagnosis_selector_combobox.addItem(j["name"], idx + 1)
 
     def on_diagnosis_selection(self, index):
         selected_model = self.local_diagnosis_selector_combobox.currentText
         selected_diagnosis = self.local_diagnosis_selector_combobox.currentText
-        if SharedResources.getInstance().global_active_model_update:
-            dl_req = check_local_diagnosis_for_update(selected_diagnosis)
-            if dl_req:
-                diag = DownloadDialog(self)
-                diag.set_diagnosis_name(selected_diagnosis)
-                diag.exec()
+        self.refresh_update_badge()
 
         self.diagnosis_model_parameters.destroy()
         json_model = self.find_json_model(selected_model_name=selected_model)
@@ -170,6 +177,7 @@ class DiagnosisInterfaceWidget(qt.QWidget):
             return
 
         self.diagnosis_model_parameters.create(json_model)
+        PrefetchService.getInstance().record_usage('diagnoses', selected_diagnosis)
 
         if "briefdescription" in json_model:
             tip = json_model["briefdescription"]
@@ -208,14 +216,15 @@ class DiagnosisInterfaceWidget(qt.QWidget):
         searchTextList = search_text.split()
         for idx, j in enumerate(self.json_diagnoses):
             lname = j["name"].lower()
-            if 'task' in j and j['task'] == 'Diagnosis':
-                # require all elements in list, to add to select. case insensitive
-                if reduce(lambda x, y: x and (lname.find(y.lower()) != -1), [True] + searchTextList):
-                    self.local_diagnosis_selector_combobox.addItem(j["name"], idx)
+            # require all elements in list, to add to select. case insensitive
+            if reduce(lambda x, y: x and (lname.find(y.lower()) != -1), [True] + searchTextList):
+                self.local_diagnosis_selector_combobox.addItem(j["name"], idx)
 
     def on_diagnosis_details_selected(self):
         index = self.local_diagnosis_selector_combobox.currentIndex
-        model_json = self.json_diagnoses[[x['name'] == self.local_diagnosis_selector_combobox.currentText for x in self.json_diagnoses].index(True)]
+        model_json = self.find_json_model(selected_model_name=self.local_diagnosis_selector_combobox.currentText)
+        if model_json is None:
+            return
 
         tip = ''
         exhaustive_list = ['owner', 'task', 'organ', 'target', 'modality', 'sequence', 'dataset_description']
@@ -231,7 +240,6 @@ class DiagnosisInterfaceWidget(qt.QWidget):
     def on_cloud_diagnosis_download_selected(self):
         # @TODO. Not ideal as it requires to click twice on download, but at least it will hang
         # during pop-up time, should be more understandable for the user.
-        digests = self.get_existing_digests()
         selected_diagnosis = self.cloud_diagnosis_selector_combobox.currentText
         diag = DownloadDialog(self)
         diag.set_diagnosis_name(selected_diagnosis)
@@ -242,9 +250,22 @@ class DiagnosisInterfaceWidget(qt.QWidget):
         self.populate_cloud_diagnosis()
 
     def find_json_model(self, selected_model_name):
-        json_model = None
-        for m in self.json_diagnoses:
-            if m['name'] == selected_model_name:
-                json_model = m
-                break
-        return json_model
+        return LocalRegistry.getInstance().get_config(selected_model_name)
+
+    def refresh_update_badge(self):
+        """
+        Shows the update badge if the last background scan found a newer version of the selected diagnosis.
+        Only the cached verdict is read, no network access or hashing is performed here.
+        """
+        selected_name = self.local_diagnosis_selector_combobox.currentText
+        update_available = SharedResources.getInstance().global_active_model_update and selected_name != '' and \
+            ModelUpdateScanner.getInstance().is_update_available('diagnoses', selected_name)
+        self.local_diagnosis_update_pushbutton.setVisible(update_available)
+
+    def on_diagnosis_update_selected(self):
+        selected_name = self.local_diagnosis_selector_combobox.currentText
+        diag = DownloadDialog(self)
+        diag.set_diagnosis_name(selected_name)
+        if diag.exec():
+            ModelUpdateScanner.getInstance().clear_update('diagnoses', selected_name)
+        self.refresh_update_badge()
@@ -4,6 +4,7 @@ import numpy as np
 
 from src.utils.resources import SharedResources
 from src.logic.neuro_diagnosis_result_parameters import NeuroDiagnosisParameters
+from src.gui.Diagnosis.DiagnosisStructuresTableModel import DiagnosisStructuresTableModel
 
 
 class DiagnosisNeuroPartResultsWidget(qt.QWidget):
@@ -78,111 +79,86 @@ class DiagnosisNeuroPartResultsWidget(qt.QWidget):
         self.subcortical_structures_groupbox.setLayout(self.subcortical_structures_groupbox_layout)
         self.base_layout.addWidget(self.subcortical_structures_groupbox)
         self.base_layout.addStretch(1)
+        self.structures_tables = {}  # (Category, atlas) -> (container widget, table model, label), reused across updates
 
         self.setLayout(self.base_layout)
 
     def update_results(self, values):
         self.volume_lineedit.setText(str(np.round(values['Overall'].original_space_tumor_volume, 2)) + ' ml')
-        self.volume_mni_lineedit.setText(str(np.round(values['Overall'].mni_space_tumor_volume, 2)) + ' ml')
+        # The MNI-space values are only computed by the backend, and kept from the last run after local edits
+        outdated = ' (outdated)' if values['Overall'].mni_space_outdated else ''
+        outdated_tip = 'Tumor edited since the last run, run the diagnosis again to update.' if outdated else ''
+        self.volume_mni_lineedit.setText(str(np.round(values['Overall'].mni_space_tumor_volume, 2)) + ' ml' + outdated)
+        self.volume_mni_lineedit.setToolTip(outdated_tip)
         self.laterality_right_lineedit.setText(str(np.round(values['Overall'].right_laterality_percentage, 2)) + ' %')
         self.laterality_left_lineedit.setText(str(np.round(values['Overall'].left_laterality_percentage, 2)) + ' %')
-        self.laterality_midline_lineedit.setText(values['Overall'].laterality_midline_crossing)
+        self.laterality_midline_lineedit.setText(str(values['Overall'].laterality_midline_crossing))
 
         if NeuroDiagnosisParameters.getInstance().tumor_type == 'High-Grade Glioma':
-            self.expected_residual_volume_lineedit.setText(str(np.round(values['Overall'].mni_space_expected_residual_tumor_volume, 3)) + ' ml')
-            self.resectability_index_lineedit.setText(str(values['Overall'].mni_space_resectability_index))
+            self.expected_residual_volume_lineedit.setText(str(np.round(values['Overall'].mni_space_expected_residual_tumor_volume, 3)) + ' ml' + outdated)
+            self.resectability_index_lineedit.setText(str(values['Overall'].mni_space_resectability_index) + outdated)
+            self.expected_residual_volume_lineedit.setToolTip(outdated_tip)
+            self.resectability_index_lineedit.setToolTip(outdated_tip)
             self.resectability_groupbox.setVisible(True)
         else:
             self.resectability_groupbox.setVisible(False)
 
-        for i in reversed(range(self.cortical_structures_groupbox_layout.count())):
-            self.cortical_structures_groupbox_layout.itemAt(i).widget().setParent(None)
-
-        for a in values['Overall'].mni_space_cortical_structures_overlap.keys():
-            dummy_widget = qt.QWidget()
-            layout = qt.QHBoxLayout()
-            struct_label = qt.QLabel(a + ':')
-            struct_label.setFixedWidth(100)
-            struct_tablewidget = qt.QTableWidget()
-            struct_tablewidget.setColumnCount(2)
-            struct_tablewidget.setRowCount(len(values['Overall'].mni_space_cortical_structures_overlap[a].keys()))
-            struct_tablewidget.setHorizontalHeaderLabels(['Overlap (%)', 'Structure'])
-            for s, sn in enumerate(values['Overall'].mni_space_cortical_structures_overlap[a].keys()):
-                readable_name = sn.replace(a + '_', '').replace('-', ' ').replace('_', ' ')
-                struct_tablewidget.setItem(s, 0, qt.QTableWidgetItem(str(np.round(values['Overall'].mni_space_cortical_structures_overlap[a][sn], 2))))
-                struct_tablewidget.setItem(s, 1, qt.QTableWidgetItem(readable_name))
-            struct_tablewidget.horizontalHeader().setStretchLastSection(True)
-            struct_tablewidget.verticalHeader().setStretchLastSection(True)
-            struct_tablewidget.horizontalHeader().setSectionResizeMode(qt.QHeaderView.ResizeToContents)
-            struct_tablewidget.verticalHeader().setSectionResizeMode(qt.QHeaderView.ResizeToContents)
-            struct_tablewidget.setEditTriggers(qt.QTableWidget.NoEditTriggers)
-            struct_tablewidget.setMinimumHeight(100)
-            struct_tablewidget.setMinimumWidth(350)
-            layout.addWidget(struct_label)
-            layout.addWidget(struct_tablewidget)
-            layout.addStretch(1)
-            dummy_widget.setLayout(layout)
-            self.cortical_structures_groupbox_layout.addWidget(dummy_widget)
-
-        for i in reversed(range(self.subcortical_structures_groupbox_layout.count())):
-            self.subcortical_structures_groupbox_layout.itemAt(i).widget().setParent(None)
-
-        for a in values['Overall'].mni_space_subcortical_structures_overlap.keys():
-            dummy_widget = qt.QWidget()
-            layout = qt.QHBoxLayout()
-            struct_label = qt.QLabel(a + ' overlap:')
-            struct_label.setFixedWidth(100)
-            struct_tablewidget = qt.QTableWidget()
-            struct_tablewidget.setColumnCount(2)
-            # struct_tablewidget.setRowCount(len(values['Overall'].mni_space_subcortical_structures_overlap[a].keys()))
-            struct_tablewidget.setRowCount(len(list(filter((0.0).__ne__, [np.round(x, 2) for x in values['Overall'].mni_space_subcortical_structures_overlap[a].values()]))))
-            struct_tablewidget.setHorizontalHeaderLabels(['Overlap (%)', 'Structure'])
-            count = 0
-            for s, sn in enumerate(values['Overall'].mni_space_subcortical_structures_overlap[a].keys()):
-                if np.round(values['Overall'].mni_space_subcortical_structures_overlap[a][sn], 2) != 0:
-                    readable_name = sn.replace('_mni', '').replace('_', ' ')
-                    struct_tablewidget.setItem(count, 0, qt.QTableWidgetItem(str(np.round(values['Overall'].mni_space_subcortical_structures_overlap[a][sn], 2))))
-                    struct_tablewidget.setItem(count, 1, qt.QTableWidgetItem(readable_name))
-                    count = count + 1
-            struct_tablewidget.horizontalHeader().setStretchLastSection(True)
-            struct_tablewidget.verticalHeader().setStretchLastSection(True)
-            struct_tablewidget.horizontalHeader().setSectionResizeMode(qt.QHeaderView.ResizeToContents)
-            struct_tablewidget.verticalHeader().setSectionResizeMode(qt.QHeaderView.ResizeToContents)
-            struct_tablewidget.setEditTriggers(qt.QTableWidget.NoEditTriggers)
-            struct_tablewidget.setMinimumHeight(100)
-            struct_tablewidget.setMinimumWidth(350)
-            layout.addWidget(struct_label)
-            layout.addWidget(struct_tablewidget)
-            layout.addStretch(1)
-            dummy_widget.setLayout(layout)
-            self.subcortical_structures_groupbox_layout.addWidget(dummy_widget)
-
-        for a in values['Overall'].mni_space_subcortical_structures_distance.keys():
-            dummy_widget = qt.QWidget()
-            layout = qt.QHBoxLayout()
-            struct_label = qt.QLabel(a + ' distance:')
-            struct_label.setFixedWidth(100)
-            struct_tablewidget = qt.QTableWidget()
-            struct_tablewidget.setColumnCount(2)
-            # struct_tablewidget.setRowCount(len(values['Overall'].mni_space_subcortical_structures_distance[a].keys()))
-            struct_tablewidget.setRowCount(len(list(filter((-1.0).__ne__, [np.round(x, 2) for x in values['Overall'].mni_space_subcortical_structures_distance[a].values()]))))
-            struct_tablewidget.setHorizontalHeaderLabels(['Distance (mm)', 'Structure'])
-            count = 0
-            for s, sn in enumerate(values['Overall'].mni_space_subcortical_structures_distance[a].keys()):
-                if np.round(values['Overall'].mni_space_subcortical_structures_distance[a][sn], 2) != -1:
-                    readable_name = sn.replace('_mni', '').replace('_', ' ')
-                    struct_tablewidget.setItem(count, 0, qt.QTableWidgetItem(str(np.round(values['Overall'].mni_space_subcortical_structures_distance[a][sn], 2))))
-                    struct_tablewidget.setItem(count, 1, qt.QTableWidgetItem(readable_name))
-                    count = count + 1
-            struct_tablewidget.horizontalHeader().setStretchLastSection(True)
-            struct_tablewidget.verticalHeader().setStretchLastSection(True)
-            struct_tablewidget.horizontalHeader().setSectionResizeMode(qt.QHeaderView.ResizeToContents)
-            struct_tablewidget.verticalHeader().setSectionResizeMode(qt.QHeaderView.ResizeToContents)
-            struct_tablewidget.setEditTriggers(qt.QTableWidget.NoEditTriggers)
-            struct_tablewidget.setMinimumHeight(100)
-            struct_tablewidget.setMinimumWidth(350)
-            layout.addWidget(struct_label)
-            layout.addWidget(struct_tablewidget)
-            layout.addStretch(1)
-            dummy_widget.setLayout(layout)
-            self.subcortical_structures_groupbox_layout.addWidget(dummy_widget)
+        self.__update_structures_tables(self.cortical_structures_groupbox_layout, 'cortical_overlap',
+                                        values['Overall'].mni_space_cortical_structures_overlap,
+                                        values['Overall'].patient_space_cortical_structures_overlap, 'Overlap (%)',
+                                        '{}:', outdated, excluded_value=None, suffix='_')
+        self.__update_structures_tables(self.subcortical_structures_groupbox_layout, 'subcortical_overlap',
+                                        values['Overall'].mni_space_subcortical_structures_overlap,
+                                        values['Overall'].patient_space_subcortical_structures_overlap, 'Overlap (%)',
+                                        '{} overlap:', outdated, excluded_value=0.)
+        self.__update_structures_tables(self.subcortical_structures_groupbox_layout, 'subcortical_distance',
+                                        values['Overall'].mni_space_subcortical_structures_distance,
+                                        values['Overall'].patient_space_subcortical_structures_distance,
+                                        'Distance (mm)', '{} distance:', outdated, excluded_value=-1.)
+
+    def __update_structures_tables(self, layout, category, mni_atlases, patient_atlases, value_header, label_format,
+                                   outdated, excluded_value, suffix=None):
+        """
+        Displays one table per atlas, the views being reused across updates and hidden when their atlas is absent from
+        the results. The values computed locally in patient space after tumor edits replace the reported MNI-space
+        ones, the label of each table stating the space its values come from.
+        """
+        atlases = dict(mni_atlases)
+        atlases.update(patient_atlases)
+        for (c, a), (dummy_widget, _, _) in self.structures_tables.items():
+            if c == category:
+                dummy_widget.setVisible(a in atlases.keys())
+
+        for a in atlases.keys():
+            if (category, a) not in self.structures_tables.keys():
+                dummy_widget = qt.QWidget()
+                table_layout = qt.QHBoxLayout()
+                struct_label = qt.QLabel()
+                struct_label.setFixedWidth(100)
+                struct_label.setWordWrap(True)
+                struct_tableview = qt.QTableView()
+                struct_model = DiagnosisStructuresTableModel(value_header, parent=struct_tableview)
+                struct_tableview.setModel(struct_model)
+                struct_tableview.setSortingEnabled(True)
+                struct_tableview.horizontalHeader().setSortIndicator(-1, qt.Qt.AscendingOrder)
+                struct_tableview.horizontalHeader().setStretchLastSection(True)
+                struct_tableview.horizontalHeader().setSectionResizeMode(qt.QHeaderView.ResizeToContents)
+                struct_tableview.verticalHeader().setSectionResizeMode(qt.QHeaderView.Fixed)
+                struct_tableview.setEditTriggers(qt.QAbstractItemView.NoEditTriggers)
+                struct_tableview.setMinimumHeight(100)
+                struct_tableview.setMinimumWidth(350)
+                table_layout.addWidget(struct_label)
+                table_layout.addWidget(struct_tableview)
+                table_layout.addStretch(1)
+                dummy_widget.setLayout(table_layout)
+                layout.addWidget(dummy_widget)
+                self.structures_tables[(category, a)] = (dummy_widget, struct_model, struct_label)
+            if a in patient_atlases.keys():
+                space = '(patient space)'
+            else:
+                space = '(MNI space, outdated)' if outdated else '(MNI space)'
+            self.structures_tables[(category, a)][2].setText(label_format.format(a) + '\n' + space)
+            # The values are displayed in the report order until the user sorts a column
+            prefixes = (a + suffix,) if suffix is not None else ('_mni',)
+            self.structures_tables[(category, a)][1].set_structures(atlases[a], excluded_value=excluded_value,
+                                                                    prefixes=prefixes)
@@ -123,14 +123,17 @@ class DiagnosisNeuroResultsWidget(qt.QWidget):
                         dst=filepath)
 
     def __clean_results_area(self):
-        for i in reversed(range(len(self.results_widgets))):
+        # The full extent tab, and its tables, are kept and only filled with the new results
+        for i in reversed(range(1, len(self.results_widgets))):
             # Should have index+1, assuming 'Overall' is at position 0 all the time
+            self.overall_results_area_tabwidget.widget(i+1).deleteLater()
             self.overall_results_area_tabwidget.removeTab(i+1)
 
-        self.results_widgets = {}
-        w = DiagnosisNeuroPartResultsWidget(parent=self)
-        self.overall_results_area_tabwidget.addTab(w, 'Full extent')
-        self.results_widgets['Main'] = w
+        main_widget = self.results_widgets.get('Main', None)
+        if main_widget is None:
+            main_widget = DiagnosisNeuroPartResultsWidget(parent=self)
+            self.overall_results_area_tabwidget.addTab(main_widget, 'Full extent')
+        self.results_widgets = {'Main': main_widget}
 
     def __setup_tumor_parts_results_area(self, nb_parts):
         for i in range(nb_parts):
@@ -149,12 +152,19 @@ class DiagnosisNeuroResultsWidget(qt.QWidget):
         self.__update_results_gui()
         self.results_collapsible_groupbox.setCollapsed(True)
 
+    def refresh_results(self):
+        """
+        Displays the current content of the diagnosis parameters, e.g. after their local update following an edit of
+        the tumor label map, without reading the report again.
+        """
+        self.__update_results_gui()
+
     def __update_results_gui(self):
-        self.results_overall_tumor_found_lineedit.setText(NeuroDiagnosisParameters.getInstance().tumor_presence_state)
+        self.results_overall_tumor_found_lineedit.setText(str(NeuroDiagnosisParameters.getInstance().tumor_presence_state))
         self.results_overall_tumor_type_lineedit.setText(NeuroDiagnosisParameters.getInstance().tumor_type)
         multifocality_text = "Yes" if NeuroDiagnosisParameters.getInstance().tumor_multifocal else "No"
         self.results_overall_tumor_mutifocal_lineedit.setText(multifocality_text)
-        self.results_overall_tumor_mutifocal_pieces_lineedit.setText(NeuroDiagnosisParameters.getInstance().tumor_parts)
+        self.results_overall_tumor_mutifocal_pieces_lineedit.setText(str(NeuroDiagnosisParameters.getInstance().tumor_parts))
         self.results_overall_tumor_mutifocal_distance_lineedit.setText(str(NeuroDiagnosisParameters.getInstance().tumor_multifocal_distance) + " mm")
 
         if NeuroDiagnosisParameters.getInstance().tumor_parts > 1:
@@ -163,4 +173,5 @@ class DiagnosisNeuroResultsWidget(qt.QWidget):
             self.results_overall_tumor_multifocality_groupbox.setVisible(False)
 
         for i, wid in enumerate(self.results_widgets.keys()):
-            self.results_widgets[wid].update_results(NeuroDiagnosisParameters.getInstance().statistics[wid])
+            if wid in NeuroDiagnosisParameters.getInstance().statistics.keys():
+                self.results_widgets[wid].update_results(NeuroDiagnosisParameters.getInstance().statistics[wid])
@@ -0,0 +1,119 @@
+from __main__ import qt
+import numpy as np
+
+
+class DiagnosisStructuresTableModel(qt.QAbstractTableModel):
+    """
+    Read-only table model over the per-structure values of one atlas (e.g., overlap or distance), held as numpy
+    arrays. The rows are handed to the view by batches as it scrolls (fetchMore), and sorting only permutes an index
+    array, such that atlases with hundreds of structures are displayed without creating one item per cell.
+    """
+    def __init__(self, value_header: str, parent=None):
+        super(DiagnosisStructuresTableModel, self).__init__(parent)
+        self.headers = [value_header, 'Structure']
+        self.batch_size = 50  # Number of rows handed to the view at once
+        self.names = np.array([], dtype=object)
+        self.values = np.array([], dtype=np.float64)
+        self.order = np.array([], dtype=np.int64)
+        self.fetched_rows = 0
+        self.sort_column = -1  # Last sort requested by the view, re-applied when the structures are replaced
+        self.sort_order = qt.Qt.AscendingOrder
+
+    def set_structures(self, structures: dict, excluded_value: float = None, prefixes: tuple = ()) -> None:
+        """
+        Replaces the displayed structures, sorted as requested last by the view (matching its sort indicator).
+
+        Parameters
+        ----------
+        structures: dict
+            Structure name -> value, as parsed from the diagnosis report.
+        excluded_value: float
+            Value of the structures not to display once rounded to two decimals (e.g., 0 for no overlap or -1 for no
+            distance computed), all structures are displayed if None.
+        prefixes: tuple
+            Name parts to remove from the structure names for display, e.g. the atlas name.
+        """
+        names = np.array(list(structures.keys()), dtype=object)
+        values = np.array([np.nan if x is None else x for x in structures.values()], dtype=np.float64)
+        if excluded_value is not None:
+            kept = np.round(values, 2) != excluded_value
+            names = names[kept]
+            values = values[kept]
+        readable_names = []
+        for n in names:
+            for p in prefixes:
+                n = n.replace(p, '')
+            readable_names.append(n.replace('-', ' ').replace('_', ' ').strip())
+
+        self.beginResetModel()
+        self.names = np.array(readable_names, dtype=object)
+        self.values = values
+        self.order = self.__compute_order(self.sort_column, self.sort_order)
+        self.fetched_rows = min(len(values), self.batch_size)
+        self.endResetModel()
+
+    def rowCount(self, parent=qt.QModelIndex()):
+        return 0 if parent.isValid() else self.fetched_rows
+
+    def columnCount(self, parent=qt.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.fetched_rows < len(self.order)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(self.batch_size, len(self.order) - self.fetched_rows)
+        if count <= 0:
+            return
+        self.beginInsertRows(qt.QModelIndex(), self.fetched_rows, self.fetched_rows + count - 1)
+        self.fetched_rows = self.fetched_rows + count
+        self.endInsertRows()
+
+    def data(self, index, role=qt.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.fetched_rows:
+            return None
+        row = self.order[index.row()]
+        if role == qt.Qt.DisplayRole:
+            if index.column() == 0:
+                return '' if np.isnan(self.values[row]) else '{:.2f}'.format(self.values[row])
+            return self.names[row]
+        elif role == qt.Qt.TextAlignmentRole and index.column() == 0:
+            return int(qt.Qt.AlignRight | qt.Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=qt.Qt.DisplayRole):
+        if role != qt.Qt.DisplayRole:
+            return None
+        if orientation == qt.Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return str(section + 1)
+
+    def flags(self, index):
+        return qt.Qt.ItemIsEnabled | qt.Qt.ItemIsSelectable
+
+    def sort(self, column, order=qt.Qt.AscendingOrder):
+        """
+        Sorts all the structures, fetched or not, by value or by name. Missing values are placed last, and a negative
+        column restores the report order.
+        """
+        self.sort_column = column
+        self.sort_order = order
+        if len(self.order) == 0:
+            return
+        # The already fetched rows are kept, only their content is permuted
+        self.beginResetModel()
+        self.order = self.__compute_order(column, order)
+        self.endResetModel()
+
+    def __compute_order(self, column, order):
+        if column < 0 or len(self.values) == 0:
+            return np.arange(len(self.values))
+        elif column == 0:
+            keys = -self.values if order == qt.Qt.DescendingOrder else self.values
+            return np.argsort(np.where(np.isnan(self.values), np.inf, keys), kind='stable')
+        sorted_order = np.argsort(self.names.astype(str), kind='stable')
+        if order == qt.Qt.DescendingOrder:
+            sorted_order = sorted_order[::-1]
+        return sorted_order
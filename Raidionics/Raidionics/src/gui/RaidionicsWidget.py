@@ -21,6 +21,9 @@ from src.RaidionicsLogic import *
 from src.gui.Segmentation.BaseSegmentationWidget import BaseSegmentationWidget
 from src.gui.Diagnosis.BaseDiagnosisWidget import BaseDiagnosisWidget
 from src.utils.resources import SharedResources
+from src.utils.startup_profiler import StartupProfiler
+from src.logic.prefetch_service import PrefetchService
+from src.logic.model_update_scanner import ModelUpdateScanner
 
 
 class RaidionicsWidget():
@@ -54,7 +57,9 @@ class RaidionicsWidget():
         """
 
         # Setting the Docker widget, necessary to run either a segmentation or diagnosis task
-        self.setup_docker_widget()
+        profiler = StartupProfiler.getInstance()
+        with profiler.measure('Docker widget setup'):
+            self.setup_docker_widget()
 
         # # Reload and Test area
         # reloadCollapsibleButton = ctk.ctkCollapsibleButton()
@@ -73,11 +78,18 @@ class RaidionicsWidget():
         # self.layout.addWidget(reloadCollapsibleButton)
         # self.layout.addWidget(self.base_segmentation_widget)
 
-        self.setup_global_options_widget()
-        self.setup_user_interactions_widget()
+        with profiler.measure('Global options widget setup'):
+            self.setup_global_options_widget()
+        with profiler.measure('User interactions widget setup'):
+            self.setup_user_interactions_widget()
         self.layout.addStretch(1)
         self.setup_connections()
 
+        # Warming up the most used models and Docker images once the application is idle
+        PrefetchService.getInstance().schedule()
+        if SharedResources.getInstance().global_active_model_update:
+            ModelUpdateScanner.getInstance().start()
+
     def setup_docker_widget(self):
         self.dockerGroupBox = ctk.ctkCollapsibleGroupBox()
         self.dockerGroupBox.setTitle('Docker Settings')
@@ -127,10 +139,11 @@ class RaidionicsWidget():
         self.user_interactions_groupbox.setTitle("Interactive")
         self.user_interactions_groupbox_layout = qt.QVBoxLayout()
         self.tasks_tabwidget = qt.QTabWidget()
-        self.base_segmentation_widget = BaseSegmentationWidget(self.parent)
-        self.tasks_tabwidget.addTab(self.base_segmentation_widget, 'Segmentation')
-        self.base_diagnosis_widget = BaseDiagnosisWidget(self.parent)
-        self.tasks_tabwidget.addTab(self.base_diagnosis_widget, 'Reporting (RADS)')
+        # The task tabs are built upon first activation, empty placeholders are displayed until then
+        self.base_segmentation_widget = None
+        self.tasks_tabwidget.addTab(qt.QWidget(), 'Segmentation')
+        self.base_diagnosis_widget = None
+        self.tasks_tabwidget.addTab(qt.QWidget(), 'Reporting (RADS)')
         # self.base_diagnosis_widget.setEnabled(True)
         # self.base_diagnosis_widget.setToolTip("Currently disabled for maintenance, please use Raidionics in the meantime.")
         self.logging_textedit = qt.QTextEdit()
@@ -140,6 +153,7 @@ class RaidionicsWidget():
         self.user_interactions_groupbox_layout.addWidget(self.tasks_tabwidget)
         self.user_interactions_groupbox.setLayout(self.user_interactions_groupbox_layout)
         self.layout.addWidget(self.user_interactions_groupbox)
+        self.build_task_tab(self.tasks_tabwidget.currentIndex)
 
         # self.tasks_tabwidget = qt.QTabWidget()
         # self.base_segmentation_widget = BaseSegmentationWidget(self.parent)
@@ -175,18 +189,40 @@ class RaidionicsWidget():
     def on_task_tabwidget_tabchanged(self):
         # @TODO. Should a clean-up be performed when moving between segmentation and diagnostic tasks?
         # self.tasks_tabwidget.currentWidget().reload()
-        pass
+        self.build_task_tab(self.tasks_tabwidget.currentIndex)
+
+    def build_task_tab(self, index):
+        """
+        Builds the task widget for the given tab index, if not built yet, in place of its placeholder.
+        """
+        if index == 0 and self.base_segmentation_widget is None:
+            with StartupProfiler.getInstance().measure('Segmentation tab setup'):
+                self.base_segmentation_widget = BaseSegmentationWidget(self.parent)
+            self.__replace_tab_placeholder(index, self.base_segmentation_widget, 'Segmentation')
+        elif index == 1 and self.base_diagnosis_widget is None:
+            with StartupProfiler.getInstance().measure('Reporting (RADS) tab setup'):
+                self.base_diagnosis_widget = BaseDiagnosisWidget(self.parent)
+            self.__replace_tab_placeholder(index, self.base_diagnosis_widget, 'Reporting (RADS)')
+
+    def __replace_tab_placeholder(self, index, widget, title):
+        placeholder = self.tasks_tabwidget.widget(index)
+        self.tasks_tabwidget.blockSignals(True)
+        self.tasks_tabwidget.removeTab(index)
+        self.tasks_tabwidget.insertTab(index, widget, title)
+        self.tasks_tabwidget.setCurrentIndex(index)
+        self.tasks_tabwidget.blockSignals(False)
+        placeholder.deleteLater()
 
     def on_logic_event_start(self, task):
-        if task == 'segmentation':
+        if task == 'segmentation' and self.base_segmentation_widget is not None:
             self.base_segmentation_widget.on_logic_event_start()
-        elif task == 'diagnosis':
+        elif task == 'diagnosis' and self.base_diagnosis_widget is not None:
             self.base_diagnosis_widget.on_logic_event_start()
 
     def on_logic_event_end(self, task):
-        if task == 'segmentation':
+        if task == 'segmentation' and self.base_segmentation_widget is not None:
             self.base_segmentation_widget.on_logic_event_end()
-        elif task == 'diagnosis':
+        elif task == 'diagnosis' and self.base_diagnosis_widget is not None:
             self.base_diagnosis_widget.on_logic_event_end()
 
     def on_logic_event_abort(self, task):
@@ -197,17 +233,22 @@ class RaidionicsWidget():
         self.logging_textedit.append(log)
 
     def on_logic_event_progress(self, task, progress, log):
-        if task == 'segmentation':
+        if task == 'segmentation' and self.base_segmentation_widget is not None:
             self.base_segmentation_widget.on_logic_event_progress(progress, log)
-        elif task == 'diagnosis':
+        elif task == 'diagnosis' and self.base_diagnosis_widget is not None:
             self.base_diagnosis_widget.on_logic_event_progress(progress, log)
 
     def on_models_active_update_options_state_changed(self, state):
         SharedResources.getInstance().global_active_model_update = False if state == 0 else True
+        if SharedResources.getInstance().global_active_model_update:
+            # All local models are checked at once in the background, the verdicts are then shown as badges
+            ModelUpdateScanner.getInstance().start(force_refresh=True)
 
     def on_purge_docker_images_options_clicked(self):
         pass
 
     def set_default(self):
-        self.base_segmentation_widget.set_default()
-        self.base_diagnosis_widget.set_default()
+        if self.base_segmentation_widget is not None:
+            self.base_segmentation_widget.set_default()
+        if self.base_diagnosis_widget is not None:
+            self.base_diagnosis_widget.set_default()
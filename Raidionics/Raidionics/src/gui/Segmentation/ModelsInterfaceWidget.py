@@ -10,9 +10,13 @@ if sys.version_info.major == 3:
     from functools import reduce
 
 from src.utils.resources import SharedResources
+from src.utils.local_registry import LocalRegistry
+from src.utils.cloud_catalog import CloudCatalog
 from src.logic.model_parameters import *
 from src.RaidionicsLogic import RaidionicsLogic
-from src.utils.io_utilities import get_available_cloud_models_list, download_cloud_model, download_cloud_model_thread, check_local_model_for_update
+from src.logic.prefetch_service import PrefetchService
+from src.logic.model_update_scanner import ModelUpdateScanner
+from src.utils.io_utilities import get_available_cloud_models_list, download_cloud_model, download_cloud_model_thread
 from src.gui.UtilsWidgets.DownloadDialog import DownloadDialog
 
 
@@ -37,7 +41,10 @@ class ModelsInterfaceWidget(qt.QWidget):
         # self.on_model_selection(0)
         self.jsonModels = []
         self.populate_local_models()
-        self.populate_cloud_models()
+        # The last known catalog is displayed right away, and refreshed in the background
+        self.populate_cloud_models(offline=True)
+        self.cloud_catalog_refresh_thread = CloudCatalog.getInstance().refresh_in_background(['models'])
+        qt.QTimer.singleShot(500, self.on_cloud_catalog_refresh_poll)
 
     def setup_cloud_models_area(self):
         self.cloud_models_area_groupbox = ctk.ctkCollapsibleGroupBox()
@@ -77,6 +84,11 @@ class ModelsInterfaceWidget(qt.QWidget):
         self.modelsFormLayout.addRow("Details:", self.local_model_moreinfo_pushbutton)
         self.local_model_moreinfo_pushbutton.setEnabled(False)
 
+        # Badge only shown when the background update scan found a newer version of the selected item
+        self.local_model_update_pushbutton = qt.QPushButton('Update available, press to download')
+        self.modelsFormLayout.addRow(self.local_model_update_pushbutton)
+        self.local_model_update_pushbutton.setVisible(False)
+
     def setup_model_parameters_area(self):
         # Parameters Area
         parametersCollapsibleButton = ctk.ctkCollapsibleGroupBox()
@@ -96,6 +108,8 @@ class ModelsInterfaceWidget(qt.QWidget):
         self.local_models_area_searchbox.connect("textChanged(QString)", self.on_local_model_search)
         self.local_model_selector_combobox.connect('currentIndexChanged(int)', self.on_model_selection)
         self.local_model_moreinfo_pushbutton.connect('clicked()', self.on_model_details_selected)
+        self.local_model_update_pushbutton.connect('clicked()', self.on_model_update_selected)
+        ModelUpdateScanner.getInstance().add_listener(self.refresh_update_badge)
 
     def on_cloud_model_selection(self, index):
         pass
@@ -128,13 +142,19 @@ class ModelsInterfaceWidget(qt.QWidget):
         self.populate_local_models()
         self.populate_cloud_models()
 
-    def populate_cloud_models(self):
+    def on_cloud_catalog_refresh_poll(self):
+        if self.cloud_catalog_refresh_thread.is_alive():
+            qt.QTimer.singleShot(500, self.on_cloud_catalog_refresh_poll)
+            return
+        self.populate_cloud_models(offline=True)
+
+    def populate_cloud_models(self, offline=False):
         self.cloud_models_list = []
         self.cloud_model_selector_combobox.clear()
-        cloud_models_list = get_available_cloud_models_list()
+        cloud_models_list = get_available_cloud_models_list(offline=offline)
+        local_names = set(LocalRegistry.getInstance().get_names())
         for idx, model in enumerate(cloud_models_list):
-            already_local = True if True in [x["name"] == model[0] for x in self.jsonModels] else False
-            if not already_local:
+            if model[0] not in local_names:
                 self.cloud_models_list.append(model)
                 self.cloud_model_selector_combobox.addItem(model[0], idx)
 
@@ -151,18 +171,14 @@ class ModelsInterfaceWidget(qt.QWidget):
         selected_model = self.local_model_selector_combobox.currentText
         # @TODO. Should also check if the files are still on disk, before sending the OK signal?
         # @TODO. Should also check for an update of the docker image by comparing sha numbers?
-        if SharedResources.getInstance().global_active_model_update:
-            dl_req = check_local_model_for_update(selected_model)
-            if dl_req:
-                diag = DownloadDialog(self)
-                diag.set_model_name(selected_model)
-                diag.exec()
+        self.refresh_update_badge()
         self.model_parameters.destroy()
         json_model = self.find_json_model(selected_model_name=selected_model)
         if not json_model:
             return
 
         self.model_parameters.create(json_model)
+        PrefetchService.getInstance().record_usage('models', selected_model)
 
         if "briefdescription" in json_model:
             tip = json_model["briefdescription"]
@@ -204,34 +220,18 @@ class ModelsInterfaceWidget(qt.QWidget):
         searchTextList = searchText.split()
         for idx, j in enumerate(self.jsonModels):
             lname = j["name"].lower()
-            if 'task' in j and j['task'] == 'Segmentation':
-                # require all elements in list, to add to select. case insensitive
-                if reduce(lambda x, y: x and (lname.find(y.lower()) != -1), [True] + searchTextList):
-                    self.local_model_selector_combobox.addItem(j["name"], idx)
+            # require all elements in list, to add to select. case insensitive
+            if reduce(lambda x, y: x and (lname.find(y.lower()) != -1), [True] + searchTextList):
+                self.local_model_selector_combobox.addItem(j["name"], idx)
 
     def populate_local_models(self):
-        digests = self.get_existing_digests()
-        jsonFiles = glob(SharedResources.getInstance().json_local_dir + "/*.json")
-        jsonFiles = sorted(jsonFiles)
-        #jsonFiles.sort(cmp=lambda x, y: cmp(os.path.basename(x), os.path.basename(y)))
-        self.jsonModels = []
+        # Only the configuration files added or modified since the last refresh are parsed
+        LocalRegistry.getInstance().refresh()
+        self.jsonModels = LocalRegistry.getInstance().get_configs(task='Segmentation')
         self.local_model_selector_combobox.clear()
         self.local_model_selector_combobox.addItem("", 0)
-        for fname in jsonFiles:
-            with open(fname, "r") as fp:
-                j = json.load(fp, object_pairs_hook=OrderedDict)
-
-            self.jsonModels.append(j)
-            # if j['docker']['digest'] in digests:
-            #     self.jsonModels.append(j)
-            # else:
-            #     os.remove(fname)
-        # add all the models listed in the json files
-        # print('JSON models: {}'.format(self.jsonModels))
         for idx, j in enumerate(self.jsonModels):
-            name = j["name"]
-            if 'task' in j and j['task'] == 'Segmentation':
-                self.local_model_selector_combobox.addItem(name, idx + 1)
+            self.local_model_selector_combobox.addItem(j["name"], idx + 1)
 
         if len(self.jsonModels) >= 1:
             self.local_model_moreinfo_pushbutton.setEnabled(True)
@@ -267,7 +267,9 @@ class ModelsInterfaceWidget(qt.QWidget):
         if index == 0:
             return
 
-        model_json = self.jsonModels[[x['name'] == self.local_model_selector_combobox.currentText for x in self.jsonModels].index(True)]
+        model_json = self.find_json_model(selected_model_name=self.local_model_selector_combobox.currentText)
+        if model_json is None:
+            return
 
         tip = ''
         exhaustive_list = ['owner', 'task', 'organ', 'target', 'modality', 'sequence', 'dataset_description',
@@ -283,9 +285,22 @@ class ModelsInterfaceWidget(qt.QWidget):
         x = popup.exec_()
 
     def find_json_model(self, selected_model_name):
-        json_model = None
-        for m in self.jsonModels:
-            if m['name'] == selected_model_name:
-                json_model = m
-                break
-        return json_model
+        return LocalRegistry.getInstance().get_config(selected_model_name)
+
+    def refresh_update_badge(self):
+        """
+        Shows the update badge if the last background scan found a newer version of the selected model.
+        Only the cached verdict is read, no network access or hashing is performed here.
+        """
+        selected_name = self.local_model_selector_combobox.currentText
+        update_available = SharedResources.getInstance().global_active_model_update and selected_name != '' and \
+            ModelUpdateScanner.getInstance().is_update_available('models', selected_name)
+        self.local_model_update_pushbutton.setVisible(update_available)
+
+    def on_model_update_selected(self):
+        selected_name = self.local_model_selector_combobox.currentText
+        diag = DownloadDialog(self)
+        diag.set_model_name(selected_name)
+        if diag.exec():
+            ModelUpdateScanner.getInstance().clear_update('models', selected_name)
+        self.refresh_update_badge()
@@ -1,7 +1,7 @@
 from __main__ import qt, ctk, slicer, vtk
 import threading
 from src.utils.io_utilities import download_cloud_model, download_cloud_model_thread, download_cloud_diagnosis,\
-    DownloadWorker
+    DownloadWorker, get_gdown
 
 
 class DownloadDialog(qt.QDialog):
@@ -31,6 +31,7 @@ class DownloadDialog(qt.QDialog):
 
         self.worker = DownloadWorker()
         self.worker.finished_signal.connect(self.on_worker_finished)
+        self.worker.progress_signal.connect(self.on_worker_progress)
 
         # self.start_download_pushbutton.clicked.connect(self.on_worker_started())
         self.start_download_pushbuttonbox.clicked.connect(self.on_button_pressed)
@@ -71,9 +72,15 @@ class DownloadDialog(qt.QDialog):
             self.download_label.setText("Downloading, please wait ...")
             self.start_download_pushbutton.setEnabled(False)
             slicer.app.processEvents()
+            if self.docker_image_name is None:
+                # Installed from the main thread if needed, before the archives are fetched by the worker threads
+                get_gdown()
             self.worker.onWorkerStart(model=self.model_name, diagnosis=self.diagnosis_name,
                                       docker_image=self.docker_image_name)
 
+    def on_worker_progress(self, line):
+        self.download_label.setText("Downloading, please wait ...\n{}".format(line))
+
     def on_worker_finished(self, success_state):
         if success_state:
             self.accept()
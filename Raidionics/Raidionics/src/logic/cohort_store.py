@@ -0,0 +1,294 @@
+import os
+import csv
+import json
+import sqlite3
+import logging
+import threading
+import traceback
+from datetime import datetime
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+from src.utils.resources import SharedResources
+
+# Feature groups, to query the overall features apart from the (hundreds of) per-structure features
+COHORT_FEATURE_GROUPS = ['overall', 'cortical_structures', 'subcortical_structures']
+
+
+def get_feature_group(column: str) -> str:
+    """
+    Assigns a flattened report feature to its group, from the path of the feature in the report.
+    """
+    if '/CorticalStructures/' in column:
+        return 'cortical_structures'
+    elif '/SubcorticalStructures/' in column:
+        return 'subcortical_structures'
+    return 'overall'
+
+
+def flatten_report(json_content: dict, prefix: str = '') -> OrderedDict:
+    """
+    Flattens a clinical report into one feature per leaf value, named after its path in the report
+    (e.g., Main/Total/CorticalStructures/MNI/Frontal_Lobe). Booleans are stored as 0/1, lists and empty values are
+    skipped.
+
+    Parameters
+    ----------
+    json_content: dict
+        Content of a clinical report, as produced by RADS (e.g., neuro_clinical_report.json).
+    prefix: str
+        Path of json_content within the report, used for the recursion.
+
+    Returns
+    -------
+    Ordered dictionary of feature name -> scalar value (float or str).
+    """
+    features = OrderedDict()
+    for key, value in json_content.items():
+        column = prefix + str(key)
+        if isinstance(value, dict):
+            features.update(flatten_report(value, prefix=column + '/'))
+        elif isinstance(value, bool):
+            features[column] = float(value)
+        elif isinstance(value, (int, float)):
+            features[column] = float(value)
+        elif isinstance(value, str) and value.strip() != '':
+            try:
+                features[column] = float(value)
+            except ValueError:
+                features[column] = value
+    return features
+
+
+class CohortStore:
+    """
+    Singleton class aggregating every completed RADS report into a single append-only SQLite database, with one row
+    per patient and timepoint, and one (report, feature, value) row per report feature (volumes, laterality, atlas
+    overlaps and distances). The long layout holds any number of features, and cohort statistics are obtained as a
+    query pivoted to columnar numpy arrays, without parsing the reports again.
+    """
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if CohortStore.__instance == None:
+            CohortStore()
+        return CohortStore.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if CohortStore.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            CohortStore.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.database_filename = os.path.join(SharedResources.getInstance().Raidionics_dir, 'cohort_results.sqlite')
+        self.lock = threading.Lock()
+        self.features = None  # Feature name -> [feature_id, group, numeric], loaded upon first use
+
+    def __connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.database_filename)
+        connection.execute("CREATE TABLE IF NOT EXISTS reports (report_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                           "patient_id TEXT, timepoint TEXT, fingerprint TEXT, task TEXT, model TEXT, "
+                           "report_filename TEXT, created_at TEXT)")
+        connection.execute("CREATE INDEX IF NOT EXISTS reports_patient ON reports (patient_id, timepoint)")
+        connection.execute("CREATE TABLE IF NOT EXISTS features (feature_id INTEGER PRIMARY KEY, feature TEXT UNIQUE, "
+                           "feature_group TEXT, numeric INTEGER)")
+        # Text values are kept apart, such that the value column only holds numbers
+        connection.execute("CREATE TABLE IF NOT EXISTS report_features (report_id INTEGER, feature_id INTEGER, "
+                           "value REAL, text_value TEXT, PRIMARY KEY (report_id, feature_id))")
+        connection.execute("CREATE INDEX IF NOT EXISTS report_features_feature ON report_features (feature_id)")
+        if self.features is None:
+            self.features = OrderedDict()
+            for feature_id, feature, group, numeric in connection.execute(
+                    "SELECT feature_id, feature, feature_group, numeric FROM features ORDER BY feature_id"):
+                self.features[feature] = [feature_id, group, bool(numeric)]
+        return connection
+
+    def __get_feature_id(self, connection: sqlite3.Connection, feature: str, numeric: bool) -> int:
+        """
+        Returns the identifier of the feature, registered upon first occurrence. A feature holding a text value once
+        is no longer considered numeric.
+        """
+        if feature not in self.features.keys():
+            cursor = connection.execute("INSERT INTO features (feature, feature_group, numeric) VALUES (?, ?, ?)",
+                                        (feature, get_feature_group(feature), int(numeric)))
+            self.features[feature] = [cursor.lastrowid, get_feature_group(feature), numeric]
+        elif self.features[feature][2] and not numeric:
+            connection.execute("UPDATE features SET numeric = 0 WHERE feature_id = ?", (self.features[feature][0],))
+            self.features[feature][2] = False
+        return self.features[feature][0]
+
+    def append_report(self, report_filename: str, task: str, patient_id: str, timepoint: str = 'T0',
+                      fingerprint: str = None, model_name: str = None) -> int:
+        """
+        Flattens a clinical report and appends it to the store. Earlier reports of the same input volume and timepoint
+        are kept, queries return the latest one by default.
+
+        Parameters
+        ----------
+        report_filename: str
+            Location on disk of the report, in json format.
+        task: str
+            Diagnosis task which produced the report, e.g. neuro_diagnosis or mediastinum_diagnosis.
+        patient_id: str
+            Identifier of the patient, e.g. the name of the input volume node.
+        timepoint: str
+            Timestamp folder of the input, e.g. T0 for preoperative.
+        fingerprint: str
+            Fingerprint of the input volume, see compute_image_fingerprint.
+        model_name: str
+            Name of the diagnosis model used.
+
+        Returns
+        -------
+        The identifier of the new report row, or None if the report could not be stored.
+        """
+        try:
+            with open(report_filename, 'r') as infile:
+                features = flatten_report(json.load(infile))
+            with self.lock:
+                connection = self.__connect()
+                try:
+                    with connection:
+                        cursor = connection.execute("INSERT INTO reports (patient_id, timepoint, fingerprint, task, "
+                                                    "model, report_filename, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                                    (patient_id, timepoint, fingerprint, task, model_name,
+                                                     report_filename, datetime.now().isoformat()))
+                        report_id = cursor.lastrowid
+                        rows = []
+                        for feature, value in features.items():
+                            numeric = isinstance(value, float)
+                            rows.append((report_id, self.__get_feature_id(connection, feature, numeric),
+                                         value if numeric else None, None if numeric else value))
+                        connection.executemany("INSERT INTO report_features VALUES (?, ?, ?, ?)", rows)
+                except Exception:
+                    # The feature cache may hold features from the rolled back transaction
+                    self.features = None
+                    raise
+                finally:
+                    connection.close()
+            return report_id
+        except Exception:
+            logging.warning("Unable to store the report {} in the cohort results.".format(report_filename))
+            logging.warning(traceback.format_exc())
+            return None
+
+    def get_features(self, group: str = 'overall') -> List[str]:
+        """
+        Lists the features stored for a group, in order of first occurrence.
+        """
+        with self.lock:
+            self.__connect().close()
+            return [x for x in self.features.keys() if self.features[x][1] == group]
+
+    def query(self, group: str = 'overall', features: List[str] = None, patient_ids: List[str] = None,
+              timepoints: List[str] = None, task: str = None, latest_only: bool = True) -> OrderedDict:
+        """
+        Retrieves the stored reports as columns, one numpy array per feature and per report metadata field.
+        Numeric features are returned as float arrays, with NaN for missing values, and features holding text in any
+        report as object arrays (None for missing values).
+
+        Parameters
+        ----------
+        group: str
+            Feature group to query, from COHORT_FEATURE_GROUPS.
+        features: List[str]
+            Subset of features to retrieve, all features of the group if None.
+        patient_ids: List[str]
+            Subset of patients to retrieve, all patients if None.
+        timepoints: List[str]
+            Subset of timepoints to retrieve (e.g., ['T0']), all timepoints if None.
+        task: str
+            Only retrieves the reports produced by the given diagnosis task, if not None.
+        latest_only: bool
+            Only retrieves the latest report for each input volume (i.e., fingerprint) and timepoint, the patient_id
+            being the name of the input node and not necessarily unique across patients (e.g., 'T1').
+
+        Returns
+        -------
+        Ordered dictionary of column name -> numpy array, with the report_id, patient_id, timepoint, fingerprint,
+        task, model and created_at metadata columns first.
+        """
+        metadata = ['report_id', 'patient_id', 'timepoint', 'fingerprint', 'task', 'model', 'created_at']
+        with self.lock:
+            connection = self.__connect()
+            try:
+                if features is None:
+                    features = [x for x in self.features.keys() if self.features[x][1] == group]
+                features = [x for x in features if x in self.features.keys()]
+                feature_ids = np.array([self.features[x][0] for x in features], dtype=np.int64)
+                numeric = [self.features[x][2] for x in features]
+                conditions = []
+                arguments = []
+                if patient_ids is not None:
+                    conditions.append("patient_id IN ({})".format(', '.join(['?'] * len(patient_ids))))
+                    arguments.extend(patient_ids)
+                if timepoints is not None:
+                    conditions.append("timepoint IN ({})".format(', '.join(['?'] * len(timepoints))))
+                    arguments.extend(timepoints)
+                if task is not None:
+                    conditions.append("task = ?")
+                    arguments.append(task)
+                if latest_only:
+                    conditions.append("report_id IN (SELECT MAX(report_id) FROM reports "
+                                      "GROUP BY COALESCE(fingerprint, patient_id), timepoint, task)")
+                where = "" if len(conditions) == 0 else " WHERE " + " AND ".join(conditions)
+                reports = connection.execute("SELECT {} FROM reports{} ORDER BY report_id".format(
+                    ', '.join(metadata), where), arguments).fetchall()
+                values = []
+                if len(reports) != 0 and len(features) != 0:
+                    # The identifiers come from the features table, and are inlined not to hit the SQLite limit on
+                    # the number of query parameters with hundreds of structures
+                    values = connection.execute(
+                        "SELECT report_id, feature_id, value, text_value FROM report_features WHERE feature_id IN "
+                        "({}) AND report_id IN (SELECT report_id FROM reports{})".format(
+                            ', '.join([str(int(x)) for x in feature_ids]), where), arguments).fetchall()
+            finally:
+                connection.close()
+
+        results = OrderedDict()
+        for i, name in enumerate(metadata):
+            results[name] = np.array([x[i] for x in reports], dtype=np.int64 if name == 'report_id' else object)
+        # Pivot of the (report, feature, value) rows into one column per feature, reports being sorted by identifier
+        numeric_values = np.full((len(features), len(reports)), np.nan)
+        text_values = np.full((len(features), len(reports)), None, dtype=object)
+        if len(values) != 0:
+            value_report_ids = np.array([x[0] for x in values], dtype=np.int64)
+            value_feature_ids = np.array([x[1] for x in values], dtype=np.int64)
+            rows = np.searchsorted(results['report_id'], value_report_ids)
+            feature_order = np.argsort(feature_ids)
+            columns = feature_order[np.searchsorted(feature_ids[feature_order], value_feature_ids)]
+            numbers = np.array([np.nan if x[2] is None else x[2] for x in values], dtype=np.float64)
+            numeric_values[columns, rows] = numbers
+            text_values[columns, rows] = [x[3] if x[3] is not None else x[2] for x in values]
+        for i, name in enumerate(features):
+            results[name] = numeric_values[i] if numeric[i] else text_values[i]
+        return results
+
+    def export_csv(self, filename: str, group: str = 'overall', **kwargs) -> bool:
+        """
+        Writes the result of a query (see query for the filtering arguments) to a csv file, one row per report.
+
+        Returns
+        -------
+        True if the file was written, False otherwise.
+        """
+        try:
+            results = self.query(group=group, **kwargs)
+            with open(filename, 'w', newline='') as outfile:
+                writer = csv.writer(outfile)
+                writer.writerow(list(results.keys()))
+                for i in range(len(results['report_id'])):
+                    writer.writerow(['' if x[i] is None or (isinstance(x[i], float) and np.isnan(x[i])) else x[i]
+                                     for x in results.values()])
+            return True
+        except Exception:
+            logging.warning("Unable to export the cohort results to {}.".format(filename))
+            logging.warning(traceback.format_exc())
+            return False
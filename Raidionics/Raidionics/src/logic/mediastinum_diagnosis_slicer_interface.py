@@ -1,13 +1,18 @@
+import logging
+import traceback
+
 from slicer.ScriptedLoadableModule import *
 
 import os
 import csv
-from random import randint
 from __main__ import qt, ctk, slicer, vtk
 
 import SimpleITK as sitk
 import sitkUtils
 from src.utils.resources import SharedResources
+from src.logic.segmentation_surfaces import SegmentationSurfaceGenerator
+from src.logic.output_nodes_manager import OutputNodesManager
+from src.logic.segmentation_import import import_label_files_to_segmentation
 from src.logic.mediastinum_diagnosis_result_parameters import *
 
 
@@ -38,6 +43,10 @@ class MediastinumDiagnosisSlicerInterface:
         self.segmentation_nodes_descriptions = dict()
 
     def set_default(self):
+        for n in self.segmentation_nodes.keys():
+            SegmentationSurfaceGenerator.getInstance().unregister(self.segmentation_nodes[n])
+            OutputNodesManager.getInstance().release(self.segmentation_nodes[n])
+        self.segmentation_nodes = dict()
         self.clear_view()
 
     def clear_view(self):
@@ -50,7 +59,9 @@ class MediastinumDiagnosisSlicerInterface:
         if len(self.segmentation_nodes.keys()) != 0:
             for n in self.segmentation_nodes.keys():
                 node = self.segmentation_nodes[n]
-                slicer.mrmlScene.RemoveNode(node)
+                SegmentationSurfaceGenerator.getInstance().unregister(node)
+                # The managed nodes are kept in the scene, and emptied to be filled again by the next run
+                node.GetSegmentation().RemoveAllSegments()
             self.segmentation_nodes = dict()
             self.segmentation_nodes_descriptions = dict()
 
@@ -70,11 +81,11 @@ class MediastinumDiagnosisSlicerInterface:
             try:
                 if output != 'Tracts':
                     output_node = outputs[output]
-                    seg_node = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode')
+                    seg_node = OutputNodesManager.getInstance().get_segmentation_node(output)
                     slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(output_node, seg_node)
-                    seg_node.CreateClosedSurfaceRepresentation()
-                    seg_node.SetName(output)
                     self.segmentation_nodes[output] = seg_node
+                    # Closed surfaces are only generated once the node is displayed in 3D
+                    SegmentationSurfaceGenerator.getInstance().register(seg_node)
 
                     if 'color' in iodict[output]:
                         detailed_color = [int(x) for x in iodict[output]['color'].split(',')]
@@ -108,63 +119,35 @@ class MediastinumDiagnosisSlicerInterface:
                     file.close()
 
                     self.segmentation_nodes_descriptions[output] = desc_info
+                    # All tracts are packed into a single segmentation node, with one segment per tract
+                    tract_filenames = []
+                    tract_names = []
                     for l in desc_info:
                         item_name = l['text']
                         item_label_filename = os.path.join(SharedResources.getInstance().output_path,
                                                            '_'.join(item_name.split(' ')) + '_mni_tract_to_input.nii.gz')
                         if os.path.exists(item_label_filename):
-                            node = slicer.vtkMRMLLabelMapVolumeNode()
-                            node.SetName(item_name)
-                            slicer.mrmlScene.AddNode(node)
-                            node.CreateDefaultDisplayNodes()
-                            imageData = vtk.vtkImageData()
-                            imageData.SetDimensions((150, 150, 150))
-                            imageData.AllocateScalars(vtk.VTK_SHORT, 1)
-                            node.SetAndObserveImageData(imageData)
-                            label_map = sitk.ReadImage(item_label_filename)
-                            nodeWriteAddress = sitkUtils.GetSlicerITKReadWriteAddress(node)
-                            sitk.WriteImage(label_map, nodeWriteAddress)
-                            applicationLogic = slicer.app.applicationLogic()
-                            selectionNode = applicationLogic.GetSelectionNode()
-                            selectionNode.SetReferenceActiveLabelVolumeID(node.GetID())
-                            applicationLogic.PropagateVolumeSelection(0)
-                            applicationLogic.FitSliceToAll()
-                            self.labelmap_nodes[item_name] = node
-
-                            seg_node = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode')
-                            slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(node, seg_node)
-                            seg_node.CreateClosedSurfaceRepresentation()
-                            seg_node.SetName(item_name)
-                            detailed_color = [randint(0, 255), randint(0, 255), randint(0, 255)]
-                            detailed_color = [x / 255. for x in detailed_color]
-                            seg_node.GetSegmentation().GetNthSegment(0).SetColor(detailed_color[0], detailed_color[1],
-                                                                                 detailed_color[2])
-                            self.segmentation_nodes[item_name] = seg_node
-                            # model_parameters.segmentations[output] = seg_node
-                            # result = sitk.ReadImage(item_label_filename)
-                            # output_node = outputs[output_volume]
-                            # output_node_name = output_node.GetName()
-                            # # if iodict[output_volume]["voltype"] == 'LabelMap':
-                            # nodeWriteAddress = sitkUtils.GetSlicerITKReadWriteAddress(output_node_name)
-                            # self.display_port = nodeWriteAddress
-                            # sitk.WriteImage(result, nodeWriteAddress)
-                            # applicationLogic = slicer.app.applicationLogic()
-                            # selectionNode = applicationLogic.GetSelectionNode()
-                            #
-                            # outputLabelMap = True
-                            # if outputLabelMap:
-                            #     selectionNode.SetReferenceActiveLabelVolumeID(output_node.GetID())
-                            # else:
-                            #     selectionNode.SetReferenceActiveVolumeID(output_node.GetID())
-                            #
-                            # applicationLogic.PropagateVolumeSelection(0)
-                            # applicationLogic.FitSliceToAll()
+                            tract_filenames.append(item_label_filename)
+                            tract_names.append(item_name)
+                    if len(tract_filenames) != 0:
+                        seg_node = OutputNodesManager.getInstance().get_segmentation_node(output)
+                        import_label_files_to_segmentation(tract_filenames, tract_names, seg_node)
+                        self.segmentation_nodes[output] = seg_node
+                        SegmentationSurfaceGenerator.getInstance().register(seg_node)
 
             except Exception as e:
                 pass
 
     def on_optimal_display(self, model_parameters):
         """
-
+        Displays all the segmentation nodes in 3D, their closed surfaces being generated upon first display.
         """
-        pass
+        for output in self.segmentation_nodes.keys():
+            try:
+                display_node = self.segmentation_nodes[output].GetDisplayNode()
+                if display_node is not None:
+                    display_node.SetAllSegmentsVisibility(True)
+                    display_node.SetVisibility3D(True)
+            except Exception:
+                logging.warning("Issue during optimal display setup.")
+                logging.warning(traceback.format_exc())
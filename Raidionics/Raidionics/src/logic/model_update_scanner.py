@@ -0,0 +1,145 @@
+import os
+import logging
+import threading
+import traceback
+from __main__ import qt
+
+from src.utils.local_registry import LocalRegistry
+from src.utils.cloud_catalog import CloudCatalog
+from src.utils.archive_utilities import compute_file_md5, is_archive_up_to_date
+from src.utils.io_utilities import get_model_archive_filename, get_diagnosis_config_cache_filename, \
+    resolve_model_dependencies
+
+
+class ModelUpdateScanner:
+    """
+    Singleton class checking, in the background, all the local models and diagnoses against a single snapshot of the
+    cloud catalogs. The verdicts are cached, such that selecting a model only reads whether an update is available,
+    without any network access or hashing.
+    The listeners are notified on the main thread once a scan is over.
+    """
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if ModelUpdateScanner.__instance == None:
+            ModelUpdateScanner()
+        return ModelUpdateScanner.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if ModelUpdateScanner.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            ModelUpdateScanner.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.thread = None
+        self.verdicts = {'models': {}, 'diagnoses': {}}  # Item kind -> item name -> update available
+        self.listeners = []
+        self.poll_interval = 500  # In milliseconds
+        self.lock = threading.Lock()
+
+    def add_listener(self, callback) -> None:
+        """
+        Registers a function called without arguments, on the main thread, every time a scan is over.
+        """
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+
+    def is_scanning(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def is_update_available(self, kind: str, name: str) -> bool:
+        """
+        Returns the cached verdict for a local item, False if not scanned yet.
+
+        Parameters
+        ----------
+        kind: str
+            Item category, between models and diagnoses.
+        name: str
+            Unique name identifier of the model or diagnosis.
+        """
+        with self.lock:
+            return self.verdicts.get(kind, {}).get(name, False)
+
+    def clear_update(self, kind: str, name: str) -> None:
+        """
+        Marks an item as up-to-date, e.g. after it has been downloaded again.
+        """
+        with self.lock:
+            if name in self.verdicts[kind].keys():
+                self.verdicts[kind][name] = False
+
+    def start(self, force_refresh: bool = False) -> None:
+        """
+        Launches a scan on a background thread, unless one is already running.
+
+        Parameters
+        ----------
+        force_refresh: bool
+            Validates the catalogs against the remote versions, regardless of their age.
+        """
+        if self.is_scanning():
+            return
+        self.thread = threading.Thread(target=self.__run, args=(force_refresh,))
+        self.thread.daemon = True  # Not delaying the application exit
+        self.thread.start()
+        qt.QTimer.singleShot(self.poll_interval, self.__poll)
+
+    def __poll(self) -> None:
+        if self.is_scanning():
+            qt.QTimer.singleShot(self.poll_interval, self.__poll)
+            return
+        for callback in self.listeners:
+            try:
+                callback()
+            except Exception:
+                logging.warning("Update scan listener failed.")
+                logging.warning(traceback.format_exc())
+
+    def __list_local_items(self):
+        LocalRegistry.getInstance().refresh()
+        return LocalRegistry.getInstance().get_names(task='Segmentation'), \
+            LocalRegistry.getInstance().get_names(task='Diagnosis')
+
+    def __run(self, force_refresh: bool) -> None:
+        try:
+            models, diagnoses = self.__list_local_items()
+            models_snapshot = CloudCatalog.getInstance().get_snapshot('models', force_refresh)
+            diagnoses_snapshot = CloudCatalog.getInstance().get_snapshot('diagnoses', force_refresh)
+            # Archives shared as dependencies by several items are only checked once
+            archive_verdicts = dict()
+
+            def models_outdated(model_names) -> bool:
+                outdated = False
+                for m in resolve_model_dependencies(model_names, models_snapshot):
+                    if m['name'] not in archive_verdicts.keys():
+                        archive_verdicts[m['name']] = not is_archive_up_to_date(get_model_archive_filename(m['name']),
+                                                                                m['checksum'])
+                    outdated = outdated or archive_verdicts[m['name']]
+                return outdated
+
+            model_verdicts = dict()
+            for model in models:
+                model_verdicts[model] = model in models_snapshot.keys() and models_outdated([model])
+
+            diagnosis_verdicts = dict()
+            for diagnosis in diagnoses:
+                if diagnosis not in diagnoses_snapshot.keys():
+                    diagnosis_verdicts[diagnosis] = False
+                    continue
+                entry = CloudCatalog.parse_row(diagnoses_snapshot[diagnosis])
+                config_filename = get_diagnosis_config_cache_filename(diagnosis)
+                config_outdated = not os.path.exists(config_filename) or \
+                    (entry['checksum'].strip() != '' and compute_file_md5(config_filename) != entry['checksum'])
+                diagnosis_verdicts[diagnosis] = config_outdated or models_outdated(entry['dependencies'])
+
+            with self.lock:
+                self.verdicts = {'models': model_verdicts, 'diagnoses': diagnosis_verdicts}
+        except Exception:
+            logging.warning("Unable to scan the local models for updates.")
+            logging.warning(traceback.format_exc())
@@ -134,6 +134,12 @@ class TumorStatistics():
         self.mni_space_expected_resectable_tumor_volume = None
         self.mni_space_expected_residual_tumor_volume = None
         self.mni_space_resectability_index = None
+        # The MNI-space values need a backend run, and are outdated once the tumor has been edited locally
+        self.mni_space_outdated = False
         self.mni_space_cortical_structures_overlap = {}
         self.mni_space_subcortical_structures_overlap = {}
         self.mni_space_subcortical_structures_distance = {}
+        # Computed locally from the atlases registered to the patient space, after edits of the tumor
+        self.patient_space_cortical_structures_overlap = {}
+        self.patient_space_subcortical_structures_overlap = {}
+        self.patient_space_subcortical_structures_distance = {}
@@ -5,12 +5,20 @@ from slicer.ScriptedLoadableModule import *
 
 import os
 import csv
-from random import randint
+import operator
+import collections
 from __main__ import qt, ctk, slicer, vtk
 
+import numpy as np
 import SimpleITK as sitk
 import sitkUtils
 from src.utils.resources import SharedResources
+from src.RaidionicsLogic import RaidionicsLogic
+from src.utils.neuro_features_utilities import compute_tumor_features, index_atlas_structures, \
+    compute_structures_overlap, compute_structures_distance
+from src.logic.segmentation_surfaces import SegmentationSurfaceGenerator
+from src.logic.output_nodes_manager import OutputNodesManager
+from src.logic.segmentation_import import import_label_files_to_segmentation
 from src.logic.neuro_diagnosis_result_parameters import *
 
 
@@ -39,11 +47,31 @@ class NeuroDiagnosisSlicerInterface:
         self.labelmap_nodes = dict()
         self.segmentation_nodes = dict()
         self.segmentation_nodes_descriptions = dict()
+        self.tumor_node = None
+        self.tumor_node_observer = None
+        self.tumor_segmentation_observer = None
+        self.tumor_edit_source = 'labelmap'  # Node edited last, either the tumor label map or its segmentation
+        self.tumor_reference_mask = None  # Tumor label map as reported by the last run
+        self.tumor_last_mask = None  # Tumor mask the current statistics were computed from
+        self.brain_mask = None
+        self.atlas_maps = dict()  # Atlas name -> (label map in patient space, structures index, label -> name)
+        self.statistics_listeners = []
+        # Edits of the tumor label map are batched, the statistics being computed once the edits settle
+        self.tumor_edit_timer = qt.QTimer()
+        self.tumor_edit_timer.setSingleShot(True)
+        self.tumor_edit_timer.setInterval(500)
+        self.tumor_edit_timer.timeout.connect(self.update_tumor_statistics)
 
     def set_default(self):
+        self.unwatch_tumor_edits()
+        for n in self.segmentation_nodes.keys():
+            SegmentationSurfaceGenerator.getInstance().unregister(self.segmentation_nodes[n])
+            OutputNodesManager.getInstance().release(self.segmentation_nodes[n])
+        self.segmentation_nodes = dict()
         self.clear_view()
 
     def clear_view(self):
+        self.__unwatch_tumor_segmentation()
         if len(self.labelmap_nodes.keys()) != 0:
             for n in self.labelmap_nodes.keys():
                 node = self.labelmap_nodes[n]
@@ -53,7 +81,9 @@ class NeuroDiagnosisSlicerInterface:
         if len(self.segmentation_nodes.keys()) != 0:
             for n in self.segmentation_nodes.keys():
                 node = self.segmentation_nodes[n]
-                slicer.mrmlScene.RemoveNode(node)
+                SegmentationSurfaceGenerator.getInstance().unregister(node)
+                # The managed nodes are kept in the scene, and emptied to be filled again by the next run
+                node.GetSegmentation().RemoveAllSegments()
             self.segmentation_nodes = dict()
             self.segmentation_nodes_descriptions = dict()
 
@@ -73,11 +103,11 @@ class NeuroDiagnosisSlicerInterface:
             try:
                 if output != 'Tracts':
                     output_node = outputs[output]
-                    seg_node = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode')
+                    seg_node = OutputNodesManager.getInstance().get_segmentation_node(output)
                     slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(output_node, seg_node)
-                    seg_node.CreateClosedSurfaceRepresentation()
-                    seg_node.SetName(output)
                     self.segmentation_nodes[output] = seg_node
+                    # Closed surfaces are only generated once the node is displayed in 3D
+                    SegmentationSurfaceGenerator.getInstance().register(seg_node)
 
                     if 'color' in iodict[output]:
                         detailed_color = [int(x) for x in iodict[output]['color'].split(',')]
@@ -103,6 +133,10 @@ class NeuroDiagnosisSlicerInterface:
                             segm_desc = next((item for item in desc_info if int(float(item["label"])) == segm_label), None)
                             if segm_desc is not None:
                                 segm.SetName(segm_desc['text'])
+
+                    # Only observed once configured, such that only the subsequent edits update the statistics
+                    if output == 'Tumor':
+                        self.__watch_tumor_segmentation()
                 else:
                     desc_info = []
                     csv_filename = str(
@@ -114,57 +148,21 @@ class NeuroDiagnosisSlicerInterface:
                     file.close()
 
                     self.segmentation_nodes_descriptions[output] = desc_info
+                    # All tracts are packed into a single segmentation node, with one segment per tract
+                    tract_filenames = []
+                    tract_names = []
                     for l in desc_info:
                         item_name = l['text']
                         item_label_filename = os.path.join(SharedResources.getInstance().output_path,
                                                            '_'.join(item_name.split(' ')) + '_mni_tract_to_input.nii.gz')
                         if os.path.exists(item_label_filename):
-                            node = slicer.vtkMRMLLabelMapVolumeNode()
-                            node.SetName(item_name)
-                            slicer.mrmlScene.AddNode(node)
-                            node.CreateDefaultDisplayNodes()
-                            imageData = vtk.vtkImageData()
-                            imageData.SetDimensions((150, 150, 150))
-                            imageData.AllocateScalars(vtk.VTK_SHORT, 1)
-                            node.SetAndObserveImageData(imageData)
-                            label_map = sitk.ReadImage(item_label_filename)
-                            nodeWriteAddress = sitkUtils.GetSlicerITKReadWriteAddress(node)
-                            sitk.WriteImage(label_map, nodeWriteAddress)
-                            applicationLogic = slicer.app.applicationLogic()
-                            selectionNode = applicationLogic.GetSelectionNode()
-                            selectionNode.SetReferenceActiveLabelVolumeID(node.GetID())
-                            applicationLogic.PropagateVolumeSelection(0)
-                            applicationLogic.FitSliceToAll()
-                            self.labelmap_nodes[item_name] = node
-
-                            seg_node = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLSegmentationNode')
-                            slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(node, seg_node)
-                            seg_node.CreateClosedSurfaceRepresentation()
-                            seg_node.SetName(item_name)
-                            detailed_color = [randint(0, 255), randint(0, 255), randint(0, 255)]
-                            detailed_color = [x / 255. for x in detailed_color]
-                            seg_node.GetSegmentation().GetNthSegment(0).SetColor(detailed_color[0], detailed_color[1],
-                                                                                 detailed_color[2])
-                            self.segmentation_nodes[item_name] = seg_node
-                            # model_parameters.segmentations[output] = seg_node
-                            # result = sitk.ReadImage(item_label_filename)
-                            # output_node = outputs[output_volume]
-                            # output_node_name = output_node.GetName()
-                            # # if iodict[output_volume]["voltype"] == 'LabelMap':
-                            # nodeWriteAddress = sitkUtils.GetSlicerITKReadWriteAddress(output_node_name)
-                            # self.display_port = nodeWriteAddress
-                            # sitk.WriteImage(result, nodeWriteAddress)
-                            # applicationLogic = slicer.app.applicationLogic()
-                            # selectionNode = applicationLogic.GetSelectionNode()
-                            #
-                            # outputLabelMap = True
-                            # if outputLabelMap:
-                            #     selectionNode.SetReferenceActiveLabelVolumeID(output_node.GetID())
-                            # else:
-                            #     selectionNode.SetReferenceActiveVolumeID(output_node.GetID())
-                            #
-                            # applicationLogic.PropagateVolumeSelection(0)
-                            # applicationLogic.FitSliceToAll()
+                            tract_filenames.append(item_label_filename)
+                            tract_names.append(item_name)
+                    if len(tract_filenames) != 0:
+                        seg_node = OutputNodesManager.getInstance().get_segmentation_node(output)
+                        import_label_files_to_segmentation(tract_filenames, tract_names, seg_node)
+                        self.segmentation_nodes[output] = seg_node
+                        SegmentationSurfaceGenerator.getInstance().register(seg_node)
 
             except Exception as e:
                 pass
@@ -181,6 +179,7 @@ class NeuroDiagnosisSlicerInterface:
                     node = self.segmentation_nodes[output]
                     display_node = node.GetDisplayNode()
                     display_node.SetAllSegmentsVisibility(True)
+                    display_node.SetVisibility3D(True)
                 elif output == 'Brain':
                     node = self.segmentation_nodes[output]
                     display_node = node.GetDisplayNode()
@@ -192,6 +191,9 @@ class NeuroDiagnosisSlicerInterface:
                         struct_overlap_info = NeuroDiagnosisParameters.getInstance().statistics['Main']['Overall'].mni_space_cortical_structures_overlap[output]
                     elif output in NeuroDiagnosisParameters.getInstance().statistics['Main']['Overall'].mni_space_subcortical_structures_overlap.keys():
                         struct_overlap_info = NeuroDiagnosisParameters.getInstance().statistics['Main']['Overall'].mni_space_subcortical_structures_overlap[output]
+                    if struct_overlap_info is None:
+                        # E.g., the tracts, left as they are
+                        continue
 
                     node = self.segmentation_nodes[output]
                     display_node = node.GetDisplayNode()
@@ -211,7 +213,189 @@ class NeuroDiagnosisSlicerInterface:
                         if sname != '':
                             display_node.SetSegmentVisibility(sname, True)
                             display_node.SetSegmentOpacity(sname, 0.5)
+                    # Only the closed surfaces of the structures displayed above are generated
+                    display_node.SetVisibility3D(True)
 
             except Exception as e:
                 logging.warning("Issue during optimal display setup.")
                 logging.warning(traceback.format_exc())
+
+    def add_statistics_listener(self, callback) -> None:
+        """
+        Registers a function called without arguments every time the tumor statistics are computed again locally.
+        """
+        if callback not in self.statistics_listeners:
+            self.statistics_listeners.append(callback)
+
+    def watch_tumor_edits(self, model_parameters) -> None:
+        """
+        Monitors the tumor label map produced by the last run, and the tumor segmentation displayed from it, such
+        that their edits (e.g., interactive thresholding, or manual corrections in the Segment Editor) update the
+        patient-space statistics of the report without running the backend again.
+        The brain mask of the last run is kept to locate the midline, and the atlases registered to the patient space
+        are kept together with their structure names for the overlaps and distances.
+        """
+        self.unwatch_tumor_edits()
+        if 'Tumor' not in model_parameters.outputs.keys() or model_parameters.outputs['Tumor'] is None:
+            return
+        self.tumor_node = model_parameters.outputs['Tumor']
+        if self.tumor_node.GetImageData() is not None:
+            self.tumor_reference_mask = slicer.util.arrayFromVolume(self.tumor_node).copy()
+        self.tumor_last_mask = self.tumor_reference_mask
+        self.brain_mask = None
+        if 'Brain' in RaidionicsLogic.getInstance().output_raw_values.keys():
+            self.brain_mask = RaidionicsLogic.getInstance().output_raw_values['Brain']
+        for output in model_parameters.outputs.keys():
+            if "atlas_category" not in model_parameters.iodict[output].keys() or \
+                    output not in RaidionicsLogic.getInstance().output_raw_values.keys():
+                continue
+            try:
+                atlas_map = RaidionicsLogic.getInstance().output_raw_values[output]
+                # The structures are only indexed upon the first edit of the tumor
+                self.atlas_maps[output] = [atlas_map, None, self.__read_atlas_structure_names(output)]
+            except Exception:
+                logging.warning("Unable to keep the {} atlas for the local statistics.".format(output))
+                logging.warning(traceback.format_exc())
+        self.tumor_node_observer = self.tumor_node.AddObserver(
+            slicer.vtkMRMLVolumeNode.ImageDataModifiedEvent,
+            lambda caller, event: self.__on_tumor_edited('labelmap'))
+        self.__watch_tumor_segmentation()
+
+    def unwatch_tumor_edits(self) -> None:
+        self.tumor_edit_timer.stop()
+        self.__unwatch_tumor_segmentation()
+        if self.tumor_node is not None and self.tumor_node_observer is not None:
+            self.tumor_node.RemoveObserver(self.tumor_node_observer)
+        self.tumor_node = None
+        self.tumor_node_observer = None
+        self.tumor_reference_mask = None
+        self.tumor_last_mask = None
+        self.brain_mask = None
+        self.atlas_maps = dict()
+
+    def __on_tumor_edited(self, source: str) -> None:
+        self.tumor_edit_source = source
+        self.tumor_edit_timer.start()
+
+    def __watch_tumor_segmentation(self) -> None:
+        """
+        Observes the tumor segmentation node, once both the tumor label map is watched and the segmentation exists.
+        """
+        if self.tumor_node is None or self.tumor_segmentation_observer is not None or \
+                'Tumor' not in self.segmentation_nodes.keys():
+            return
+        self.tumor_segmentation_observer = self.segmentation_nodes['Tumor'].AddObserver(
+            slicer.vtkSegmentation.SegmentModified, lambda caller, event: self.__on_tumor_edited('segmentation'))
+
+    def __unwatch_tumor_segmentation(self) -> None:
+        if self.tumor_segmentation_observer is not None and 'Tumor' in self.segmentation_nodes.keys():
+            self.segmentation_nodes['Tumor'].RemoveObserver(self.tumor_segmentation_observer)
+        self.tumor_segmentation_observer = None
+        self.tumor_edit_source = 'labelmap'
+
+    def __get_tumor_mask(self) -> np.ndarray:
+        """
+        Reads the tumor from the node edited last, the segmentation being sampled on the voxel grid of the label map.
+        """
+        if self.tumor_edit_source == 'segmentation' and 'Tumor' in self.segmentation_nodes.keys():
+            seg_node = self.segmentation_nodes['Tumor']
+            if seg_node.GetSegmentation().GetNumberOfSegments() != 0:
+                return slicer.util.arrayFromSegmentBinaryLabelmap(
+                    seg_node, seg_node.GetSegmentation().GetNthSegmentID(0), self.tumor_node)
+        return slicer.util.arrayFromVolume(self.tumor_node)
+
+    def __read_atlas_structure_names(self, atlas: str) -> dict:
+        """
+        Maps the label values of an atlas to the structure names used in the clinical report.
+        """
+        csv_filename = os.path.join(SharedResources.getInstance().output_path, "atlas_descriptions",
+                                    atlas + '_description.csv')
+        report_names = []
+        overall = NeuroDiagnosisParameters.getInstance().statistics['Main']['Overall']
+        for atlases in [overall.mni_space_cortical_structures_overlap, overall.mni_space_subcortical_structures_overlap]:
+            if atlas in atlases.keys():
+                report_names.extend(atlases[atlas].keys())
+        names = dict()
+        with open(csv_filename, 'r') as file:
+            for row in csv.DictReader(file):
+                # The report names might be prefixed with the atlas name, or lack the trailing _gm (e.g., for MNI)
+                candidates = [row['text'], atlas + '_' + row['text'], row['text'].replace('_gm', '')]
+                names[int(float(row['label']))] = next((x for x in candidates if x in report_names), row['text'])
+        return names
+
+    def __compute_structures_statistics(self, tumor_mask, spacing, overall) -> None:
+        """
+        Fills the patient-space overlaps and distances, for the atlases reported by the last run, the MNI-space ones
+        being kept as reported.
+        """
+        for atlas in self.atlas_maps.keys():
+            atlas_map, atlas_index, names = self.atlas_maps[atlas]
+            if atlas_map.shape != tumor_mask.shape:
+                continue
+            if atlas_index is None:
+                atlas_index = index_atlas_structures(atlas_map)
+                self.atlas_maps[atlas][1] = atlas_index
+            labels = atlas_index[0]
+            overlaps = compute_structures_overlap(tumor_mask, atlas_map, labels)
+            overlaps = dict([(names.get(int(l), str(int(l))), float(v)) for l, v in zip(labels, overlaps)])
+            if atlas in overall.mni_space_cortical_structures_overlap.keys():
+                overall.patient_space_cortical_structures_overlap[atlas] = collections.OrderedDict(
+                    sorted(overlaps.items(), key=operator.itemgetter(1), reverse=True))
+            elif atlas in overall.mni_space_subcortical_structures_overlap.keys():
+                overall.patient_space_subcortical_structures_overlap[atlas] = collections.OrderedDict(
+                    sorted(overlaps.items(), key=operator.itemgetter(1), reverse=True))
+                distances = compute_structures_distance(tumor_mask, spacing, atlas_index)
+                distances = dict([(names.get(int(l), str(int(l))), float(v)) for l, v in zip(labels, distances)])
+                overall.patient_space_subcortical_structures_distance[atlas] = collections.OrderedDict(
+                    sorted(distances.items(), key=operator.itemgetter(1), reverse=False))
+
+    def update_tumor_statistics(self) -> None:
+        """
+        Computes again the volume, laterality and multifocality of the tumor from the current content of the tumor
+        label map (or segmentation, whichever was edited last), as well as the structures overlaps and distances from
+        the atlases kept in patient space, and notifies the listeners. Nothing is computed while the tumor is unchanged
+        (e.g., upon the generation of the closed surfaces of the segmentation). The MNI-space volume and
+        resectability cannot be computed locally, and are marked as outdated as soon as the tumor differs from the one
+        of the last run.
+        """
+        if self.tumor_node is None or self.tumor_node.GetImageData() is None:
+            return
+        try:
+            ijk_to_ras = vtk.vtkMatrix4x4()
+            self.tumor_node.GetIJKToRASMatrix(ijk_to_ras)
+            ijk_to_ras = np.array([[ijk_to_ras.GetElement(r, c) for c in range(4)] for r in range(4)])
+            tumor_mask = self.__get_tumor_mask()
+            if self.tumor_last_mask is not None and self.tumor_last_mask.shape == tumor_mask.shape and \
+                    np.array_equal(self.tumor_last_mask > 0, tumor_mask > 0):
+                return
+            self.tumor_last_mask = tumor_mask.copy()
+            features = compute_tumor_features(tumor_mask, self.tumor_node.GetSpacing(), ijk_to_ras,
+                                              brain_mask=self.brain_mask)
+
+            parameters = NeuroDiagnosisParameters.getInstance()
+            if 'Main' not in parameters.statistics.keys():
+                return
+            parameters.tumor_presence_state = features['volume'] > 0
+            parameters.tumor_parts = features['parts']
+            parameters.tumor_multifocal = features['parts'] > 1
+            parameters.tumor_multifocal_distance = features['multifocal_distance']
+            overall = parameters.statistics['Main']['Overall']
+            overall.original_space_tumor_volume = features['volume']
+            overall.left_laterality_percentage = features['left_laterality']
+            overall.right_laterality_percentage = features['right_laterality']
+            overall.laterality_midline_crossing = features['midline_crossing']
+            overall.mni_space_outdated = self.tumor_reference_mask is None or \
+                self.tumor_reference_mask.shape != tumor_mask.shape or \
+                not np.array_equal(self.tumor_reference_mask > 0, tumor_mask > 0)
+            self.__compute_structures_statistics(tumor_mask, self.tumor_node.GetSpacing(), overall)
+        except Exception:
+            logging.warning("Unable to update the tumor statistics from the edited label map.")
+            logging.warning(traceback.format_exc())
+            return
+
+        for callback in self.statistics_listeners:
+            try:
+                callback()
+            except Exception:
+                logging.warning("Tumor statistics listener failed.")
+                logging.warning(traceback.format_exc())
@@ -0,0 +1,108 @@
+import logging
+import traceback
+from __main__ import slicer
+
+import SimpleITK as sitk
+import sitkUtils
+
+
+class OutputNodesManager:
+    """
+    Singleton class owning the MRML nodes receiving the results (labelmaps and segmentations). Nodes are created
+    lazily without any image buffer, and are then reused and updated in place on every new run, instead of being removed
+    and recreated. The nodes are tagged with an attribute to tell them apart from the nodes manually provided by the
+    user, which are left untouched.
+    """
+    __instance = None
+    managed_attribute_name = 'Raidionics.ManagedOutput'
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if OutputNodesManager.__instance == None:
+            OutputNodesManager()
+        return OutputNodesManager.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if OutputNodesManager.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            OutputNodesManager.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.nodes = dict()  # (class name, node name) -> node
+
+    @staticmethod
+    def is_managed(node) -> bool:
+        return node is not None and node.GetAttribute(OutputNodesManager.managed_attribute_name) == '1'
+
+    def __get_node(self, class_name, name):
+        key = (class_name, name)
+        node = self.nodes.get(key, None)
+        if node is not None and slicer.mrmlScene.IsNodePresent(node):
+            return node
+
+        # Nodes left over in the scene, e.g. after reloading the module, are adopted back
+        node = None
+        for n in slicer.util.getNodesByClass(class_name):
+            if n.GetName() == name and self.is_managed(n):
+                node = n
+                break
+        if node is None:
+            node = slicer.mrmlScene.AddNewNodeByClass(class_name, name)
+            node.SetAttribute(self.managed_attribute_name, '1')
+            node.CreateDefaultDisplayNodes()
+        self.nodes[key] = node
+        return node
+
+    def get_labelmap_node(self, name):
+        """
+        Returns the labelmap node holding the output called name, created without any image data if it does not exist
+        yet. The image is only allocated when the results are pushed with update_volume_node.
+        """
+        return self.__get_node('vtkMRMLLabelMapVolumeNode', name)
+
+    def get_segmentation_node(self, name):
+        """
+        Returns an empty segmentation node called name, reusing the existing one if any.
+        """
+        seg_node = self.__get_node('vtkMRMLSegmentationNode', name)
+        segmentation = seg_node.GetSegmentation()
+        segmentation.RemoveAllSegments()
+        # The next import should define the geometry, as it might come from a different patient
+        segmentation.SetConversionParameter(
+            slicer.vtkSegmentationConverter.GetReferenceImageGeometryParameterName(), '')
+        return seg_node
+
+    def update_volume_node(self, node, image: sitk.Image, label: bool = True) -> None:
+        """
+        Updates the node content in place with the given image. For label maps, integer images are narrowed to uint8
+        whenever the label values allow it, probability maps are kept as they are.
+        """
+        try:
+            if label and image.GetPixelID() in [sitk.sitkInt8, sitk.sitkUInt16, sitk.sitkInt16, sitk.sitkUInt32,
+                                                sitk.sitkInt32, sitk.sitkUInt64, sitk.sitkInt64]:
+                min_max = sitk.MinimumMaximumImageFilter()
+                min_max.Execute(image)
+                if min_max.GetMinimum() >= 0 and min_max.GetMaximum() <= 255:
+                    image = sitk.Cast(image, sitk.sitkUInt8)
+        except Exception:
+            logging.warning("Unable to narrow the pixel type for {}.".format(node.GetName()))
+            logging.warning(traceback.format_exc())
+        sitkUtils.PushVolumeToSlicer(image, targetNode=node)
+
+    def release(self, node) -> None:
+        """
+        Removes a managed node from the scene.
+        """
+        for k in [k for k in self.nodes.keys() if self.nodes[k] == node]:
+            del self.nodes[k]
+        if slicer.mrmlScene.IsNodePresent(node):
+            slicer.mrmlScene.RemoveNode(node)
+
+    def release_all(self) -> None:
+        for node in list(self.nodes.values()):
+            self.release(node)
+        self.nodes = dict()
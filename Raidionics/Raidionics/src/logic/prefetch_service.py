@@ -0,0 +1,178 @@
+import os
+import json
+import logging
+import threading
+import traceback
+from datetime import datetime
+from collections import OrderedDict
+from __main__ import qt
+
+from src.utils.resources import SharedResources
+from src.utils.local_registry import LocalRegistry
+from src.utils.io_utilities import download_cloud_models, download_cloud_diagnosis, check_local_models_for_update, \
+    get_gdown
+from src.utils.docker_utilities import ensure_docker_image
+
+
+class PrefetchService:
+    """
+    Singleton class warming up, in the background, the models, diagnoses, and Docker images most likely to be used,
+    such that they are ready before the first case. The items are either listed in the user settings, or taken from the
+    local usage history. The work starts after some idle time following the module startup, on a single background
+    thread, one download at a time, and with the Docker client running at a lower priority.
+    """
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if PrefetchService.__instance == None:
+            PrefetchService()
+        return PrefetchService.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if PrefetchService.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            PrefetchService.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.thread = None
+        self.scheduled = False
+        self.stop_requested = False
+        self.history_lock = threading.Lock()
+
+    def schedule(self) -> None:
+        """
+        Starts the prefetch after the idle delay defined in the user settings, only once per session.
+        """
+        if not SharedResources.getInstance().prefetch_enabled or self.scheduled:
+            return
+        self.scheduled = True
+        qt.QTimer.singleShot(max(0, SharedResources.getInstance().prefetch_idle_delay) * 1000, self.start)
+
+    def start(self) -> None:
+        if self.thread is not None and self.thread.is_alive():
+            return
+        models, diagnoses = self.get_prefetch_items()
+        if len(models) == 0 and len(diagnoses) == 0:
+            return
+        self.stop_requested = False
+        try:
+            # Installed from the main thread if needed, the downloads then running in the background
+            get_gdown()
+        except Exception:
+            logging.warning("Unable to import gdown, prefetch cancelled.")
+            logging.warning(traceback.format_exc())
+            return
+        self.thread = threading.Thread(target=self.__run, args=(models, diagnoses))
+        self.thread.daemon = True  # Not delaying the application exit
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Requests the prefetch to stop after the current item.
+        """
+        self.stop_requested = True
+
+    def record_usage(self, kind: str, name: str) -> None:
+        """
+        Keeps track of how often each model or diagnosis is selected, to prefetch the most used ones.
+
+        Parameters
+        ----------
+        kind: str
+            Item category, between models and diagnoses.
+        name: str
+            Unique name identifier of the model or diagnosis.
+        """
+        if name is None or name == '':
+            return
+        with self.history_lock:
+            try:
+                history = self.__read_history()
+                if kind not in history.keys():
+                    history[kind] = {}
+                if name not in history[kind].keys():
+                    history[kind][name] = {'count': 0}
+                history[kind][name]['count'] += 1
+                history[kind][name]['last_used'] = datetime.now().isoformat()
+                with open(SharedResources.getInstance().usage_history_filename, 'w') as outfile:
+                    json.dump(history, outfile, indent=4)
+            except Exception:
+                logging.warning("Unable to update the usage history.")
+                logging.warning(traceback.format_exc())
+
+    def get_prefetch_items(self):
+        """
+        Returns the lists of models and diagnoses to prefetch, from the user settings if provided, or the most used
+        ones otherwise.
+        """
+        models = SharedResources.getInstance().prefetch_models
+        diagnoses = SharedResources.getInstance().prefetch_diagnoses
+        if len(models) == 0 and len(diagnoses) == 0:
+            history = self.__read_history()
+            max_items = SharedResources.getInstance().prefetch_max_history_items
+            for kind in ['models', 'diagnoses']:
+                items = history.get(kind, {})
+                items = sorted(items.keys(), key=lambda x: (items[x]['count'], items[x].get('last_used', '')),
+                               reverse=True)[:max_items]
+                if kind == 'models':
+                    models = items
+                else:
+                    diagnoses = items
+        return models, diagnoses
+
+    def __read_history(self) -> dict:
+        history_filename = SharedResources.getInstance().usage_history_filename
+        if not os.path.exists(history_filename):
+            return {}
+        try:
+            with open(history_filename, 'r') as infile:
+                return json.load(infile)
+        except Exception:
+            return {}
+
+    def __find_docker_image(self, name: str) -> str:
+        LocalRegistry.getInstance().refresh()
+        config = LocalRegistry.getInstance().get_config(name)
+        try:
+            return config['docker']['dockerhub_repository'] if config is not None else None
+        except Exception:
+            return None
+
+    def __run(self, models, diagnoses) -> None:
+        docker_images = []
+        for model in models:
+            if self.stop_requested:
+                return
+            try:
+                if self.__find_docker_image(model) is None or check_local_models_for_update([model]):
+                    logging.info("Prefetching model {}.".format(model))
+                    download_cloud_models([model], max_workers=1)
+                docker_images.append(self.__find_docker_image(model))
+            except Exception:
+                logging.warning("Prefetch failed for model {}.".format(model))
+                logging.warning(traceback.format_exc())
+
+        for diagnosis in diagnoses:
+            if self.stop_requested:
+                return
+            try:
+                logging.info("Prefetching diagnosis {}.".format(diagnosis))
+                download_cloud_diagnosis(diagnosis)
+                docker_images.append(self.__find_docker_image(diagnosis))
+            except Exception:
+                logging.warning("Prefetch failed for diagnosis {}.".format(diagnosis))
+                logging.warning(traceback.format_exc())
+
+        docker_path = SharedResources.getInstance().docker_path
+        if docker_path is None:
+            return
+        cache_dir = SharedResources.getInstance().docker_image_cache_dir
+        for docker_image in list(OrderedDict.fromkeys([x for x in docker_images if x is not None])):
+            if self.stop_requested:
+                return
+            ensure_docker_image(docker_path, docker_image, cache_dir=cache_dir, low_priority=True)
@@ -0,0 +1,217 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import traceback
+from datetime import datetime
+
+import SimpleITK as sitk
+
+from src.utils.resources import SharedResources
+
+
+def compute_image_fingerprint(image: sitk.Image) -> str:
+    """
+    Identifies a volume from its content, independently of the node or file it comes from. The hash of the voxel
+    buffer is combined with the image geometry, since a resampled or reoriented copy must not be mistaken for the
+    original volume.
+
+    Parameters
+    ----------
+    image: sitk.Image
+        Volume to identify.
+
+    Returns
+    -------
+    Hexadecimal string fingerprint of the volume.
+    """
+    geometry = [image.GetPixelIDTypeAsString(), image.GetSize(), image.GetSpacing(), image.GetOrigin(),
+                image.GetDirection()]
+    fingerprint = hashlib.sha1()
+    fingerprint.update(sitk.Hash(image).encode('utf-8'))
+    fingerprint.update(str(geometry).encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+class ResultsWorkspace:
+    """
+    Singleton class retaining, across runs, the segmentations computed for each input volume. The artifacts are
+    stored in one folder per input fingerprint, described by a manifest, and are staged next to the same input on later
+    runs (e.g., the preoperative timepoint when a follow-up scan is added) such that the backend skips the matching
+    processing stages.
+    """
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if ResultsWorkspace.__instance == None:
+            ResultsWorkspace()
+        return ResultsWorkspace.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if ResultsWorkspace.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            ResultsWorkspace.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.workspace_path = os.path.join(SharedResources.getInstance().resources_path, 'workspace')
+        self.manifest_filename = 'manifest.json'
+        self.max_entries = 50  # Number of input volumes retained, the least recently used ones are discarded first
+
+    def __entry_path(self, fingerprint: str) -> str:
+        return os.path.join(self.workspace_path, fingerprint)
+
+    def __read_manifest(self, fingerprint: str) -> dict:
+        manifest_filename = os.path.join(self.__entry_path(fingerprint), self.manifest_filename)
+        if not os.path.exists(manifest_filename):
+            return {'fingerprint': fingerprint, 'artifacts': {}}
+        try:
+            with open(manifest_filename, 'r') as infile:
+                return json.load(infile)
+        except Exception:
+            logging.warning("Corrupted workspace manifest for {}, discarding it.".format(fingerprint))
+            return {'fingerprint': fingerprint, 'artifacts': {}}
+
+    def __write_manifest(self, fingerprint: str, manifest: dict) -> None:
+        manifest_filename = os.path.join(self.__entry_path(fingerprint), self.manifest_filename)
+        with open(manifest_filename + '.tmp', 'w') as outfile:
+            json.dump(manifest, outfile, indent=4)
+        os.replace(manifest_filename + '.tmp', manifest_filename)
+
+    def get_artifacts(self, fingerprint: str) -> dict:
+        """
+        Lists the artifacts retained for an input volume, as a dict with the structure class as key, and the
+        artifact description (filename, producing model, creation date) as value.
+        """
+        manifest = self.__read_manifest(fingerprint)
+        artifacts = dict()
+        for label in manifest['artifacts'].keys():
+            info = dict(manifest['artifacts'][label])
+            info['filename'] = os.path.join(self.__entry_path(fingerprint), info['filename'])
+            if os.path.exists(info['filename']):
+                artifacts[label] = info
+        return artifacts
+
+    def store_artifact(self, fingerprint: str, label: str, filename: str, producer: dict) -> None:
+        """
+        Retains a copy of a segmentation computed for the input volume identified by fingerprint.
+
+        Parameters
+        ----------
+        fingerprint: str
+            Fingerprint of the input volume, as given by compute_image_fingerprint.
+        label: str
+            Name of the segmented structure (e.g., Tumor, Brain).
+        filename: str
+            Segmentation file on disk, in the input volume space.
+        producer: dict
+            Model having produced the segmentation, as {'model': name, 'version': version} (see
+            get_pipeline_producers), checked before reusing the segmentation.
+        """
+        try:
+            entry_path = self.__entry_path(fingerprint)
+            os.makedirs(entry_path, exist_ok=True)
+            artifact_filename = 'label_' + label + '.nii.gz'
+            self.__replace_file(os.path.join(entry_path, artifact_filename))
+            shutil.copyfile(filename, os.path.join(entry_path, artifact_filename))
+            self.__record_artifact(fingerprint, label, artifact_filename, producer)
+        except Exception:
+            logging.warning("Unable to retain the {} segmentation in the workspace.".format(label))
+            logging.warning(traceback.format_exc())
+
+    def store_artifact_image(self, fingerprint: str, label: str, image: sitk.Image, producer: dict) -> None:
+        """
+        Retains a segmentation computed for the input volume identified by fingerprint, from an image in memory (e.g.,
+        a probability map binarized). See store_artifact for the parameters.
+        """
+        try:
+            entry_path = self.__entry_path(fingerprint)
+            os.makedirs(entry_path, exist_ok=True)
+            artifact_filename = 'label_' + label + '.nii.gz'
+            self.__replace_file(os.path.join(entry_path, artifact_filename))
+            sitk.WriteImage(image, os.path.join(entry_path, artifact_filename))
+            self.__record_artifact(fingerprint, label, artifact_filename, producer)
+        except Exception:
+            logging.warning("Unable to retain the {} segmentation in the workspace.".format(label))
+            logging.warning(traceback.format_exc())
+
+    def __replace_file(self, filename: str) -> None:
+        # The staged copies may be hard links to the artifact, which must not be modified in place
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    def __record_artifact(self, fingerprint: str, label: str, artifact_filename: str, producer: dict) -> None:
+        manifest = self.__read_manifest(fingerprint)
+        manifest['artifacts'][label] = {'filename': artifact_filename, 'producer': producer,
+                                        'created': datetime.now().isoformat()}
+        self.__write_manifest(fingerprint, manifest)
+
+    def stage_artifacts(self, fingerprint: str, destination_folder: str, input_basename: str, producers: dict,
+                        excluded_labels: list = None) -> list:
+        """
+        Places the artifacts retained for an input volume next to it in the backend input folder, following the
+        backend naming convention for existing annotations (<input>_label_<class>.nii.gz).
+        Only the artifacts produced by the same model and version as in the pipeline about to be run are staged, the
+        other ones (including the manually provided segmentations of earlier runs) are skipped and logged.
+
+        Parameters
+        ----------
+        fingerprint: str
+            Fingerprint of the input volume.
+        destination_folder: str
+            Timestamp folder where the input volume has been staged.
+        input_basename: str
+            Filename of the staged input volume, without extension.
+        producers: dict
+            Structure class -> producer ({'model': name, 'version': version}) in the pipeline about to be run.
+        excluded_labels: list
+            Structure classes not to be staged, e.g. the ones explicitly requested from a segmentation model.
+
+        Returns
+        -------
+        The list of structure classes staged.
+        """
+        staged = []
+        artifacts = self.get_artifacts(fingerprint)
+        for label in artifacts.keys():
+            if excluded_labels is not None and label in excluded_labels:
+                continue
+            if label not in producers.keys() or producers[label].get('version', None) is None or \
+                    artifacts[label].get('producer', None) != producers[label]:
+                logging.info("Not reusing the retained {} segmentation for {}, produced by {} instead of {}.".format(
+                    label, input_basename, artifacts[label].get('producer', None), producers.get(label, 'no model')))
+                continue
+            dest_filename = os.path.join(destination_folder, input_basename + '_label_' + label + '.nii.gz')
+            try:
+                try:
+                    os.link(artifacts[label]['filename'], dest_filename)
+                except OSError:
+                    shutil.copyfile(artifacts[label]['filename'], dest_filename)
+                staged.append(label)
+            except Exception:
+                logging.warning("Unable to stage the retained {} segmentation.".format(label))
+                logging.warning(traceback.format_exc())
+        if len(staged) != 0:
+            # Touching the entry folder for the least recently used policy
+            os.utime(self.__entry_path(fingerprint))
+        return staged
+
+    def prune(self) -> None:
+        """
+        Removes the least recently used entries above the maximum number of retained input volumes.
+        """
+        if not os.path.isdir(self.workspace_path):
+            return
+        try:
+            entries = [os.path.join(self.workspace_path, x) for x in os.listdir(self.workspace_path)]
+            entries = sorted([x for x in entries if os.path.isdir(x)], key=os.path.getmtime, reverse=True)
+            for entry in entries[self.max_entries:]:
+                shutil.rmtree(entry, ignore_errors=True)
+        except Exception:
+            logging.warning("Unable to prune the results workspace.")
+            logging.warning(traceback.format_exc())
@@ -0,0 +1,106 @@
+import logging
+import traceback
+from random import randint
+from typing import List
+from __main__ import slicer
+
+import numpy as np
+import SimpleITK as sitk
+import sitkUtils
+
+
+def pack_binary_masks(masks):
+    """
+    Merges a set of binary masks into as few multi-label arrays as possible. Each mask is given its own label value
+    inside the first layer where it does not overlap any mask already packed, so that overlapping structures (e.g.,
+    fiber tracts) are not lost. In most cases, all masks end up in a single layer.
+
+    Parameters
+    ----------
+    masks: Iterable[np.ndarray]
+        Binary masks, all sharing the same shape. A generator can be used, only the packed layers are kept in memory.
+
+    Returns
+    -------
+    The list of multi-label layers, and for each input mask a tuple (layer index, label value).
+    """
+    layers = []
+    layers_label_count = []
+    placement = []
+    for mask in masks:
+        layer_index = None
+        for li, layer in enumerate(layers):
+            if not np.any(layer[mask]):
+                layer_index = li
+                break
+        if layer_index is None:
+            layers.append(np.zeros(mask.shape, dtype=np.uint16))
+            layers_label_count.append(0)
+            layer_index = len(layers) - 1
+        layers_label_count[layer_index] += 1
+        layers[layer_index][mask] = layers_label_count[layer_index]
+        placement.append((layer_index, layers_label_count[layer_index]))
+
+    for li in range(len(layers)):
+        if layers_label_count[li] <= np.iinfo(np.uint8).max:
+            layers[li] = layers[li].astype(np.uint8)
+    return layers, placement
+
+
+def import_label_files_to_segmentation(filenames: List[str], names: List[str], seg_node, colors=None) -> None:
+    """
+    Imports a set of binary label images in a single segmentation node, with one segment per image. The images are
+    read one at a time and packed in memory into multi-label volumes, each imported at once through a temporary
+    labelmap node.
+
+    Parameters
+    ----------
+    filenames: List[str]
+        Binary label images on disk, the first one is used as geometry reference for the others.
+    names: List[str]
+        Segment name for each image.
+    seg_node: vtkMRMLSegmentationNode
+        Segmentation node receiving the segments.
+    colors: List[List[float]]
+        Optional segment color for each image, as RGB values in [0, 1]. Random colors are used otherwise.
+    """
+    if len(filenames) == 0:
+        return
+    reference = sitk.ReadImage(filenames[0])
+
+    def read_masks():
+        for i, fn in enumerate(filenames):
+            img = reference if i == 0 else sitk.ReadImage(fn)
+            if img.GetSize() != reference.GetSize() or img.GetSpacing() != reference.GetSpacing() \
+                    or img.GetOrigin() != reference.GetOrigin() or img.GetDirection() != reference.GetDirection():
+                img = sitk.Resample(img, reference, sitk.Transform(), sitk.sitkNearestNeighbor, 0)
+            yield sitk.GetArrayViewFromImage(img) > 0
+
+    layers, placement = pack_binary_masks(read_masks())
+
+    segmentation = seg_node.GetSegmentation()
+    for li, layer in enumerate(layers):
+        layer_image = sitk.GetImageFromArray(layer)
+        layer_image.CopyInformation(reference)
+        labelmap_node = sitkUtils.PushVolumeToSlicer(layer_image, name=seg_node.GetName() + '_layer' + str(li),
+                                                     className='vtkMRMLLabelMapVolumeNode')
+        try:
+            existing_ids = set([segmentation.GetNthSegmentID(s) for s in range(segmentation.GetNumberOfSegments())])
+            slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(labelmap_node, seg_node)
+            new_segments = {}
+            for s in range(segmentation.GetNumberOfSegments()):
+                if segmentation.GetNthSegmentID(s) not in existing_ids:
+                    segment = segmentation.GetNthSegment(s)
+                    new_segments[segment.GetLabelValue()] = segment
+            for i, (layer_index, label) in enumerate(placement):
+                if layer_index != li or label not in new_segments:
+                    continue
+                segment = new_segments[label]
+                segment.SetName(names[i])
+                color = colors[i] if colors is not None else [randint(0, 255) / 255. for _ in range(3)]
+                segment.SetColor(color[0], color[1], color[2])
+        except Exception:
+            logging.warning("Issue when importing the packed labelmap layer {}.".format(li))
+            logging.warning(traceback.format_exc())
+        finally:
+            slicer.mrmlScene.RemoveNode(labelmap_node)
@@ -0,0 +1,251 @@
+import logging
+import os
+import traceback
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from __main__ import qt, slicer, vtk
+
+import numpy as np
+from vtk.util import numpy_support
+
+
+class SegmentationSurfaceGenerator:
+    """
+    Singleton class in charge of the closed surface representation of the segmentation nodes created from the results.
+    Surfaces are only generated for the segments made visible in 3D, the first time they are displayed. The surface
+    extraction runs in a pool of worker threads, and the resulting meshes are attached to the segments on the main thread.
+    """
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if SegmentationSurfaceGenerator.__instance == None:
+            SegmentationSurfaceGenerator()
+        return SegmentationSurfaceGenerator.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if SegmentationSurfaceGenerator.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            SegmentationSurfaceGenerator.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.max_workers = max(1, min(4, (os.cpu_count() or 1) - 1))
+        self.smoothing_factor = 0.5  # Same default as the Slicer binary labelmap to closed surface conversion
+        self.executor = None
+        self.results_queue = Queue()
+        self.results_polling = False
+        self.observers = dict()  # Segmentation node ID -> (display node, observer tag)
+        self.scheduled_nodes = set()
+        self.pending_segments = set()
+        self.computed_segments = set()
+
+    def register(self, seg_node):
+        """
+        Hides the segmentation node in 3D, and monitors its display node in order to generate the closed surfaces
+        of the visible segments only when the node is first displayed in 3D. The 2D display is left untouched.
+
+        Parameters
+        ----------
+        seg_node: vtkMRMLSegmentationNode
+            Segmentation node freshly populated from a labelmap.
+        """
+        self.unregister(seg_node)
+        display_node = seg_node.GetDisplayNode()
+        if display_node is None:
+            seg_node.CreateDefaultDisplayNodes()
+            display_node = seg_node.GetDisplayNode()
+        display_node.SetVisibility3D(False)
+        seg_node_id = seg_node.GetID()
+        tag = display_node.AddObserver(vtk.vtkCommand.ModifiedEvent,
+                                       lambda caller, event, n=seg_node_id: self.__on_display_modified(n))
+        self.observers[seg_node_id] = (display_node, tag)
+
+    def unregister(self, seg_node):
+        seg_node_id = seg_node.GetID()
+        if seg_node_id in self.observers:
+            display_node, tag = self.observers.pop(seg_node_id)
+            display_node.RemoveObserver(tag)
+        self.scheduled_nodes.discard(seg_node_id)
+        self.pending_segments = set([x for x in self.pending_segments if x[0] != seg_node_id])
+        self.computed_segments = set([x for x in self.computed_segments if x[0] != seg_node_id])
+
+    def __on_display_modified(self, seg_node_id):
+        # Visibility changes usually come in bursts (e.g., one call per segment), collapsed into a single update.
+        if seg_node_id in self.scheduled_nodes:
+            return
+        self.scheduled_nodes.add(seg_node_id)
+        qt.QTimer.singleShot(0, lambda n=seg_node_id: self.__update_surfaces(n))
+
+    def __update_surfaces(self, seg_node_id):
+        self.scheduled_nodes.discard(seg_node_id)
+        seg_node = slicer.mrmlScene.GetNodeByID(seg_node_id)
+        if seg_node is None or seg_node_id not in self.observers:
+            return
+        display_node = seg_node.GetDisplayNode()
+        if display_node is None or not display_node.GetVisibility() or not display_node.GetVisibility3D():
+            return
+
+        surface_name = slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()
+        segmentation = seg_node.GetSegmentation()
+        segment_ids = vtk.vtkStringArray()
+        segmentation.GetSegmentIDs(segment_ids)
+        for i in range(segment_ids.GetNumberOfValues()):
+            segment_id = segment_ids.GetValue(i)
+            key = (seg_node_id, segment_id)
+            segment = segmentation.GetSegment(segment_id)
+            # Editing the labelmap discards the derived representations, they must then be computed again.
+            if key in self.computed_segments and segment.GetRepresentation(surface_name) is not None:
+                continue
+            self.computed_segments.discard(key)
+            if segment.GetRepresentation(surface_name) is None:
+                # Empty placeholder, Slicer only displays a representation in 3D when all segments hold one.
+                segment.AddRepresentation(surface_name, vtk.vtkPolyData())
+            if key in self.pending_segments or not display_node.GetSegmentVisibility(segment_id) \
+                    or not display_node.GetSegmentVisibility3D(segment_id):
+                continue
+            try:
+                mask, ijk_to_ras, extent_min = self.__extract_segment_mask(seg_node, segment_id)
+            except Exception:
+                logging.warning("Unable to extract the binary labelmap for segment {}.".format(segment.GetName()))
+                logging.warning(traceback.format_exc())
+                continue
+            self.pending_segments.add(key)
+            self.__get_executor().submit(self.__run_surface_job, key, mask, ijk_to_ras, extent_min,
+                                         self.smoothing_factor)
+
+        display_node.SetPreferredDisplayRepresentationName3D(surface_name)
+        if len(self.pending_segments) != 0 and not self.results_polling:
+            self.results_polling = True
+            qt.QTimer.singleShot(0, self.__process_results)
+
+    def __extract_segment_mask(self, seg_node, segment_id):
+        """
+        Copies the binary labelmap of a segment, on the main thread, so that the worker threads never access MRML.
+        """
+        oriented_image = slicer.vtkOrientedImageData()
+        slicer.vtkSlicerSegmentationsModuleLogic.GetSegmentBinaryLabelmapRepresentation(seg_node, segment_id,
+                                                                                        oriented_image)
+        dims = oriented_image.GetDimensions()
+        scalars = oriented_image.GetPointData().GetScalars()
+        mask = numpy_support.vtk_to_numpy(scalars).reshape(dims[2], dims[1], dims[0]) != 0
+        matrix = vtk.vtkMatrix4x4()
+        oriented_image.GetImageToWorldMatrix(matrix)
+        ijk_to_ras = [[matrix.GetElement(r, c) for c in range(4)] for r in range(4)]
+        # The labelmap might not start at the origin of its voxel grid (e.g., cropped or shared labelmaps)
+        extent = oriented_image.GetExtent()
+        return mask, ijk_to_ras, (extent[0], extent[2], extent[4])
+
+    def __get_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def __run_surface_job(self, key, mask, ijk_to_ras, extent_min, smoothing_factor):
+        surface = None
+        try:
+            if mask.any():
+                surface = compute_closed_surface(mask, ijk_to_ras, smoothing_factor, extent_min=extent_min)
+        except Exception:
+            logging.warning("Closed surface generation failed for segment {}.".format(key[1]))
+            logging.warning(traceback.format_exc())
+        self.results_queue.put((key, surface))
+
+    def __process_results(self):
+        """
+        Attaches the meshes computed by the workers to their segments, on the main thread.
+        """
+        surface_name = slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()
+        try:
+            while not self.results_queue.empty():
+                key, surface = self.results_queue.get_nowait()
+                if key not in self.pending_segments:
+                    continue  # The node was cleared in the meantime
+                self.pending_segments.discard(key)
+                self.computed_segments.add(key)
+                seg_node = slicer.mrmlScene.GetNodeByID(key[0])
+                if seg_node is None or surface is None:
+                    continue
+                segment = seg_node.GetSegmentation().GetSegment(key[1])
+                if segment is not None:
+                    segment.AddRepresentation(surface_name, surface)
+        except Exception:
+            logging.warning("Issue when attaching the closed surfaces.")
+            logging.warning(traceback.format_exc())
+
+        if len(self.pending_segments) != 0:
+            qt.QTimer.singleShot(50, self.__process_results)
+        else:
+            self.results_polling = False
+
+
+def compute_closed_surface(mask, ijk_to_ras, smoothing_factor=0.5, extent_min=(0, 0, 0)):
+    """
+    Extracts a smoothed closed surface from a binary mask, with plain VTK filters not touching the MRML scene, such that
+    it can safely be called from a worker thread.
+
+    Parameters
+    ----------
+    mask: np.ndarray
+        Binary mask, indexed as [k, j, i].
+    ijk_to_ras: List[List[float]]
+        4x4 matrix mapping the voxel indices to the RAS world coordinates.
+    smoothing_factor: float
+        Strength of the windowed sinc smoothing, in [0, 1], with 0 meaning no smoothing.
+    extent_min: tuple
+        Voxel indices (i, j, k) of the first mask element in the grid mapped by ijk_to_ras.
+
+    Returns
+    -------
+    vtkPolyData holding the surface in RAS coordinates.
+    """
+    # Padding by one voxel so that surfaces touching the image border are closed.
+    padded = np.pad(mask.astype(np.uint8), 1)
+    image = vtk.vtkImageData()
+    image.SetDimensions(padded.shape[2], padded.shape[1], padded.shape[0])
+    image.SetOrigin(extent_min[0] - 1., extent_min[1] - 1., extent_min[2] - 1.)
+    image.GetPointData().SetScalars(numpy_support.numpy_to_vtk(padded.ravel(), deep=True,
+                                                               array_type=vtk.VTK_UNSIGNED_CHAR))
+
+    flying_edges = vtk.vtkDiscreteFlyingEdges3D()
+    flying_edges.SetInputData(image)
+    flying_edges.SetValue(0, 1)
+    flying_edges.ComputeGradientsOff()
+    flying_edges.ComputeNormalsOff()
+    last_output = flying_edges.GetOutputPort()
+
+    if smoothing_factor > 0:
+        smoother = vtk.vtkWindowedSincPolyDataFilter()
+        smoother.SetInputConnection(last_output)
+        smoother.SetNumberOfIterations(20)
+        smoother.SetPassBand(pow(10.0, -4.0 * smoothing_factor))
+        smoother.BoundarySmoothingOff()
+        smoother.FeatureEdgeSmoothingOff()
+        smoother.NonManifoldSmoothingOn()
+        smoother.NormalizeCoordinatesOn()
+        last_output = smoother.GetOutputPort()
+
+    matrix = vtk.vtkMatrix4x4()
+    for r in range(4):
+        for c in range(4):
+            matrix.SetElement(r, c, ijk_to_ras[r][c])
+    transform = vtk.vtkTransform()
+    transform.SetMatrix(matrix)
+    transform_filter = vtk.vtkTransformPolyDataFilter()
+    transform_filter.SetInputConnection(last_output)
+    transform_filter.SetTransform(transform)
+
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputConnection(transform_filter.GetOutputPort())
+    normals.ConsistencyOn()
+    normals.SplittingOff()
+    if matrix.Determinant() < 0:
+        normals.FlipNormalsOn()
+    normals.Update()
+
+    surface = vtk.vtkPolyData()
+    surface.DeepCopy(normals.GetOutput())
+    return surface
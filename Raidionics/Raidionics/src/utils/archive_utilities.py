@@ -0,0 +1,379 @@
+import os
+import stat
+import json
+import hashlib
+import logging
+import traceback
+import shutil
+import zipfile
+import tempfile
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+
+
+def compute_file_md5(filename: str, chunk_size: int = 1048576) -> str:
+    """
+    Computes the md5 digest of a file, read by chunks to keep the memory footprint constant, whatever the file size.
+
+    Parameters
+    ----------
+    filename: str
+        File on disk to hash.
+    chunk_size: int
+        Number of bytes read at once.
+
+    Returns
+    -------
+    Hexadecimal md5 digest of the file content.
+    """
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def get_archive_manifest_filename(archive_filename: str) -> str:
+    return archive_filename + '.manifest.json'
+
+
+def read_archive_manifest(archive_filename: str) -> dict:
+    """
+    Loads the sidecar manifest of an archive, or an empty dict if missing or unreadable.
+    """
+    manifest_filename = get_archive_manifest_filename(archive_filename)
+    if not os.path.exists(manifest_filename):
+        return {}
+    try:
+        with open(manifest_filename, 'r') as infile:
+            return json.load(infile)
+    except Exception:
+        return {}
+
+
+def write_archive_manifest(archive_filename: str, manifest: dict) -> None:
+    manifest_filename = get_archive_manifest_filename(archive_filename)
+    try:
+        with open(manifest_filename + '.tmp', 'w') as outfile:
+            json.dump(manifest, outfile, indent=4)
+        os.replace(manifest_filename + '.tmp', manifest_filename)
+    except Exception:
+        logging.warning("Unable to write the manifest for {}.".format(archive_filename))
+        logging.warning(traceback.format_exc())
+
+
+def record_archive_checksum(archive_filename: str, md5: str) -> None:
+    """
+    Stores the digest of an archive in its sidecar manifest, together with the size and modification time of the
+    archive used to detect later changes. Other manifest fields are preserved.
+
+    Parameters
+    ----------
+    archive_filename: str
+        Archive on disk.
+    md5: str
+        Hexadecimal md5 digest of the archive, e.g. computed while downloading it.
+    """
+    stats = os.stat(archive_filename)
+    manifest = read_archive_manifest(archive_filename)
+    manifest['size'] = stats.st_size
+    manifest['mtime_ns'] = stats.st_mtime_ns
+    manifest['md5'] = md5
+    manifest['pruned'] = False
+    write_archive_manifest(archive_filename, manifest)
+
+
+def get_archive_checksum(archive_filename: str) -> str:
+    """
+    Returns the md5 digest of an archive, without reading it if its size and modification time match the sidecar
+    manifest. Otherwise, the digest is computed and recorded in the manifest.
+
+    Parameters
+    ----------
+    archive_filename: str
+        Archive on disk.
+
+    Returns
+    -------
+    Hexadecimal md5 digest of the archive, or None if the archive does not exist.
+    """
+    manifest = read_archive_manifest(archive_filename)
+    if not os.path.exists(archive_filename):
+        # Archive deleted after extraction into the store, its content is still available
+        return manifest.get('md5', None) if manifest.get('pruned', False) else None
+    stats = os.stat(archive_filename)
+    if 'md5' in manifest.keys() and manifest.get('size', None) == stats.st_size \
+            and manifest.get('mtime_ns', None) == stats.st_mtime_ns:
+        return manifest['md5']
+    md5 = compute_file_md5(archive_filename)
+    record_archive_checksum(archive_filename, md5)
+    return md5
+
+
+def is_archive_up_to_date(archive_filename: str, expected_md5: str) -> bool:
+    """
+    Checks if the local archive exists and matches the expected md5 digest.
+    """
+    return get_archive_checksum(archive_filename) == expected_md5
+
+
+def get_blob_filename(store_dir: str, sha256: str) -> str:
+    return os.path.join(store_dir, 'sha256', sha256[:2], sha256)
+
+
+def compute_file_sha256(filename: str, chunk_size: int = 1048576) -> str:
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def remove_file(filename: str, store_dir: str = None) -> None:
+    """
+    Removes a file, including the read-only blobs and their links, which are only unlinked. As read-only files cannot
+    be deleted as such on Windows, the file is made writable first, which applies to all its hard links: when
+    store_dir is provided and the file is linked to a blob of the store, the blob is made read-only again afterwards.
+    """
+    try:
+        os.remove(filename)
+    except PermissionError:
+        blob_filename = None
+        if store_dir is not None and os.stat(filename).st_nlink > 1:
+            blob_filename = get_blob_filename(store_dir, compute_file_sha256(filename))
+        os.chmod(filename, stat.S_IREAD | stat.S_IWRITE)
+        os.remove(filename)
+        if blob_filename is not None and os.path.exists(blob_filename):
+            os.chmod(blob_filename, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+
+
+def is_blob_valid(store_dir: str, sha256: str) -> bool:
+    """
+    Checks that a blob exists in the store and that its content still matches its digest.
+    """
+    blob_filename = get_blob_filename(store_dir, sha256)
+    return os.path.exists(blob_filename) and compute_file_sha256(blob_filename) == sha256
+
+
+def store_blob(fileobj, store_dir: str, chunk_size: int = 1048576) -> str:
+    """
+    Copies a stream into the content-addressed store, where identical contents are kept only once. The blobs are
+    read-only, as they are hard linked into every model using them. A blob whose content does not match its digest
+    anymore is replaced.
+
+    Parameters
+    ----------
+    fileobj: file-like object
+        Opened stream to read the content from (e.g., an archive member).
+    store_dir: str
+        Root folder of the content-addressed store.
+
+    Returns
+    -------
+    Hexadecimal sha256 digest of the content, identifying the blob in the store.
+    """
+    tmp_dir = os.path.join(store_dir, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    sha256 = hashlib.sha256()
+    tmp_fd, tmp_filename = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(tmp_fd, 'wb') as outfile:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+                outfile.write(chunk)
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        blob_filename = get_blob_filename(store_dir, digest)
+        if os.path.exists(blob_filename) and is_blob_valid(store_dir, digest):
+            os.remove(tmp_filename)
+        else:
+            if os.path.exists(blob_filename):
+                logging.warning("Corrupted blob {} in the store, replacing it.".format(digest))
+                remove_file(blob_filename)
+            os.makedirs(os.path.dirname(blob_filename), exist_ok=True)
+            os.chmod(tmp_filename, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_filename, blob_filename)
+    except Exception:
+        if os.path.exists(tmp_filename):
+            remove_file(tmp_filename)
+        raise
+    return digest
+
+
+def materialize_blob(store_dir: str, sha256: str, target: str) -> None:
+    """
+    Places a blob from the store at the target location, as a hard link or as a copy when the store and the target
+    are not on the same file system. Hard-linked files are shared across models, and read-only as the blob itself.
+    """
+    blob_filename = get_blob_filename(store_dir, sha256)
+    if not os.path.exists(blob_filename):
+        raise FileNotFoundError('Missing blob {} in the store.'.format(sha256))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.lexists(target):
+        remove_file(target, store_dir=store_dir)
+    try:
+        os.link(blob_filename, target)
+    except OSError:
+        shutil.copyfile(blob_filename, target)
+
+
+def extract_archive_members(archive_filename: str, members: list, destination_dir: str, store_dir: str = None) -> dict:
+    """
+    Extracts the given members from an archive, with a dedicated archive handle such that it can run in a worker thread.
+    When a store is given, the members are decompressed into the store and then materialized in the destination.
+
+    Returns
+    -------
+    A dict with the member name as key and the sha256 digest of its content as value, when a store is used.
+    """
+    digests = dict()
+    with zipfile.ZipFile(archive_filename, 'r') as zip_ref:
+        for member in members:
+            if store_dir is None:
+                zip_ref.extract(member, destination_dir)
+            else:
+                with zip_ref.open(member, 'r') as member_stream:
+                    digests[member.filename] = store_blob(member_stream, store_dir)
+                materialize_blob(store_dir, digests[member.filename],
+                                 get_member_target(member.filename, destination_dir))
+    return digests
+
+
+def get_member_target(member_name: str, destination_dir: str) -> str:
+    # Same sanitization as zipfile.ZipFile.extract, preventing writing outside of the destination folder
+    parts = [x for x in member_name.replace('\\', '/').split('/') if x not in ('', '.', '..')]
+    return os.path.join(destination_dir, *parts)
+
+
+def extract_archive_incrementally(archive_filename: str, destination_dir: str, store_dir: str = None,
+                                  max_workers: int = 4, large_member_size: int = 16777216) -> int:
+    """
+    Extracts an archive, skipping the members already extracted and left untouched since. The extracted members are
+    recorded in the archive sidecar manifest with their CRC, and the modification time of the extracted file, such
+    that a member is only extracted again if it went missing, was modified on disk, or changed in the archive.
+    The large members are decompressed in parallel, each worker using its own archive handle.
+
+    When a content-addressed store is given, the members are kept once in the store and hard linked into the
+    destination. Missing files are then restored from the store without decompressing anything, which also works when
+    the archive itself has been pruned after extraction. The blobs are checked against their digest before being
+    restored, the corrupted ones being dropped and decompressed again.
+
+    Parameters
+    ----------
+    archive_filename: str
+        Zip archive on disk.
+    destination_dir: str
+        Folder where the archive content is extracted.
+    store_dir: str
+        Root folder of the content-addressed store, if any.
+    max_workers: int
+        Maximum number of members decompressed simultaneously.
+    large_member_size: int
+        Uncompressed size, in bytes, above which a member is decompressed in its own task.
+
+    Returns
+    -------
+    The number of members extracted or restored.
+    """
+    manifest = read_archive_manifest(archive_filename)
+    extracted = manifest.get('extracted', {}) if manifest.get('destination', None) == destination_dir else {}
+
+    if os.path.exists(archive_filename):
+        with zipfile.ZipFile(archive_filename, 'r') as zip_ref:
+            members = [(x.filename, x.CRC, x.file_size, x) for x in zip_ref.infolist() if not x.is_dir()]
+    elif manifest.get('pruned', False) and store_dir is not None:
+        members = [(x, extracted[x]['crc'], extracted[x]['size'], None) for x in extracted.keys()]
+    else:
+        raise FileNotFoundError('Archive {} not found.'.format(archive_filename))
+
+    to_extract = []
+    to_restore = []
+    for name, crc, size, info in members:
+        target = get_member_target(name, destination_dir)
+        record = extracted.get(name, None)
+        if record is not None and record['crc'] == crc and os.path.exists(target):
+            stats = os.stat(target)
+            if stats.st_size == size and stats.st_mtime_ns == record['mtime_ns']:
+                continue
+        if store_dir is not None and record is not None and record['crc'] == crc and 'sha256' in record.keys() \
+                and os.path.exists(get_blob_filename(store_dir, record['sha256'])):
+            to_restore.append(name)
+        elif info is None:
+            raise FileNotFoundError('Content of {} not available anymore, the archive must be downloaded '
+                                    'again.'.format(name))
+        else:
+            to_extract.append(info)
+
+    digests = dict([(x, extracted[x]['sha256']) for x in extracted.keys() if 'sha256' in extracted[x].keys()])
+    restored = 0
+    for name in to_restore:
+        if not is_blob_valid(store_dir, extracted[name]['sha256']):
+            logging.warning("Corrupted blob for {} in the store, extracting it again.".format(name))
+            remove_file(get_blob_filename(store_dir, extracted[name]['sha256']))
+            del digests[name]
+            info = next((x[3] for x in members if x[0] == name), None)
+            if info is None:
+                raise FileNotFoundError('Content of {} not available anymore, the archive must be downloaded '
+                                        'again.'.format(name))
+            to_extract.append(info)
+            continue
+        materialize_blob(store_dir, extracted[name]['sha256'], get_member_target(name, destination_dir))
+        restored = restored + 1
+
+    if len(to_extract) != 0:
+        large_members = [x for x in to_extract if x.file_size >= large_member_size]
+        small_members = [x for x in to_extract if x.file_size < large_member_size]
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            jobs = [executor.submit(extract_archive_members, archive_filename, [x], destination_dir, store_dir)
+                    for x in large_members]
+            jobs.append(executor.submit(extract_archive_members, archive_filename, small_members, destination_dir,
+                                        store_dir))
+            for job in jobs:
+                digests.update(job.result())
+
+    # Extraction records are rebuilt from the archive content, dropping the members not part of it anymore
+    new_extracted = dict()
+    for name, crc, size, _ in members:
+        target = get_member_target(name, destination_dir)
+        if os.path.exists(target):
+            new_extracted[name] = {'crc': crc, 'size': size, 'mtime_ns': os.stat(target).st_mtime_ns}
+            if store_dir is not None and name in digests.keys():
+                new_extracted[name]['sha256'] = digests[name]
+    manifest = read_archive_manifest(archive_filename)
+    manifest['destination'] = destination_dir
+    manifest['extracted'] = new_extracted
+    write_archive_manifest(archive_filename, manifest)
+    return len(to_extract) + restored
+
+
+def prune_archive(archive_filename: str) -> None:
+    """
+    Deletes an archive whose content is held in the store, keeping its manifest, such that the archive is still
+    considered up-to-date and its files can be restored from the store.
+    """
+    manifest = read_archive_manifest(archive_filename)
+    if 'md5' not in manifest.keys() or len(manifest.get('extracted', {})) == 0 or \
+            not all(['sha256' in x.keys() for x in manifest['extracted'].values()]):
+        return
+    manifest['pruned'] = True
+    write_archive_manifest(archive_filename, manifest)
+    if os.path.exists(archive_filename):
+        os.remove(archive_filename)
+
+
+def collect_store_garbage(store_dir: str, manifests_dir: str) -> None:
+    """
+    Removes the blobs not referenced anymore by any archive manifest found in manifests_dir. Must not run while
+    archives are being extracted into the store, as their blobs are only referenced once extraction is over.
+    """
+    try:
+        referenced = set()
+        for manifest_filename in glob(os.path.join(manifests_dir, '*.manifest.json')):
+            with open(manifest_filename, 'r') as infile:
+                manifest = json.load(infile)
+            referenced.update([x['sha256'] for x in manifest.get('extracted', {}).values() if 'sha256' in x.keys()])
+        for blob_filename in glob(os.path.join(store_dir, 'sha256', '*', '*')):
+            if os.path.basename(blob_filename) not in referenced:
+                remove_file(blob_filename)
+    except Exception:
+        logging.warning("Unable to clean the content-addressed store.")
+        logging.warning(traceback.format_exc())
@@ -1,6 +1,8 @@
 import configparser
 import os
 import json
+import hashlib
+import logging
 import traceback
 
 from src.utils.resources import SharedResources
@@ -57,3 +59,64 @@ def generate_backend_config(input_folder: str, parameters, logic_target_space: s
     except Exception:
         print("Backend config file creation failed.")
         print(traceback.format_exc())
+
+
+def get_model_version(model_name: str) -> str:
+    """
+    Identifies the installed version of a model from the names, sizes and modification times of its files, without
+    reading them. Any update of the model (new files extracted from the store) gives a different version.
+
+    Returns
+    -------
+    Hexadecimal digest of the model folder content, or None if the model is not installed.
+    """
+    model_folder = os.path.join(SharedResources.getInstance().model_path, model_name)
+    if not os.path.isdir(model_folder):
+        return None
+    digest = hashlib.md5()
+    for root, dirs, files in os.walk(model_folder):
+        dirs.sort()
+        for f in sorted(files):
+            stats = os.stat(os.path.join(root, f))
+            digest.update('{}:{}:{};'.format(os.path.relpath(os.path.join(root, f), model_folder), stats.st_size,
+                                             stats.st_mtime_ns).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def get_pipeline_producers(parameters, logic_task: str, model_name: str) -> dict:
+    """
+    Lists the models producing each segmented structure in the backend pipeline about to be run, as described in
+    the local copy of its pipeline file (see generate_backend_config).
+
+    Parameters
+    ----------
+    parameters: dict
+        Model or diagnosis description (iodict), holding the diagnosis pipeline filename.
+    logic_task: str
+        Disambiguation between single segmentation or complex diagnosis pipeline
+    model_name: str
+        Name of the model to be executed in the backend.
+
+    Returns
+    -------
+    Dictionary with the structure class as key, and the producer ({'model': name, 'version': version}) as value.
+    """
+    producers = dict()
+    try:
+        pipeline_filename = os.path.join(SharedResources.getInstance().model_path, model_name, 'pipeline.json')
+        if logic_task == 'diagnosis':
+            pipeline_filename = os.path.join(SharedResources.getInstance().diagnosis_path,
+                                             parameters['UserConfiguration']['default'])
+        with open(pipeline_filename, 'r') as infile:
+            pipeline = json.load(infile)
+        for step in pipeline.values():
+            if not isinstance(step, dict) or str(step.get('task', '')).lower() != 'segmentation' or \
+                    'model' not in step.keys():
+                continue
+            targets = step.get('target', [])
+            for target in [targets] if isinstance(targets, str) else targets:
+                producers[target] = {'model': step['model'], 'version': get_model_version(step['model'])}
+    except Exception:
+        logging.warning("Unable to read the models of the backend pipeline for {}.".format(model_name))
+        logging.warning(traceback.format_exc())
+    return producers
@@ -0,0 +1,209 @@
+import os
+import csv
+import json
+import time
+import shutil
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from typing import List
+import requests
+
+from src.utils.resources import SharedResources
+from src.utils.repository_utilities import get_catalog_location, is_remote_location, resolve_repository_location
+
+# self.catalog_urls['models'] = 'https://drive.google.com/uc?id=1wVjqpQ7S3xTcNJyV2Sp_hSyKglcxfQLe'
+UPSTREAM_CATALOG_URLS = {'models': 'https://drive.google.com/uc?id=1uibFBPBQywX7EGK5G_Oc6CXlDSiOePKF',
+                         'diagnoses': 'https://drive.google.com/uc?id=1lFlfUGxiHxykmf_2keLhXX6k2PG5jn6M'}
+
+
+class CloudCatalog:
+    """
+    Singleton class giving access to the lists of models and diagnoses available on the cloud. Each list is fetched at
+    most once per time-to-live period, using conditional requests (ETag/Last-Modified) against the copy kept on disk,
+    and is indexed by item name.
+    Each catalog row corresponds to the following headers: Item,link,dependencies,sum,config.
+    The lists are taken from the repository configured in the user settings (local folder or LAN server) if any, in
+    which case the links can be relative to the repository root.
+    """
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if CloudCatalog.__instance == None:
+            CloudCatalog()
+        return CloudCatalog.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if CloudCatalog.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            CloudCatalog.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.catalog_urls = dict([(x, get_catalog_location(x, UPSTREAM_CATALOG_URLS[x]))
+                                  for x in UPSTREAM_CATALOG_URLS.keys()])
+        self.cache_dir = os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache', 'catalog')
+        self.request_timeout = 30
+        self.snapshots = dict()  # Catalog kind -> (timestamp of the last validation, OrderedDict name -> row)
+        self.lock = threading.Lock()
+
+    def get_rows(self, kind: str, force_refresh: bool = False, offline: bool = False) -> List[List[str]]:
+        """
+        Lists all the items of a catalog.
+
+        Parameters
+        ----------
+        kind: str
+            Catalog to query, between models and diagnoses.
+        force_refresh: bool
+            Validates the catalog against the remote version, regardless of its age.
+        offline: bool
+            Returns the last known catalog (in memory or on disk) without accessing the network, e.g. at startup.
+
+        Returns
+        -------
+        List of all available items on the cloud, each expressed as a List[str].
+        """
+        return list(self.get_snapshot(kind, force_refresh, offline).values())
+
+    def get_entry(self, kind: str, name: str) -> dict:
+        """
+        Looks up a catalog item by name.
+
+        Returns
+        -------
+        A dict with the name, url, dependencies (as a list), checksum, and config_url of the item, or None if the item
+        is not part of the catalog.
+        """
+        row = self.get_snapshot(kind).get(name, None)
+        if row is None:
+            return None
+        return CloudCatalog.parse_row(row)
+
+    @staticmethod
+    def parse_row(row: List[str]) -> dict:
+        """
+        Converts a catalog csv row into a dict with the name, url, dependencies (as a list), checksum, and config_url
+        of the item. Relative links are resolved against the repository root.
+        """
+        row = row + [''] * (5 - len(row))
+        return {'name': row[0], 'url': resolve_repository_location(row[1]),
+                'dependencies': [x.strip() for x in row[2].split(';') if x.strip() != ''],
+                'checksum': row[3], 'config_url': resolve_repository_location(row[4])}
+
+    def get_snapshot(self, kind: str, force_refresh: bool = False, offline: bool = False) -> OrderedDict:
+        """
+        Returns the catalog content as an OrderedDict with the item name as key and the csv row as value. The snapshot
+        is shared by all callers until it expires, and should not be modified.
+        In offline mode, the last known catalog is returned right away, without waiting for an ongoing refresh.
+        """
+        if offline:
+            snapshot = self.snapshots.get(kind, None)
+            return snapshot[1] if snapshot is not None else self.__parse(self.__get_csv_filename(kind))
+        with self.lock:
+            if not force_refresh and kind in self.snapshots.keys() and \
+                    time.time() - self.snapshots[kind][0] < SharedResources.getInstance().cloud_catalog_ttl:
+                return self.snapshots[kind][1]
+            self.snapshots[kind] = (time.time(), self.__fetch(kind))
+            return self.snapshots[kind][1]
+
+    def refresh_in_background(self, kinds: List[str] = None) -> threading.Thread:
+        """
+        Validates the given catalogs (all by default) against the remote versions on a background thread, if expired.
+
+        Returns
+        -------
+        The started thread, to poll for its completion.
+        """
+        kinds = list(self.catalog_urls.keys()) if kinds is None else kinds
+        thread = threading.Thread(target=lambda: [self.get_snapshot(x) for x in kinds])
+        thread.daemon = True  # Not delaying the application exit
+        thread.start()
+        return thread
+
+    def invalidate(self, kind: str = None) -> None:
+        with self.lock:
+            if kind is None:
+                self.snapshots = dict()
+            elif kind in self.snapshots.keys():
+                del self.snapshots[kind]
+
+    def __get_csv_filename(self, kind: str) -> str:
+        return os.path.join(self.cache_dir, 'cloud_' + kind + '_list.csv')
+
+    def __fetch(self, kind: str) -> OrderedDict:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        csv_filename = self.__get_csv_filename(kind)
+        metadata_filename = os.path.join(self.cache_dir, 'cloud_' + kind + '_list.json')
+        metadata = dict()
+        if os.path.exists(csv_filename) and os.path.exists(metadata_filename):
+            try:
+                with open(metadata_filename, 'r') as infile:
+                    metadata = json.load(infile)
+            except Exception:
+                metadata = dict()
+
+        if not is_remote_location(self.catalog_urls[kind]):
+            return self.__copy_local(kind, csv_filename, metadata_filename, metadata)
+
+        headers = {}
+        if 'etag' in metadata.keys():
+            headers['If-None-Match'] = metadata['etag']
+        if 'last_modified' in metadata.keys():
+            headers['If-Modified-Since'] = metadata['last_modified']
+        try:
+            response = requests.get(self.catalog_urls[kind], headers=headers, timeout=self.request_timeout)
+            if response.status_code != requests.codes.not_modified:
+                response.raise_for_status()
+                with open(csv_filename + '.part', 'wb') as outfile:
+                    outfile.write(response.content)
+                os.replace(csv_filename + '.part', csv_filename)
+                metadata = dict()
+                if response.headers.get('ETag', None) is not None:
+                    metadata['etag'] = response.headers['ETag']
+                if response.headers.get('Last-Modified', None) is not None:
+                    metadata['last_modified'] = response.headers['Last-Modified']
+                with open(metadata_filename, 'w') as outfile:
+                    json.dump(metadata, outfile)
+        except Exception:
+            # Working offline, or remote unavailable, the last known catalog is used if any.
+            print('Impossible to access the cloud {} list.\n'.format(kind))
+            print('{}'.format(traceback.format_exc()))
+
+        return self.__parse(csv_filename)
+
+    def __copy_local(self, kind: str, csv_filename: str, metadata_filename: str, metadata: dict) -> OrderedDict:
+        # Catalog served from a folder (e.g. network share), only copied again if modified since
+        try:
+            stats = os.stat(self.catalog_urls[kind])
+            if metadata.get('size', None) != stats.st_size or metadata.get('mtime_ns', None) != stats.st_mtime_ns:
+                shutil.copyfile(self.catalog_urls[kind], csv_filename + '.part')
+                os.replace(csv_filename + '.part', csv_filename)
+                with open(metadata_filename, 'w') as outfile:
+                    json.dump({'size': stats.st_size, 'mtime_ns': stats.st_mtime_ns}, outfile)
+        except Exception:
+            print('Impossible to access the {} list in the local repository.\n'.format(kind))
+            print('{}'.format(traceback.format_exc()))
+
+        return self.__parse(csv_filename)
+
+    def __parse(self, csv_filename: str) -> OrderedDict:
+        catalog = OrderedDict()
+        if not os.path.exists(csv_filename):
+            return catalog
+        try:
+            with open(csv_filename) as csv_file:
+                csv_reader = csv.reader(csv_file, delimiter=',')
+                for line_count, row in enumerate(csv_reader):
+                    if line_count == 0 or len(row) == 0:
+                        continue
+                    catalog[row[0]] = row
+        except Exception:
+            logging.warning('Unable to parse the cloud catalog {}.'.format(csv_filename))
+            logging.warning(traceback.format_exc())
+        return catalog
@@ -0,0 +1,231 @@
+import os
+import shutil
+import platform
+import threading
+import subprocess
+import traceback
+
+# Tarballs currently being exported in the background, not to run two exports of the same image
+saves_in_progress = set()
+saves_in_progress_lock = threading.Lock()
+
+
+def get_low_priority_command(cmd: list) -> tuple:
+    """
+    Command and arguments for subprocess.Popen to start a process with a lower scheduling priority than the
+    application. The priority is set on the command line (nice) rather than in the child process, such that it can be
+    used from any thread.
+
+    Returns
+    -------
+    Tuple (command, Popen keyword arguments).
+    """
+    if platform.system() == 'Windows':
+        return cmd, {'creationflags': getattr(subprocess, 'BELOW_NORMAL_PRIORITY_CLASS', 0x00004000)}
+    if shutil.which('nice') is not None:
+        return ['nice', '-n', '10'] + cmd, {}
+    return cmd, {}
+
+
+def run_docker_command(cmd: list, progress_callback=None, low_priority: bool = False) -> tuple:
+    """
+    Runs a Docker client command until completion, forwarding every line of its output to progress_callback (e.g.,
+    the layers being pulled). Blocking, to be called from a worker thread when run from the user interface.
+
+    Returns
+    -------
+    Tuple (return code, full output).
+    """
+    kwargs = {}
+    if low_priority:
+        cmd, kwargs = get_low_priority_command(cmd)
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs)
+    output = []
+    for line in iter(p.stdout.readline, b''):
+        line = line.decode("utf-8", errors='replace').strip()
+        output.append(line)
+        if progress_callback is not None and line != '':
+            progress_callback(line)
+    p.stdout.close()
+    p.wait()
+    return p.returncode, '\n'.join(output)
+
+
+def docker_image_exists(docker_path: str, docker_image_name: str) -> bool:
+    """
+    Checks if a Docker image is available locally, without contacting any registry.
+
+    Parameters
+    ----------
+    docker_path: str
+        Docker executable.
+    docker_image_name: str
+        Name of the Docker image in the form <user>/<image_name>:<tag>
+
+    Returns
+    -------
+    True if the image exists locally, False otherwise.
+    """
+    try:
+        p = subprocess.Popen([docker_path, 'image', 'inspect', docker_image_name], stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate()
+        return p.returncode == 0
+    except Exception:
+        print("Unable to inspect the Docker image {}.".format(docker_image_name))
+        print(traceback.format_exc())
+        return False
+
+
+def docker_pull_image(docker_path: str, docker_image_name: str, low_priority: bool = False,
+                      progress_callback=None) -> bool:
+    """
+    Pulls a Docker image from the registry.
+
+    Parameters
+    ----------
+    docker_path: str
+        Docker executable.
+    docker_image_name: str
+        Name of the Docker image in the form <user>/<image_name>:<tag>
+    low_priority: bool
+        Runs the Docker client with a lower priority, for background operations.
+    progress_callback:
+        Function called with every line of output of the pull, if not None.
+
+    Returns
+    -------
+    True if the pull operation succeeded, False otherwise.
+    """
+    try:
+        returncode, output = run_docker_command([docker_path, 'pull', docker_image_name],
+                                                progress_callback=progress_callback, low_priority=low_priority)
+        return returncode == 0
+    except Exception:
+        print("Unable to pull the Docker image {}.".format(docker_image_name))
+        print(traceback.format_exc())
+        return False
+
+
+def get_docker_image_tarball_filename(cache_dir: str, docker_image_name: str) -> str:
+    """
+    Location of the exported Docker image inside the tarball cache, e.g. dbouget_raidionics-rads_v1.1.tar.
+    """
+    return os.path.join(cache_dir, docker_image_name.replace('/', '_').replace(':', '_') + '.tar')
+
+
+def docker_load_image(docker_path: str, cache_dir: str, docker_image_name: str, progress_callback=None) -> bool:
+    """
+    Loads a Docker image from the tarball cache (local folder or network share), if exported there before. A tarball
+    still being exported is not considered.
+
+    Returns
+    -------
+    True if the image is available locally after the operation, False otherwise.
+    """
+    tarball_filename = get_docker_image_tarball_filename(cache_dir, docker_image_name)
+    if not os.path.exists(tarball_filename):
+        return False
+    try:
+        if progress_callback is not None:
+            progress_callback("Loading {} from the image cache.".format(docker_image_name))
+        run_docker_command([docker_path, 'load', '-i', tarball_filename], progress_callback=progress_callback)
+    except Exception:
+        print("Unable to load the Docker image {} from {}.".format(docker_image_name, tarball_filename))
+        print(traceback.format_exc())
+        return False
+    return docker_image_exists(docker_path, docker_image_name)
+
+
+def docker_save_image(docker_path: str, cache_dir: str, docker_image_name: str, low_priority: bool = False) -> bool:
+    """
+    Exports a local Docker image to the tarball cache, for other workstations to load it without using the registry.
+    The tarball is written under a temporary name, and only renamed when complete.
+
+    Returns
+    -------
+    True if the export succeeded, False otherwise.
+    """
+    tarball_filename = get_docker_image_tarball_filename(cache_dir, docker_image_name)
+    part_filename = tarball_filename + '.part'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        returncode, output = run_docker_command([docker_path, 'save', '-o', part_filename, docker_image_name],
+                                                low_priority=low_priority)
+        if returncode != 0:
+            raise RuntimeError(output)
+        os.replace(part_filename, tarball_filename)
+        return True
+    except Exception:
+        print("Unable to export the Docker image {} to {}.".format(docker_image_name, cache_dir))
+        print(traceback.format_exc())
+        if os.path.exists(part_filename):
+            os.remove(part_filename)
+        return False
+
+
+def docker_save_image_in_background(docker_path: str, cache_dir: str, docker_image_name: str) -> threading.Thread:
+    """
+    Exports a local Docker image to the tarball cache on a background thread, with a lower priority, unless already
+    exported or being exported.
+
+    Returns
+    -------
+    The thread running the export, or None if no export was started.
+    """
+    tarball_filename = get_docker_image_tarball_filename(cache_dir, docker_image_name)
+    with saves_in_progress_lock:
+        if tarball_filename in saves_in_progress or os.path.exists(tarball_filename):
+            return None
+        saves_in_progress.add(tarball_filename)
+
+    def save():
+        try:
+            docker_save_image(docker_path, cache_dir, docker_image_name, low_priority=True)
+        finally:
+            with saves_in_progress_lock:
+                saves_in_progress.discard(tarball_filename)
+
+    thread = threading.Thread(target=save)
+    thread.daemon = True  # Not delaying the application exit, the partial tarball is never loaded
+    thread.start()
+    return thread
+
+
+def ensure_docker_image(docker_path: str, docker_image_name: str, cache_dir: str = None,
+                        low_priority: bool = False, progress_callback=None) -> bool:
+    """
+    Makes a Docker image available locally, by loading it from the tarball cache when possible, and by pulling it
+    from the registry otherwise. Once usable, a pulled image is exported to the tarball cache in the background.
+    Blocking, to be called from a worker thread when run from the user interface (see DownloadWorker).
+
+    Parameters
+    ----------
+    docker_path: str
+        Docker executable.
+    docker_image_name: str
+        Name of the Docker image in the form <user>/<image_name>:<tag>
+    cache_dir: str
+        Tarball cache folder, local or on a network share. Not used if None or empty.
+    low_priority: bool
+        Runs the Docker client with a lower priority, for background operations.
+    progress_callback:
+        Function called with every line of output of the load or pull operations, if not None.
+
+    Returns
+    -------
+    True if the image is available locally after the operation, False otherwise.
+    """
+    if docker_image_exists(docker_path, docker_image_name):
+        return True
+    if cache_dir is not None and cache_dir != '' and \
+            docker_load_image(docker_path, cache_dir, docker_image_name, progress_callback=progress_callback):
+        return True
+    if not docker_pull_image(docker_path, docker_image_name, low_priority=low_priority,
+                             progress_callback=progress_callback):
+        return False
+    if not docker_image_exists(docker_path, docker_image_name):
+        return False
+    if cache_dir is not None and cache_dir != '':
+        docker_save_image_in_background(docker_path, cache_dir, docker_image_name)
+    return True
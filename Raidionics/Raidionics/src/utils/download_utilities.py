@@ -0,0 +1,224 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+from src.utils.archive_utilities import compute_file_md5
+
+
+def download_file(url: str, destination: str, expected_md5: str = None, chunk_size: int = 1048576,
+                  max_retries: int = 3, timeout: int = 60, progress_callback=None) -> str:
+    """
+    Downloads a file over HTTP into a temporary .part file, hashing the content while streaming. An interrupted
+    transfer is resumed from the bytes already on disk with a Range request, either in a later retry or in a later call.
+    The destination file is only (atomically) replaced once the whole content has been received and the checksum
+    matches.
+
+    Parameters
+    ----------
+    url: str
+        Remote location of the file.
+    destination: str
+        Final location of the file on disk.
+    expected_md5: str
+        Hexadecimal md5 digest the downloaded content must match, if provided.
+    chunk_size: int
+        Number of bytes written at once.
+    max_retries: int
+        Number of additional attempts, resuming the transfer, after a network failure.
+    timeout: int
+        Seconds to wait for the server before considering the connection lost.
+    progress_callback: Callable[[int, int], None]
+        Optional function called with the number of bytes received so far and the total size (or None if unknown).
+
+    Returns
+    -------
+    Hexadecimal md5 digest of the downloaded file.
+    """
+    part_filename = destination + '.part'
+    attempt = 0
+    while True:
+        try:
+            md5 = hashlib.md5()
+            offset = 0
+            if os.path.exists(part_filename):
+                # Hashing the bytes already received, to carry on with the remaining ones
+                with open(part_filename, 'rb') as f:
+                    for chunk in iter(lambda: f.read(chunk_size), b''):
+                        md5.update(chunk)
+                        offset += len(chunk)
+
+            headers = {'Range': 'bytes={}-'.format(offset)} if offset > 0 else {}
+            with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == requests.codes.requested_range_not_satisfiable:
+                    # The part file already holds the whole content
+                    pass
+                else:
+                    response.raise_for_status()
+                    if response.status_code != requests.codes.partial_content and offset > 0:
+                        # Range requests not supported by the server, restarting from scratch
+                        md5 = hashlib.md5()
+                        offset = 0
+                    total_size = response.headers.get('Content-Length', None)
+                    total_size = int(total_size) + offset if total_size is not None else None
+                    with open(part_filename, 'ab' if offset > 0 else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+                            md5.update(chunk)
+                            offset += len(chunk)
+                            if progress_callback is not None:
+                                progress_callback(offset, total_size)
+                    if total_size is not None and offset < total_size:
+                        raise requests.exceptions.ConnectionError('Transfer interrupted at {}/{} bytes.'.format(
+                            offset, total_size))
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            logging.warning('Download of {} interrupted ({}), resuming (attempt {}/{}).'.format(url, e, attempt,
+                                                                                               max_retries))
+
+    digest = md5.hexdigest()
+    if expected_md5 is not None and expected_md5.strip() != '' and digest != expected_md5:
+        os.remove(part_filename)
+        raise ValueError('Checksum mismatch for {}: expected {}, got {}.'.format(url, expected_md5, digest))
+    os.replace(part_filename, destination)
+    return digest
+
+
+def probe_range_support(url: str, timeout: int = 60) -> int:
+    """
+    Checks if the server accepts byte range requests for the given url, by requesting the very first byte.
+
+    Returns
+    -------
+    The total size of the remote file in bytes if ranges are supported, None otherwise.
+    """
+    try:
+        with requests.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as response:
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code != requests.codes.partial_content or '/' not in content_range:
+                return None
+            total_size = content_range.split('/')[-1].strip()
+            return int(total_size) if total_size.isdigit() else None
+    except requests.exceptions.RequestException:
+        return None
+
+
+def download_file_segmented(url: str, destination: str, expected_md5: str = None, num_connections: int = 4,
+                            min_segment_size: int = 8388608, chunk_size: int = 1048576, max_retries: int = 3,
+                            timeout: int = 60, progress_callback=None) -> str:
+    """
+    Downloads a file over HTTP with several connections in parallel, each fetching its own byte range into the same
+    temporary .part file. The completed segments are recorded next to the .part file, such that an interrupted
+    transfer only fetches the missing segments again in a later call.
+    Falls back to a single stream (see download_file) when the server does not support range requests, when the file
+    is too small to be worth splitting, or when a single-stream transfer is already ongoing.
+
+    Parameters
+    ----------
+    url: str
+        Remote location of the file.
+    destination: str
+        Final location of the file on disk.
+    expected_md5: str
+        Hexadecimal md5 digest the downloaded content must match, if provided.
+    num_connections: int
+        Maximum number of byte ranges fetched simultaneously.
+    min_segment_size: int
+        Minimum number of bytes per range, smaller files are downloaded with a single stream.
+    chunk_size: int
+        Number of bytes written at once.
+    max_retries: int
+        Number of additional attempts per segment, resuming the transfer, after a network failure.
+    timeout: int
+        Seconds to wait for the server before considering the connection lost.
+    progress_callback: Callable[[int, int], None]
+        Optional function called with the number of bytes received so far and the total size.
+
+    Returns
+    -------
+    Hexadecimal md5 digest of the downloaded file.
+    """
+    part_filename = destination + '.part'
+    segments_filename = part_filename + '.segments.json'
+    single_stream_ongoing = os.path.exists(part_filename) and not os.path.exists(segments_filename)
+    total_size = None if single_stream_ongoing or num_connections < 2 else probe_range_support(url, timeout)
+    if total_size is None or total_size < 2 * min_segment_size:
+        return download_file(url, destination, expected_md5=expected_md5, chunk_size=chunk_size,
+                             max_retries=max_retries, timeout=timeout, progress_callback=progress_callback)
+
+    segment_size = max(min_segment_size, -(-total_size // num_connections))
+    segments = [(start, min(start + segment_size, total_size) - 1) for start in range(0, total_size, segment_size)]
+    state = dict()
+    if os.path.exists(segments_filename):
+        try:
+            with open(segments_filename, 'r') as infile:
+                state = json.load(infile)
+        except Exception:
+            state = dict()
+    if state.get('url', None) != url or state.get('total_size', None) != total_size or \
+            state.get('segment_size', None) != segment_size or not os.path.exists(part_filename):
+        # Starting over, with the whole file preallocated such that each segment is written in place
+        state = {'url': url, 'total_size': total_size, 'segment_size': segment_size, 'completed': []}
+        with open(part_filename, 'wb') as f:
+            f.truncate(total_size)
+
+    state_lock = threading.Lock()
+    received = [sum([segments[i][1] - segments[i][0] + 1 for i in state['completed']])]
+
+    def fetch_segment(index: int) -> None:
+        start, end = segments[index]
+        offset = start
+        attempt = 0
+        while offset <= end:
+            try:
+                headers = {'Range': 'bytes={}-{}'.format(offset, end)}
+                with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                    response.raise_for_status()
+                    if response.status_code != requests.codes.partial_content:
+                        raise requests.exceptions.ConnectionError('Range request ignored by the server.')
+                    with open(part_filename, 'r+b') as f:
+                        f.seek(offset)
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            chunk = chunk[:end + 1 - offset]
+                            f.write(chunk)
+                            offset += len(chunk)
+                            with state_lock:
+                                received[0] += len(chunk)
+                                if progress_callback is not None:
+                                    progress_callback(received[0], total_size)
+                            if offset > end:
+                                break
+                if offset <= end:
+                    raise requests.exceptions.ConnectionError('Segment interrupted at {}/{} bytes.'.format(
+                        offset - start, end - start + 1))
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                attempt += 1
+                if attempt > max_retries:
+                    raise
+                logging.warning('Download of {} interrupted ({}), resuming segment {} (attempt {}/{}).'.format(
+                    url, e, index, attempt, max_retries))
+        with state_lock:
+            state['completed'].append(index)
+            with open(segments_filename, 'w') as outfile:
+                json.dump(state, outfile)
+
+    pending = [i for i in range(len(segments)) if i not in state['completed']]
+    with ThreadPoolExecutor(max_workers=num_connections) as executor:
+        for job in [executor.submit(fetch_segment, i) for i in pending]:
+            job.result()
+
+    digest = compute_file_md5(part_filename, chunk_size=chunk_size)
+    os.remove(segments_filename)
+    if expected_md5 is not None and expected_md5.strip() != '' and digest != expected_md5:
+        os.remove(part_filename)
+        raise ValueError('Checksum mismatch for {}: expected {}, got {}.'.format(url, expected_md5, digest))
+    os.replace(part_filename, destination)
+    return digest
@@ -7,7 +7,10 @@ import traceback
 import csv
 import threading
 import hashlib
+from contextlib import contextmanager
 from typing import List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import json
 import datetime
 import zipfile
@@ -15,47 +18,26 @@ import requests
 from email.utils import parsedate_to_datetime, formatdate
 import webbrowser
 import time
-try:
-    import gdown
-    if int(gdown.__version__.split('.')[0]) < 4 or int(gdown.__version__.split('.')[1]) < 4:
-        from __main__ import slicer
-        slicer.util.pip_install('gdown==4.4.0')
-except:
-    from __main__ import slicer
-    slicer.util.pip_install('gdown==4.4.0')
-    import gdown
 
 from src.utils.resources import SharedResources
+from src.utils.cloud_catalog import CloudCatalog
+from src.utils.archive_utilities import is_archive_up_to_date, record_archive_checksum, \
+    extract_archive_incrementally, prune_archive, collect_store_garbage, compute_file_md5
+from src.utils.repository_utilities import fetch_repository_file, is_remote_location
+from src.utils.docker_utilities import ensure_docker_image
 
 
-def get_available_cloud_models_list() -> List[List[str]]:
+def get_available_cloud_models_list(offline: bool = False) -> List[List[str]]:
     """
-    Collects a csv file from Google Drive, summarizing all available models.
+    Lists all available models from the cloud catalog, fetched at most once per session (or time-to-live period).
+    In offline mode, the last known catalog is returned without accessing the network.
 
     Returns
     ------
     List of all available models on the cloud, each expressed as a List[str].
     Each model list element corresponds to the following headers: Item,link,dependencies,sum.
     """
-    cloud_models_list = []
-    # cloud_models_list_url = 'https://drive.google.com/uc?id=1wVjqpQ7S3xTcNJyV2Sp_hSyKglcxfQLe'
-    cloud_models_list_url = 'https://drive.google.com/uc?id=1uibFBPBQywX7EGK5G_Oc6CXlDSiOePKF'
-    try:
-        cloud_models_list_filename = os.path.join(SharedResources.getInstance().json_cloud_dir, 'cloud_models_list.csv')
-        gdown.cached_download(url=cloud_models_list_url, path=cloud_models_list_filename)
-        line_count = 0
-        with open(cloud_models_list_filename) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            for row in csv_reader:
-                if line_count == 0:
-                    line_count += 1
-                else:
-                    cloud_models_list.append(row)
-    except Exception as e:
-        print('Impossible to access the cloud models list.\n')
-        print('{}'.format(traceback.format_exc()))
-
-    return cloud_models_list
+    return CloudCatalog.getInstance().get_rows('models', offline=offline)
 
 
 def download_cloud_model_thread(selected_model):
@@ -64,184 +46,300 @@ def download_cloud_model_thread(selected_model):
     download_cloud_model_thread.start()
 
 
-def download_cloud_model(selected_model):
+gdown_module = None
+gdown_lock = threading.Lock()
+
+
+def get_gdown():
+    """
+    Imports gdown upon first use, installing the expected version if needed, rather than when loading the module.
+    The installation drives the Qt event loop, and is only performed on the main thread: the first call should be
+    made from there (e.g., by DownloadDialog) before starting any download thread.
+    """
+    global gdown_module
+    with gdown_lock:
+        if gdown_module is not None:
+            return gdown_module
+        on_main_thread = threading.current_thread() is threading.main_thread()
+        try:
+            import gdown
+            if int(gdown.__version__.split('.')[0]) < 4 or int(gdown.__version__.split('.')[1]) < 4:
+                if not on_main_thread:
+                    raise ImportError('gdown {} is outdated.'.format(gdown.__version__))
+                slicer.util.pip_install('gdown==4.4.0')
+        except ImportError:
+            if not on_main_thread:
+                raise ImportError('gdown==4.4.0 must be installed from the main thread before downloading.')
+            slicer.util.pip_install('gdown==4.4.0')
+            import gdown
+        gdown_module = gdown
+        return gdown_module
+
+
+def fetch_config_file(url: str, destination: str, md5: str = None) -> None:
+    """
+    Retrieves a configuration file, unless already on disk and matching the md5 digest, if provided.
+    Links to the upstream cloud storage go through gdown, while the ones to a local or LAN repository are copied or
+    downloaded directly.
+    """
+    if is_remote_location(url) and 'drive.google.com' in url:
+        get_gdown().cached_download(url=url, path=destination, md5=md5)
+        return
+    if os.path.exists(destination) and (md5 is None or md5.strip() == '' or compute_file_md5(destination) == md5):
+        return
+    fetch_repository_file(url, destination, expected_md5=md5)
+
+
+def get_model_archive_filename(model_name: str) -> str:
     """
-    Legacy, but still needed, model download method (use recursively from within the DownloadWorker thread.
-    @TODO. Should be removed and the recursive download should just happen inside the worker.
+    Location of the cached archive for the given model name.
+    """
+    return os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
+                        str('_'.join(model_name.split(']')[:-1]).replace('[', '').replace('/', '-')) + '.zip')
+
+
+def get_model_store_dir() -> str:
+    """
+    Location of the content-addressed store, holding the extracted model files once across models and versions.
+    """
+    return os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache', 'store')
+
+
+def resolve_model_dependencies(model_names: List[str], catalog_snapshot) -> List[dict]:
+    """
+    Builds the full dependency graph of a set of models from a single catalog snapshot, where each model appears once
+    no matter how many other models depend on it (e.g., in a diamond pattern).
 
     Parameters
     ----------
-    selected_model: str
-        Unique name identifier of the model to be downloaded.
+    model_names: List[str]
+        Unique name identifiers of the requested models.
+    catalog_snapshot: OrderedDict
+        Models catalog content, as given by CloudCatalog.get_snapshot.
 
     Returns
     -------
-    Boolean to indicate if the download operation succeeded or failed.
+    The list of catalog entries (as given by CloudCatalog.parse_row) for the requested models and all their
+    dependencies, each listed once.
     """
-    model_url = ''
-    model_dependencies = []
-    model_checksum = None
-    model_config_url = None
-    tmp_archive_dir = ''
-    success = True
-    download_state = False
-    extract_state = False
-    cloud_models = get_available_cloud_models_list()
+    resolved = OrderedDict()
+    pending = list(model_names)
+    while len(pending) != 0:
+        name = pending.pop(0)
+        if name in resolved.keys():
+            continue
+        if name not in catalog_snapshot.keys():
+            raise ValueError('Model {} not found in the cloud catalog.'.format(name))
+        resolved[name] = CloudCatalog.parse_row(catalog_snapshot[name])
+        pending.extend([x for x in resolved[name]['dependencies'] if x not in resolved.keys()])
+    return list(resolved.values())
+
+
+model_install_locks = dict()
+model_install_locks_guard = threading.Lock()
+
+
+def get_model_install_lock(model_name: str) -> threading.Lock:
+    with model_install_locks_guard:
+        if model_name not in model_install_locks.keys():
+            model_install_locks[model_name] = threading.Lock()
+        return model_install_locks[model_name]
+
+
+# Number of installs currently writing to the model store, the store garbage collection waiting for none to run
+model_store_installs = 0
+model_store_guard = threading.Lock()
+
+
+@contextmanager
+def model_store_install():
+    """
+    Marks the enclosed block as using the model store, such that its blobs are not collected before being referenced.
+    """
+    global model_store_installs
+    with model_store_guard:
+        model_store_installs = model_store_installs + 1
     try:
-        for model in cloud_models:
-            if model[0] == selected_model:
-                model_url = model[1]
-                model_dependencies = model[2].split(';') if model[2].strip() != '' else []
-                model_checksum = model[3]
-                model_config_url = model[4]
+        yield
+    finally:
+        with model_store_guard:
+            model_store_installs = model_store_installs - 1
+
+
+def collect_model_store_garbage() -> None:
+    """
+    Removes the unreferenced blobs from the model store, unless an install is in progress (the last install to finish
+    will do it). No install can start while the collection runs.
+    """
+    with model_store_guard:
+        if model_store_installs != 0:
+            return
+        collect_store_garbage(get_model_store_dir(), os.path.join(SharedResources.getInstance().Raidionics_dir,
+                                                                  '.cache'))
+
 
+def install_cloud_model(model_entry: dict) -> None:
+    """
+    Downloads and extracts a single model, not including its dependencies, unless the local copy is up-to-date.
+    Can be called concurrently for different models.
+
+    Parameters
+    ----------
+    model_entry: dict
+        Catalog entry of the model, as given by CloudCatalog.parse_row.
+    """
+    selected_model = model_entry['name']
+    # The same model can be requested concurrently, e.g. by the user while being prefetched in the background
+    with get_model_install_lock(selected_model), model_store_install():
         model_dest_dir = SharedResources.getInstance().model_path
-        json_local_dir = SharedResources.getInstance().json_local_dir
-        json_cloud_dir = SharedResources.getInstance().json_cloud_dir
-        archive_dl_dest = os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
-                                       str('_'.join(selected_model.split(']')[:-1]).replace('[', '').replace('/',
-                                                                                                             '-'))
-                                       + '.zip')
-        os.makedirs(os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache'), exist_ok=True)
-        gdown.cached_download(url=model_config_url,
-                              path=os.path.join(SharedResources.getInstance().json_local_dir,
-                                                '_'.join(selected_model[1:-1].split('][')) + '.json'))
-
-        if not os.path.exists(archive_dl_dest) or hashlib.md5(
-                open(archive_dl_dest, 'rb').read()).hexdigest() != model_checksum:
-            download_state = True
-
-        if download_state:
-            headers = {}
-
-            response = requests.get(model_url, headers=headers, stream=True)
-            response.raise_for_status()
-
-            if response.status_code == requests.codes.ok:
-                with open(archive_dl_dest, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=1048576):
-                        f.write(chunk)
-                extract_state = True
-        else:
-            zip_content = zipfile.ZipFile(archive_dl_dest).namelist()
-            for f in zip_content:
-                if not os.path.exists(os.path.join(model_dest_dir, f)):
-                    extract_state = True
-
-        if extract_state:
-            with zipfile.ZipFile(archive_dl_dest, 'r') as zip_ref:
-                zip_ref.extractall(model_dest_dir)
-
-        # Checking if dependencies are needed, and if they exist already locally
-        if len(model_dependencies) > 0:
-            for dep in model_dependencies:
-                success_dep = download_cloud_model(dep)
-                success = success & success_dep
-    except Exception as e:
-        print('Impossible to download the selected cloud model.\n')
+        archive_dl_dest = get_model_archive_filename(selected_model)
+        os.makedirs(os.path.dirname(archive_dl_dest), exist_ok=True)
+        fetch_config_file(url=model_entry['config_url'],
+                          destination=os.path.join(SharedResources.getInstance().json_local_dir,
+                                                   '_'.join(selected_model[1:-1].split('][')) + '.json'))
+
+        store_dir = get_model_store_dir()
+        if not is_archive_up_to_date(archive_dl_dest, model_entry['checksum']):
+            md5 = fetch_repository_file(model_entry['url'], archive_dl_dest, expected_md5=model_entry['checksum'],
+                                        num_connections=SharedResources.getInstance().download_connections)
+            record_archive_checksum(archive_dl_dest, md5)
+
+        # Only the members missing, modified, or updated in the archive are extracted, through the local store
+        try:
+            extract_archive_incrementally(archive_dl_dest, model_dest_dir, store_dir=store_dir)
+        except FileNotFoundError:
+            # The archive was pruned, and some of its content is not in the store anymore
+            md5 = fetch_repository_file(model_entry['url'], archive_dl_dest, expected_md5=model_entry['checksum'],
+                                        num_connections=SharedResources.getInstance().download_connections)
+            record_archive_checksum(archive_dl_dest, md5)
+            extract_archive_incrementally(archive_dl_dest, model_dest_dir, store_dir=store_dir)
+
+        if SharedResources.getInstance().prune_model_archives:
+            prune_archive(archive_dl_dest)
+
+
+def download_cloud_models(model_names: List[str], max_workers: int = 4) -> bool:
+    """
+    Downloads a set of models together with all their dependencies. The dependency graph is resolved once, and the
+    independent archives are downloaded concurrently by a bounded pool of workers.
+
+    Parameters
+    ----------
+    model_names: List[str]
+        Unique name identifiers of the models to be downloaded.
+    max_workers: int
+        Maximum number of simultaneous downloads.
+
+    Returns
+    -------
+    Boolean to indicate if all download operations succeeded.
+    """
+    success = True
+    try:
+        models = resolve_model_dependencies(model_names, CloudCatalog.getInstance().get_snapshot('models'))
+    except Exception:
+        print('Impossible to resolve the dependencies of the selected cloud models.\n')
         print('{}'.format(traceback.format_exc()))
-        success = False
-        if os.path.exists(tmp_archive_dir):
-            shutil.rmtree(tmp_archive_dir)
+        return False
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(models)))) as executor:
+        jobs = OrderedDict([(m['name'], executor.submit(install_cloud_model, m)) for m in models])
+        for name in jobs.keys():
+            try:
+                jobs[name].result()
+            except Exception:
+                print('Impossible to download the cloud model {}.\n'.format(name))
+                print('{}'.format(traceback.format_exc()))
+                success = False
+    collect_model_store_garbage()
     return success
 
 
-def check_local_model_for_update(selected_model):
+def download_cloud_model(selected_model):
     """
-    Compares the existing local model with the remote ones, to identify if a new version is available for download,
-    by checking the checksums.
+    Downloads a model, and all its dependencies if they do not exist already locally.
 
+    Parameters
+    ----------
+    selected_model: str
+        Unique name identifier of the model to be downloaded.
 
+    Returns
+    -------
+    Boolean to indicate if the download operation succeeded or failed.
+    """
+    return download_cloud_models([selected_model])
+
+
+def check_local_models_for_update(model_names: List[str]) -> bool:
+    """
+    Compares the existing local models, and all their dependencies, with the remote ones, to identify if a new version
+    is available for download, by checking the checksums.
     """
-    model_url = ''
-    model_dependencies = []
-    model_checksum = None
-    tmp_archive_dir = ''
-    cloud_models = get_available_cloud_models_list()
     download_required = False
     try:
-        for model in cloud_models:
-            if model[0] == selected_model:
-                model_url = model[1]
-                model_dependencies = model[2].split(';') if model[2].strip() != '' else []
-                model_checksum = model[3]
+        models = resolve_model_dependencies(model_names, CloudCatalog.getInstance().get_snapshot('models'))
+        for m in models:
+            if not is_archive_up_to_date(get_model_archive_filename(m['name']), m['checksum']):
+                download_required = True
                 break
-
-        model_dest_dir = SharedResources.getInstance().model_path
-        json_local_dir = SharedResources.getInstance().json_local_dir
-        json_cloud_dir = SharedResources.getInstance().json_cloud_dir
-        archive_dl_dest = os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
-                                       str('_'.join(selected_model.split(']')[:-1]).replace('[', '').replace('/', '-'))
-                                       + '.zip')
-        download_required = not os.path.exists(archive_dl_dest) or hashlib.md5(open(archive_dl_dest, 'rb').read()).hexdigest() != model_checksum
-
-        # Checking if update in dependencies is needed
-        if len(model_dependencies) > 0:
-            for dep in model_dependencies:
-                download_required_dep = check_local_model_for_update(dep)
-                download_required = download_required or download_required_dep
     except Exception as e:
-        print('Impossible to check for model update for: {}.\n'.format(selected_model))
+        print('Impossible to check for model update for: {}.\n'.format(', '.join(model_names)))
         print('{}'.format(traceback.format_exc()))
         download_required = False
 
     return download_required
 
 
-def get_available_cloud_diagnoses_list():
-    cloud_diagnoses_list = []
-    cloud_diagnoses_list_url = 'https://drive.google.com/uc?id=1lFlfUGxiHxykmf_2keLhXX6k2PG5jn6M'
-    try:
-        cloud_diagnoses_list_filename = os.path.join(SharedResources.getInstance().json_cloud_dir, 'cloud_diagnoses_list.csv')
-        gdown.cached_download(url=cloud_diagnoses_list_url, path=cloud_diagnoses_list_filename)
-        line_count = 0
-        with open(cloud_diagnoses_list_filename) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            for row in csv_reader:
-                if line_count == 0:
-                    line_count += 1
-                else:
-                    cloud_diagnoses_list.append(row)
-    except Exception as e:
-        print('Impossible to access the cloud diagnoses list.\n')
-        print('{}'.format(traceback.format_exc()))
+def check_local_model_for_update(selected_model):
+    """
+    Compares the existing local model with the remote ones, to identify if a new version is available for download,
+    by checking the checksums.
+    """
+    return check_local_models_for_update([selected_model])
 
-    return cloud_diagnoses_list
+
+def get_available_cloud_diagnoses_list(offline: bool = False) -> List[List[str]]:
+    """
+    Lists all available diagnoses from the cloud catalog, fetched at most once per session (or time-to-live period).
+    In offline mode, the last known catalog is returned without accessing the network.
+    """
+    return CloudCatalog.getInstance().get_rows('diagnoses', offline=offline)
+
+
+def get_diagnosis_config_cache_filename(diagnosis_name: str) -> str:
+    """
+    Location of the cached configuration file for the given diagnosis name.
+    """
+    return os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
+                        str('_'.join(diagnosis_name.split(']')[:-1]).replace('[', '').replace('/', '-')) + '.json')
 
 
 def check_local_diagnosis_for_update(selected_diagnosis):
-    diagnosis_url = ''
-    diagnosis_dependencies = []
-    diagnosis_md5sum = None
-    diagnosis_pipeline_url = ''
     download_required = False
-    cloud_diagnoses = get_available_cloud_diagnoses_list()
     try:
-        for diagnosis in cloud_diagnoses:
-            if diagnosis[0] == selected_diagnosis:
-                diagnosis_url = diagnosis[1]
-                diagnosis_dependencies = diagnosis[2].split(';') if diagnosis[2].strip() != '' else []
-                diagnosis_md5sum = diagnosis[3]
-                diagnosis_pipeline_url = diagnosis[4]
+        diagnosis_entry = CloudCatalog.getInstance().get_entry('diagnoses', selected_diagnosis)
+        if diagnosis_entry is None:
+            raise ValueError('Diagnosis {} not found in the cloud catalog.'.format(selected_diagnosis))
+        diagnosis_url = diagnosis_entry['url']
+        diagnosis_dependencies = diagnosis_entry['dependencies']
+        diagnosis_md5sum = diagnosis_entry['checksum']
+        diagnosis_pipeline_url = diagnosis_entry['config_url']
 
         json_local_dir = SharedResources.getInstance().json_local_dir
-        dl_dest = os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
-                                       str('_'.join(selected_diagnosis.split(']')[:-1]).replace('[', '').replace('/', '-'))
-                                       + '.json')
-        gdown.cached_download(url=diagnosis_url, path=dl_dest, md5=diagnosis_md5sum)
+        dl_dest = get_diagnosis_config_cache_filename(selected_diagnosis)
+        fetch_config_file(url=diagnosis_url, destination=dl_dest, md5=diagnosis_md5sum)
         shutil.copy(src=dl_dest, dst=os.path.join(json_local_dir, os.path.basename(dl_dest)))
 
         diagnosis_dir = SharedResources.getInstance().diagnosis_path
         dl_dest = os.path.join(diagnosis_dir,
                                str('_'.join(selected_diagnosis.split(']')[:-1]).replace('[', '').replace('/', '-'))
                                + '.json')
-        gdown.cached_download(url=diagnosis_pipeline_url, path=dl_dest)
+        fetch_config_file(url=diagnosis_pipeline_url, destination=dl_dest)
 
         # Checking if dependencies must be updated.
         if len(diagnosis_dependencies) > 0:
-            for dep in diagnosis_dependencies:
-                download_required_dep = check_local_model_for_update(dep)
-                download_required = download_required or download_required_dep
+            download_required = check_local_models_for_update(diagnosis_dependencies)
     except Exception as e:
         print('Impossible to check update for the selected cloud diagnosis.\n')
         print('{}'.format(traceback.format_exc()))
@@ -251,31 +349,30 @@ def check_local_diagnosis_for_update(selected_diagnosis):
 
 
 def download_cloud_diagnosis(selected_diagnosis):
-    diagnosis_url = ''
-    diagnosis_dependencies = []
-    diagnosis_checksum = None
     tmp_archive_dir = ''
     success = True
-    cloud_diagnoses = get_available_cloud_diagnoses_list()
     try:
-        for diagnosis in cloud_diagnoses:
-            if diagnosis[0] == selected_diagnosis:
-                diagnosis_url = diagnosis[1]
-                diagnosis_dependencies = diagnosis[2].split(';') if diagnosis[2].strip() != '' else []
-                diagnosis_checksum = diagnosis[3]
+        diagnosis_entry = CloudCatalog.getInstance().get_entry('diagnoses', selected_diagnosis)
+        if diagnosis_entry is None:
+            raise ValueError('Diagnosis {} not found in the cloud catalog.'.format(selected_diagnosis))
+        diagnosis_url = diagnosis_entry['url']
+        diagnosis_dependencies = diagnosis_entry['dependencies']
+        diagnosis_checksum = diagnosis_entry['checksum']
 
         json_local_dir = SharedResources.getInstance().json_local_dir
-        dl_dest = os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
-                                       str('_'.join(selected_diagnosis.split(']')[:-1]).replace('[', '').replace('/', '-'))
-                                       + '.json')
-        gdown.cached_download(url=diagnosis_url, path=dl_dest, md5=diagnosis_checksum)
+        dl_dest = get_diagnosis_config_cache_filename(selected_diagnosis)
+        fetch_config_file(url=diagnosis_url, destination=dl_dest, md5=diagnosis_checksum)
         shutil.copy(src=dl_dest, dst=os.path.join(json_local_dir, os.path.basename(dl_dest)))
 
+        diagnosis_dir = SharedResources.getInstance().diagnosis_path
+        dl_dest = os.path.join(diagnosis_dir,
+                               str('_'.join(selected_diagnosis.split(']')[:-1]).replace('[', '').replace('/', '-'))
+                               + '_pipeline.json')
+        fetch_config_file(url=diagnosis_entry['config_url'], destination=dl_dest)
+
         # Checking if dependencies are needed and if they exist already locally, otherwise triggers a download
         if len(diagnosis_dependencies) > 0:
-            for dep in diagnosis_dependencies:
-                success_dep = download_cloud_model(dep)
-                success = success & success_dep
+            success = download_cloud_models(diagnosis_dependencies)
     except Exception as e:
         print('Impossible to download the selected cloud model.\n')
         print('{}'.format(traceback.format_exc()))
@@ -291,9 +388,14 @@ class WorkerFinishedSignal(qt.QObject):
 
 class DownloadWorker(qt.QObject): #qt.QThread
     finished_signal = qt.Signal(bool)
+    progress_signal = qt.Signal(str)
 
     def __init__(self):
         super(qt.QObject, self).__init__()
+        self.poll_interval = 250  # In milliseconds
+        self.docker_thread = None
+        self.docker_result = False
+        self.docker_progress = None  # Last output line of the Docker client, written by the worker thread
 
     def onWorkerStart(self, model=None, diagnosis=None, docker_image=None):
         try:
@@ -307,150 +409,44 @@ class DownloadWorker(qt.QObject): #qt.QThread
             self.finished_signal.emit(False)
 
     def download_cloud_model(self, selected_model):
-        model_url = ''
-        model_dependencies = []
-        model_checksum = None
-        model_config_url = None
-        tmp_archive_dir = ''
-        success = True
-        download_state = False
-        extract_state = False
-        cloud_models = get_available_cloud_models_list()
-        try:
-            for model in cloud_models:
-                if model[0] == selected_model:
-                    model_url = model[1]
-                    model_dependencies = model[2].split(';') if model[2].strip() != '' else []
-                    model_checksum = model[3]
-                    model_config_url = model[4]
-
-            model_dest_dir = SharedResources.getInstance().model_path
-            json_local_dir = SharedResources.getInstance().json_local_dir
-            json_cloud_dir = SharedResources.getInstance().json_cloud_dir
-            archive_dl_dest = os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
-                                           str('_'.join(selected_model.split(']')[:-1]).replace('[', '').replace('/',
-                                                                                                                 '-'))
-                                           + '.zip')
-            os.makedirs(os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache'), exist_ok=True)
-            gdown.cached_download(url=model_config_url,
-                                  path=os.path.join(SharedResources.getInstance().json_local_dir, '_'.join(selected_model[1:-1].split('][')) + '.json'))
-
-            if not os.path.exists(archive_dl_dest) or hashlib.md5(open(archive_dl_dest, 'rb').read()).hexdigest() != model_checksum:
-                download_state = True
-
-            if download_state:
-                headers = {}
-
-                response = requests.get(model_url, headers=headers, stream=True)
-                response.raise_for_status()
-
-                if response.status_code == requests.codes.ok:
-                    with open(archive_dl_dest, "wb") as f:
-                        for chunk in response.iter_content(chunk_size=1048576):
-                            f.write(chunk)
-                    extract_state = True
-            else:
-                zip_content = zipfile.ZipFile(archive_dl_dest).namelist()
-                for f in zip_content:
-                    if not os.path.exists(os.path.join(model_dest_dir, f)):
-                        extract_state = True
-
-            if extract_state:
-                with zipfile.ZipFile(archive_dl_dest, 'r') as zip_ref:
-                    zip_ref.extractall(model_dest_dir)
-
-            # Checking if dependencies are needed, and if they exist already locally
-            if len(model_dependencies) > 0:
-                for dep in model_dependencies:
-                    success_dep = download_cloud_model(dep)
-                    success = success & success_dep
-        except Exception as e:
-            print('Impossible to download the selected cloud model.\n')
-            print('{}'.format(traceback.format_exc()))
-            success = False
-            if os.path.exists(tmp_archive_dir):
-                shutil.rmtree(tmp_archive_dir)
-
+        success = download_cloud_model(selected_model)
         self.finished_signal.emit(success)
-        # return success
 
     def download_cloud_diagnosis2(self, selected_diagnosis):
-        diagnosis_url = ''
-        diagnosis_dependencies = []
-        diagnosis_md5sum = None
-        diagnosis_pipeline_url = ''
-        tmp_archive_dir = ''
-        success = True
-        cloud_diagnoses = get_available_cloud_diagnoses_list()
-        try:
-            for diagnosis in cloud_diagnoses:
-                if diagnosis[0] == selected_diagnosis:
-                    diagnosis_url = diagnosis[1]
-                    diagnosis_dependencies = diagnosis[2].split(';') if diagnosis[2].strip() != '' else []
-                    diagnosis_md5sum = diagnosis[3]
-                    diagnosis_pipeline_url = diagnosis[4]
-
-                json_local_dir = SharedResources.getInstance().json_local_dir
-                dl_dest = os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
-                                       str('_'.join(selected_diagnosis.split(']')[:-1]).replace('[', '').replace('/',
-                                                                                                                 '-'))
-                                       + '.json')
-                gdown.cached_download(url=diagnosis_url, path=dl_dest, md5=diagnosis_md5sum)
-                shutil.copy(src=dl_dest, dst=os.path.join(json_local_dir, os.path.basename(dl_dest)))
-
-                diagnosis_dir = SharedResources.getInstance().diagnosis_path
-                dl_dest = os.path.join(diagnosis_dir,
-                                       str('_'.join(selected_diagnosis.split(']')[:-1]).replace('[', '').replace('/',
-                                                                                                                 '-'))
-                                       + '_pipeline.json')
-                gdown.cached_download(url=diagnosis_pipeline_url, path=dl_dest)
-
-            # Checking if dependencies are needed and if they exist already locally, otherwise triggers a download
-            if len(diagnosis_dependencies) > 0:
-                for dep in diagnosis_dependencies:
-                    success_dep = download_cloud_model(dep)
-                    success = success & success_dep
-        except Exception as e:
-            print('Impossible to download the selected cloud model.\n')
-            print('{}'.format(traceback.format_exc()))
-            success = False
-            if os.path.exists(tmp_archive_dir):
-                shutil.rmtree(tmp_archive_dir)
+        success = download_cloud_diagnosis(selected_diagnosis)
         self.finished_signal.emit(success)
-        # return success
 
     def download_docker_image(self, select_image):
-        # @TODO. If the download is slow, no info is printed on screen, might make the user wonder what is happening...
-        cmd_docker = ['docker', 'image', 'pull', select_image]
-        p = subprocess.Popen(cmd_docker, stdout=subprocess.PIPE)
-        res_lines = ""
-        while True:
-            slicer.app.processEvents()
-            line = p.stdout.readline().decode("utf-8")
-            if not line:
-                break
-            res_lines = res_lines + '/n' + line
-        # cmd_docker = ['docker', 'image', 'inspect', select_image]
-        # p = subprocess.Popen(cmd_docker, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        # # res_lines = ""
-        # # while True:
-        # #     slicer.app.processEvents()
-        # #     line = p.stderr.readline().decode("utf-8")
-        # #     if not line:
-        # #         break
-        # #     res_lines = res_lines + '/n' + line
-        # #
-        # # # If the image could not be downloaded -- abort
-        # # if 'Error: No such image' in res_lines:
-        # #     result = False
-        # # else:
-        # #     result = True
-        #
-        # stdout, stderr = p.communicate()
-        # # If the image could not be downloaded -- abort
-        # if 'Error: No such image' in stderr.decode("utf-8"):
-        #     result = False
-        # else:
-        #     result = True
-
-        self.finished_signal.emit(True)
+        """
+        Loads or pulls the Docker image on a worker thread, the progress and the outcome being signaled on the main
+        thread by polling.
+        """
+        if self.docker_thread is not None and self.docker_thread.is_alive():
+            return
+        docker_path = SharedResources.getInstance().docker_path
+        self.docker_result = False
+        self.docker_progress = None
+
+        def ensure():
+            self.docker_result = ensure_docker_image(docker_path if docker_path is not None else 'docker',
+                                                     select_image,
+                                                     cache_dir=SharedResources.getInstance().docker_image_cache_dir,
+                                                     progress_callback=self.__on_docker_progress)
+
+        self.docker_thread = threading.Thread(target=ensure)
+        self.docker_thread.daemon = True
+        self.docker_thread.start()
+        qt.QTimer.singleShot(self.poll_interval, self.__poll_docker_image)
+
+    def __on_docker_progress(self, line):
+        self.docker_progress = line
+
+    def __poll_docker_image(self):
+        progress = self.docker_progress
+        if progress is not None:
+            self.docker_progress = None
+            self.progress_signal.emit(progress)
+        if self.docker_thread.is_alive():
+            qt.QTimer.singleShot(self.poll_interval, self.__poll_docker_image)
+            return
+        self.finished_signal.emit(self.docker_result)
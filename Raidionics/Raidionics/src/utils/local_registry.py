@@ -0,0 +1,156 @@
+import os
+import json
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from typing import List
+
+from src.utils.resources import SharedResources
+
+
+class LocalRegistry:
+    """
+    Singleton class indexing the local model and diagnosis configuration files (json_local_dir). The parsed
+    configurations are kept in a single index file together with the size and modification time of each file, such
+    that a refresh only parses the files added or modified since. Lookups go through in-memory indexes by name, task,
+    and target.
+    """
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if LocalRegistry.__instance == None:
+            LocalRegistry()
+        return LocalRegistry.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if LocalRegistry.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            LocalRegistry.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.index_filename = os.path.join(SharedResources.getInstance().Raidionics_dir, '.cache',
+                                           'local_registry.json')
+        self.entries = None  # Config filename -> {'size', 'mtime_ns', 'config'}, loaded upon first use
+        self.by_name = dict()
+        self.by_task = dict()
+        self.by_target = dict()
+        self.lock = threading.RLock()
+
+    def refresh(self) -> bool:
+        """
+        Synchronizes the registry with the configuration files on disk, only parsing the new or modified ones.
+
+        Returns
+        -------
+        True if the registry content changed, False otherwise.
+        """
+        with self.lock:
+            if self.entries is None:
+                self.entries = self.__read_index()
+                self.__build_indexes()
+            changed = False
+            on_disk = dict()
+            json_local_dir = SharedResources.getInstance().json_local_dir
+            if os.path.isdir(json_local_dir):
+                with os.scandir(json_local_dir) as it:
+                    for entry in it:
+                        if entry.is_file() and entry.name.endswith('.json'):
+                            on_disk[entry.name] = entry.stat()
+
+            for filename in [x for x in self.entries.keys() if x not in on_disk.keys()]:
+                del self.entries[filename]
+                changed = True
+            for filename, stats in on_disk.items():
+                record = self.entries.get(filename, None)
+                if record is not None and record['size'] == stats.st_size and record['mtime_ns'] == stats.st_mtime_ns:
+                    continue
+                try:
+                    with open(os.path.join(json_local_dir, filename), 'r') as infile:
+                        config = json.load(infile, object_pairs_hook=OrderedDict)
+                    self.entries[filename] = {'size': stats.st_size, 'mtime_ns': stats.st_mtime_ns, 'config': config}
+                except Exception:
+                    logging.warning("Unable to parse the local configuration {}.".format(filename))
+                    logging.warning(traceback.format_exc())
+                    if filename in self.entries.keys():
+                        del self.entries[filename]
+                changed = True
+
+            if changed:
+                self.__build_indexes()
+                self.__write_index()
+            return changed
+
+    def get_configs(self, task: str = None, target: str = None) -> List[dict]:
+        """
+        Lists the local configurations, sorted by filename, optionally filtered by task and target.
+        The returned configurations are shared, and should not be modified.
+
+        Parameters
+        ----------
+        task: str
+            Task of the configurations, e.g. Segmentation or Diagnosis. Not filtered if None.
+        target: str
+            Target of the configurations, e.g. Tumor. Not filtered if None.
+        """
+        with self.lock:
+            if self.entries is None:
+                self.refresh()
+            if task is None and target is None:
+                return [self.entries[x]['config'] for x in sorted(self.entries.keys())]
+            filenames = set(self.entries.keys())
+            if task is not None:
+                filenames = filenames.intersection(self.by_task.get(str(task), []))
+            if target is not None:
+                filenames = filenames.intersection(self.by_target.get(str(target), []))
+            return [self.entries[x]['config'] for x in sorted(filenames)]
+
+    def get_config(self, name: str) -> dict:
+        """
+        Looks up a local configuration by its unique name, or None if not found.
+        """
+        with self.lock:
+            if self.entries is None:
+                self.refresh()
+            filename = self.by_name.get(name, None)
+            return self.entries[filename]['config'] if filename is not None else None
+
+    def get_names(self, task: str = None) -> List[str]:
+        return [x.get('name', '') for x in self.get_configs(task=task) if isinstance(x, dict)]
+
+    def __build_indexes(self) -> None:
+        self.by_name = dict()
+        self.by_task = dict()
+        self.by_target = dict()
+        for filename in sorted(self.entries.keys()):
+            config = self.entries[filename]['config']
+            if not isinstance(config, dict):
+                continue
+            if 'name' in config.keys() and config['name'] not in self.by_name.keys():
+                self.by_name[config['name']] = filename
+            self.by_task.setdefault(str(config.get('task', None)), []).append(filename)
+            self.by_target.setdefault(str(config.get('target', None)), []).append(filename)
+
+    def __read_index(self) -> OrderedDict:
+        if not os.path.exists(self.index_filename):
+            return OrderedDict()
+        try:
+            with open(self.index_filename, 'r') as infile:
+                return json.load(infile, object_pairs_hook=OrderedDict)
+        except Exception:
+            return OrderedDict()
+
+    def __write_index(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.index_filename), exist_ok=True)
+            with open(self.index_filename + '.tmp', 'w') as outfile:
+                json.dump(self.entries, outfile)
+            os.replace(self.index_filename + '.tmp', self.index_filename)
+        except Exception:
+            logging.warning("Unable to write the local registry index.")
+            logging.warning(traceback.format_exc())
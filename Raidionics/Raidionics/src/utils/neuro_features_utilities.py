@@ -0,0 +1,164 @@
+import numpy as np
+import SimpleITK as sitk
+
+# Connected components smaller than this volume (in ml) are not counted as tumor foci
+MINIMUM_FOCUS_VOLUME = 0.1
+
+
+def get_voxels_ras_x(mask: np.ndarray, ijk_to_ras: np.ndarray) -> np.ndarray:
+    """
+    Computes the right-left physical coordinate (RAS, larger values towards the patient's right) of every voxel inside
+    the mask.
+
+    Parameters
+    ----------
+    mask: np.ndarray
+        Binary volume, indexed as [k, j, i] (e.g., from slicer.util.arrayFromVolume).
+    ijk_to_ras: np.ndarray
+        4x4 matrix mapping the voxel indices to the RAS physical space.
+    """
+    k, j, i = np.nonzero(mask)
+    return ijk_to_ras[0, 0] * i + ijk_to_ras[0, 1] * j + ijk_to_ras[0, 2] * k + ijk_to_ras[0, 3]
+
+
+def compute_midline_position(ijk_to_ras: np.ndarray, shape: tuple, brain_mask: np.ndarray = None) -> float:
+    """
+    Estimates the right-left position of the midsagittal plane as the centroid of the brain mask, or as the center of
+    the volume if no brain mask is available.
+    """
+    if brain_mask is not None and brain_mask.shape == tuple(shape) and np.count_nonzero(brain_mask) != 0:
+        return float(np.mean(get_voxels_ras_x(brain_mask > 0, ijk_to_ras)))
+    center = np.array([(shape[2] - 1) / 2., (shape[1] - 1) / 2., (shape[0] - 1) / 2., 1.])
+    return float(np.dot(ijk_to_ras[0], center))
+
+
+def compute_tumor_features(tumor_mask: np.ndarray, spacing: tuple, ijk_to_ras: np.ndarray,
+                           brain_mask: np.ndarray = None) -> dict:
+    """
+    Computes, in patient space, the tumor features of the clinical report which do not need the registration to the
+    MNI space: volume, laterality, midline crossing and multifocality.
+
+    Parameters
+    ----------
+    tumor_mask: np.ndarray
+        Tumor label volume, indexed as [k, j, i]. Any non-zero voxel belongs to the tumor.
+    spacing: tuple
+        Voxel spacing in mm, ordered as (i, j, k).
+    ijk_to_ras: np.ndarray
+        4x4 matrix mapping the voxel indices to the RAS physical space.
+    brain_mask: np.ndarray
+        Brain label volume kept from the last run, on the same voxel grid, used to locate the midline.
+
+    Returns
+    -------
+    Dictionary with the volume (ml), the left and right laterality (%), the midline crossing state, the number of
+    foci, and the largest distance (mm) between the main focus and the other ones (-1 if a single focus).
+    """
+    tumor = tumor_mask > 0
+    voxel_volume = float(np.prod(spacing)) / 1000.
+    voxel_count = int(np.count_nonzero(tumor))
+    features = {'volume': voxel_count * voxel_volume, 'left_laterality': 0., 'right_laterality': 0.,
+                'midline_crossing': False, 'parts': 0, 'multifocal_distance': -1.}
+    if voxel_count == 0:
+        return features
+
+    midline = compute_midline_position(ijk_to_ras, tumor.shape, brain_mask)
+    right_count = int(np.count_nonzero(get_voxels_ras_x(tumor, ijk_to_ras) > midline))
+    features['right_laterality'] = 100. * right_count / voxel_count
+    features['left_laterality'] = 100. - features['right_laterality']
+    features['midline_crossing'] = 0 < right_count < voxel_count
+
+    tumor_image = sitk.GetImageFromArray(tumor.astype(np.uint8))
+    tumor_image.SetSpacing([float(x) for x in spacing])
+    minimum_size = int(np.ceil(MINIMUM_FOCUS_VOLUME / voxel_volume))
+    # Components relabelled by decreasing size, the main focus being label 1
+    foci = sitk.RelabelComponent(sitk.ConnectedComponent(tumor_image), minimumObjectSize=minimum_size)
+    # A tumor smaller than the minimum focus volume still counts as a single focus (i.e., the largest component)
+    features['parts'] = max(1, int(np.max(sitk.GetArrayViewFromImage(foci))))
+    if features['parts'] > 1:
+        main_focus_distance = sitk.SignedMaurerDistanceMap(foci == 1, insideIsPositive=False, squaredDistance=False,
+                                                           useImageSpacing=True)
+        statistics = sitk.LabelStatisticsImageFilter()
+        statistics.Execute(main_focus_distance, foci)
+        features['multifocal_distance'] = max([statistics.GetMinimum(x) for x in range(2, features['parts'] + 1)])
+    return features
+
+
+def index_atlas_structures(atlas: np.ndarray) -> tuple:
+    """
+    Groups the voxels of an atlas label map by structure, once, such that the statistics of all the structures are
+    later obtained by segmented reductions over a single array.
+
+    Returns
+    -------
+    Tuple of numpy arrays (structure labels in increasing order, flat indices of the structure voxels sorted by
+    label, start position of each structure within the sorted indices).
+    """
+    flat_atlas = atlas.ravel().astype(np.int64)
+    voxels = np.flatnonzero(flat_atlas > 0)
+    voxels = voxels[np.argsort(flat_atlas[voxels], kind='stable')]
+    sorted_labels = flat_atlas[voxels]
+    if len(sorted_labels) == 0:
+        return sorted_labels, voxels, np.zeros(0, dtype=np.int64)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(sorted_labels)) + 1])
+    return sorted_labels[starts], voxels, starts
+
+
+def compute_structures_overlap(tumor_mask: np.ndarray, atlas: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """
+    Computes, for every structure of an atlas label map on the same voxel grid as the tumor, the percentage of the
+    tumor volume lying inside the structure, with a single count over the tumor voxels.
+
+    Parameters
+    ----------
+    tumor_mask: np.ndarray
+        Tumor label volume. Any non-zero voxel belongs to the tumor.
+    atlas: np.ndarray
+        Atlas label map, on the same voxel grid.
+    labels: np.ndarray
+        Structure labels to report, e.g. from index_atlas_structures.
+
+    Returns
+    -------
+    Numpy array of the overlap percentages, in the order of labels.
+    """
+    tumor = tumor_mask > 0
+    voxel_count = np.count_nonzero(tumor)
+    if voxel_count == 0 or len(labels) == 0:
+        return np.zeros(len(labels))
+    counts = np.bincount(atlas[tumor].astype(np.int64), minlength=int(np.max(labels)) + 1)
+    return 100. * counts[labels] / voxel_count
+
+
+def compute_structures_distance(tumor_mask: np.ndarray, spacing: tuple, atlas_index: tuple) -> np.ndarray:
+    """
+    Computes, for every structure of an atlas, the shortest distance (mm) between the tumor and the structure, from a
+    single distance map of the tumor sampled at the structure voxels. Structures overlapping the tumor are at a
+    distance of 0.
+
+    Parameters
+    ----------
+    tumor_mask: np.ndarray
+        Tumor label volume. Any non-zero voxel belongs to the tumor.
+    spacing: tuple
+        Voxel spacing in mm, ordered as (i, j, k).
+    atlas_index: tuple
+        Structures of the atlas, on the same voxel grid, as given by index_atlas_structures.
+
+    Returns
+    -------
+    Numpy array of the distances, in the order of the atlas_index labels, -1 everywhere if the tumor is empty.
+    """
+    labels, voxels, starts = atlas_index
+    if len(labels) == 0:
+        return np.zeros(0)
+    if np.count_nonzero(tumor_mask) == 0:
+        return -np.ones(len(labels))
+
+    tumor_image = sitk.GetImageFromArray((tumor_mask > 0).astype(np.uint8))
+    tumor_image.SetSpacing([float(x) for x in spacing])
+    # The distance image must outlive the array view on its buffer
+    distance_image = sitk.SignedMaurerDistanceMap(tumor_image, insideIsPositive=False, squaredDistance=False,
+                                                  useImageSpacing=True)
+    distance = sitk.GetArrayViewFromImage(distance_image)
+    return np.maximum(np.minimum.reduceat(distance.ravel()[voxels], starts), 0.)
@@ -0,0 +1,115 @@
+"""
+Mirrors the upstream catalogs, configuration files, and model archives into a repository folder, to be served to the
+workstations from a network share or a LAN http server (e.g., python -m http.server), and set as root in the
+[Repository] section of their user settings (~/.raidionics-slicer/user_settings.ini).
+Running the tool again only fetches the archives which changed upstream.
+
+Usage, from the Raidionics module folder (outside of 3D Slicer):
+    python -m src.utils.repository_mirror --output /srv/raidionics-repository
+"""
+import os
+import re
+import csv
+import argparse
+import traceback
+from typing import List
+
+from src.utils.cloud_catalog import CloudCatalog, UPSTREAM_CATALOG_URLS
+from src.utils.archive_utilities import is_archive_up_to_date, record_archive_checksum
+from src.utils.download_utilities import download_file
+from src.utils.repository_utilities import CATALOG_RELATIVE_LOCATIONS, fetch_repository_file
+
+
+def get_item_basename(name: str) -> str:
+    """
+    File name for a catalog item, e.g. MRI_Brain for [MRI][Brain].
+    """
+    return re.sub(r'[^\w\-]+', '_', '_'.join(name.strip('[]').split(']['))).strip('_')
+
+
+def mirror_catalog(kind: str, output_dir: str, item_names: List[str] = None, num_connections: int = 4) -> int:
+    """
+    Mirrors one catalog and the files it links to, rewriting the links as relative to the repository root.
+    The catalog itself is written last, such that the workstations never see links to files not mirrored yet. The
+    items which could not be mirrored keep their upstream links.
+
+    Parameters
+    ----------
+    kind: str
+        Catalog to mirror, between models and diagnoses.
+    output_dir: str
+        Root folder of the repository.
+    item_names: List[str]
+        Subset of items to mirror, all items if None.
+    num_connections: int
+        Number of parallel connections used to download each archive.
+
+    Returns
+    -------
+    The number of items which could not be mirrored.
+    """
+    catalog_filename = os.path.join(output_dir, *CATALOG_RELATIVE_LOCATIONS[kind].split('/'))
+    os.makedirs(os.path.dirname(catalog_filename), exist_ok=True)
+    download_file(UPSTREAM_CATALOG_URLS[kind], catalog_filename + '.upstream')
+    with open(catalog_filename + '.upstream', 'r') as infile:
+        rows = [x for x in csv.reader(infile, delimiter=',') if len(x) != 0]
+    os.remove(catalog_filename + '.upstream')
+
+    failures = 0
+    mirrored_rows = [rows[0]] if len(rows) != 0 else []
+    for row in rows[1:]:
+        entry = CloudCatalog.parse_row(row)
+        if item_names is not None and entry['name'] not in item_names:
+            mirrored_rows.append(row)
+            continue
+        basename = get_item_basename(entry['name'])
+        if kind == 'models':
+            links = ['archives/' + basename + '.zip', 'configs/' + basename + '.json']
+        else:
+            links = ['diagnoses/' + basename + '.json', 'diagnoses/' + basename + '_pipeline.json']
+        try:
+            print('Mirroring {}.'.format(entry['name']))
+            for url, link, md5 in [(entry['url'], links[0], entry['checksum']), (entry['config_url'], links[1], None)]:
+                if url == '':
+                    continue
+                destination = os.path.join(output_dir, *link.split('/'))
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                if md5 is not None and md5.strip() != '' and is_archive_up_to_date(destination, md5):
+                    continue
+                digest = fetch_repository_file(url, destination, expected_md5=md5, num_connections=num_connections)
+                if md5 is not None:
+                    record_archive_checksum(destination, digest)
+            mirrored_rows.append([row[0], links[0]] + row[2:4] + [links[1] if entry['config_url'] != '' else ''])
+        except Exception:
+            print('Unable to mirror {}, the upstream links are kept.'.format(entry['name']))
+            print(traceback.format_exc())
+            mirrored_rows.append(row)
+            failures += 1
+
+    with open(catalog_filename + '.part', 'w', newline='') as outfile:
+        csv.writer(outfile, delimiter=',').writerows(mirrored_rows)
+    os.replace(catalog_filename + '.part', catalog_filename)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mirrors the Raidionics catalogs, configuration files, and model '
+                                                 'archives into a local or LAN repository.')
+    parser.add_argument('--output', required=True, help='Root folder of the repository.')
+    parser.add_argument('--kinds', nargs='+', default=['models', 'diagnoses'], choices=['models', 'diagnoses'],
+                        help='Catalogs to mirror.')
+    parser.add_argument('--items', nargs='+', default=None, help='Subset of item names to mirror, all if omitted.')
+    parser.add_argument('--connections', type=int, default=4, help='Parallel connections per archive download.')
+    args = parser.parse_args()
+
+    failures = 0
+    for kind in args.kinds:
+        failures += mirror_catalog(kind, os.path.abspath(args.output), item_names=args.items,
+                                   num_connections=args.connections)
+    if failures != 0:
+        print('{} item(s) could not be mirrored.'.format(failures))
+    return 0 if failures == 0 else 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,100 @@
+import os
+import hashlib
+from urllib.parse import urljoin, urlparse
+from urllib.request import url2pathname
+
+from src.utils.resources import SharedResources
+from src.utils.download_utilities import download_file_segmented
+
+# Location of the catalogs inside a repository, as laid out by the mirror tool (see repository_mirror.py)
+CATALOG_RELATIVE_LOCATIONS = {'models': 'catalog/cloud_models_list.csv',
+                              'diagnoses': 'catalog/cloud_diagnoses_list.csv'}
+
+
+def get_repository_root() -> str:
+    """
+    Root of the repository serving the catalogs, configuration files, and model archives, either a local folder
+    (e.g., a network share) or a http(s) url. An empty string stands for the upstream cloud storage.
+    """
+    return getattr(SharedResources.getInstance(), 'repository_root', '')
+
+
+def is_remote_location(location: str) -> bool:
+    return location.startswith('http://') or location.startswith('https://')
+
+
+def resolve_repository_location(link: str, root: str = None) -> str:
+    """
+    Resolves a link found in a catalog against the repository root, such that a mirror can list relative links.
+    Absolute urls and paths are returned untouched.
+
+    Parameters
+    ----------
+    link: str
+        Link as written in the catalog, absolute or relative to the repository root.
+    root: str
+        Repository root to resolve against, the one from the user settings if None.
+
+    Returns
+    -------
+    A http(s) url or a local path.
+    """
+    link = link.strip()
+    if link.startswith('file://'):
+        return url2pathname(urlparse(link).path)
+    if link == '' or is_remote_location(link) or os.path.isabs(link):
+        return link
+    root = get_repository_root() if root is None else root
+    if root == '':
+        return link
+    if is_remote_location(root):
+        return urljoin(root.rstrip('/') + '/', link)
+    return os.path.join(root, *link.split('/'))
+
+
+def get_catalog_location(kind: str, upstream_url: str) -> str:
+    """
+    Location of the catalog for the given kind, in the configured repository, or upstream if none is configured.
+    """
+    if get_repository_root() == '':
+        return upstream_url
+    return resolve_repository_location(CATALOG_RELATIVE_LOCATIONS[kind])
+
+
+def fetch_repository_file(location: str, destination: str, expected_md5: str = None, num_connections: int = 1,
+                          chunk_size: int = 1048576) -> str:
+    """
+    Retrieves a file from the repository, by copying it when the repository is a local folder, or by downloading it
+    otherwise. The destination file is only (atomically) replaced once the content is complete and the checksum matches.
+
+    Parameters
+    ----------
+    location: str
+        Resolved location of the file, as given by resolve_repository_location.
+    destination: str
+        Final location of the file on disk.
+    expected_md5: str
+        Hexadecimal md5 digest the content must match, if provided.
+    num_connections: int
+        Number of parallel connections, when downloading.
+
+    Returns
+    -------
+    Hexadecimal md5 digest of the retrieved file.
+    """
+    if is_remote_location(location):
+        return download_file_segmented(location, destination, expected_md5=expected_md5,
+                                       num_connections=num_connections, chunk_size=chunk_size)
+
+    part_filename = destination + '.part'
+    md5 = hashlib.md5()
+    with open(location, 'rb') as infile, open(part_filename, 'wb') as outfile:
+        for chunk in iter(lambda: infile.read(chunk_size), b''):
+            outfile.write(chunk)
+            md5.update(chunk)
+    digest = md5.hexdigest()
+    if expected_md5 is not None and expected_md5.strip() != '' and digest != expected_md5:
+        os.remove(part_filename)
+        raise ValueError('Checksum mismatch for {}: expected {}, got {}.'.format(location, expected_md5, digest))
+    os.replace(part_filename, destination)
+    return digest
@@ -1,6 +1,7 @@
 import os
 from os.path import expanduser
 import shutil
+import logging
 try:
     import configparser
 except:
@@ -39,10 +40,9 @@ class SharedResources:
         if not os.path.isdir(self.Raidionics_dir):
             os.mkdir(self.Raidionics_dir)
 
+        # Kept across sessions, such that the last known content can be displayed right away at startup
         self.json_cloud_dir = os.path.join(self.Raidionics_dir, 'json', 'cloud')
-        if os.path.isdir(self.json_cloud_dir):
-            shutil.rmtree(self.json_cloud_dir)
-        os.makedirs(self.json_cloud_dir)
+        os.makedirs(self.json_cloud_dir, exist_ok=True)
         self.json_cloud_info_file = "https://drive.google.com/uc?id=13-Mx1Os9eXB_bJBcJt_o9MXQrRI1xONi"
 
         self.json_local_dir = os.path.join(self.Raidionics_dir, 'json', 'local')
@@ -75,6 +75,74 @@ class SharedResources:
         self.docker_path = None
         self.__set_runtime_parameters()
         self.global_active_model_update = False
+        self.__set_user_settings()
+
+    def __set_user_settings(self):
+        """
+        Persistent settings, edited by hand (e.g., by the IT department when provisioning a workstation), and created
+        with the default values upon first use.
+        """
+        self.user_settings_filename = os.path.join(self.Raidionics_dir, 'user_settings.ini')
+        self.user_settings = configparser.ConfigParser()
+        self.user_settings['Cache'] = {}
+        # Seconds before the cloud catalogs are validated again against the remote
+        self.user_settings['Cache']['catalog_ttl'] = '3600'
+        # Deleting the model archives once their content is in the local store
+        self.user_settings['Cache']['prune_model_archives'] = 'False'
+        self.user_settings['Prefetch'] = {}
+        self.user_settings['Prefetch']['enabled'] = 'True'
+        # Seconds of idle time after startup before warming up the models and Docker images
+        self.user_settings['Prefetch']['idle_delay'] = '60'
+        # Semicolon-separated list of model and diagnosis names, the most used ones are taken if left empty
+        self.user_settings['Prefetch']['models'] = ''
+        self.user_settings['Prefetch']['diagnoses'] = ''
+        self.user_settings['Prefetch']['max_history_items'] = '3'
+        self.user_settings['Docker'] = {}
+        # Folder (local or network share) where the Docker images are exported as tarballs after being pulled, and
+        # loaded from when missing, before trying the registry. Not used if left empty.
+        self.user_settings['Docker']['image_cache_dir'] = ''
+        self.user_settings['Download'] = {}
+        # Parallel connections used to fetch the large model archives, 1 to always download with a single stream
+        self.user_settings['Download']['connections'] = '4'
+        self.user_settings['Repository'] = {}
+        # Local folder, or url of a LAN server, holding a mirror of the catalogs, configuration files, and model
+        # archives (see repository_mirror.py). The upstream cloud storage is used if left empty.
+        self.user_settings['Repository']['root'] = ''
+        try:
+            if os.path.exists(self.user_settings_filename):
+                self.user_settings.read(self.user_settings_filename)
+            with open(self.user_settings_filename, 'w') as outfile:
+                self.user_settings.write(outfile)
+        except Exception:
+            print("Unable to read the user settings from {}.".format(self.user_settings_filename))
+
+        self.cloud_catalog_ttl = self.__get_user_setting('Cache', 'catalog_ttl', 3600)
+        self.prune_model_archives = self.__get_user_setting('Cache', 'prune_model_archives', False)
+        self.prefetch_enabled = self.__get_user_setting('Prefetch', 'enabled', True)
+        self.prefetch_idle_delay = self.__get_user_setting('Prefetch', 'idle_delay', 60)
+        self.prefetch_models = [x.strip() for x in self.user_settings['Prefetch']['models'].split(';')
+                                if x.strip() != '']
+        self.prefetch_diagnoses = [x.strip() for x in self.user_settings['Prefetch']['diagnoses'].split(';')
+                                   if x.strip() != '']
+        self.prefetch_max_history_items = self.__get_user_setting('Prefetch', 'max_history_items', 3)
+        self.usage_history_filename = os.path.join(self.Raidionics_dir, 'usage_history.json')
+        self.docker_image_cache_dir = self.user_settings['Docker']['image_cache_dir'].strip()
+        self.download_connections = self.__get_user_setting('Download', 'connections', 4)
+        self.repository_root = self.user_settings['Repository']['root'].strip()
+
+    def __get_user_setting(self, section: str, key: str, default):
+        """
+        Reads a boolean or integer user setting, the type being the one of the default value. A malformed value (e.g.,
+        edited by hand) is reported, and the default value used instead.
+        """
+        try:
+            if isinstance(default, bool):
+                return self.user_settings[section].getboolean(key, fallback=default)
+            return self.user_settings[section].getint(key, fallback=default)
+        except ValueError:
+            logging.warning("Invalid value '{}' for the user setting [{}] {} in {}, using {} instead.".format(
+                self.user_settings[section].get(key), section, key, self.user_settings_filename, default))
+            return default
 
     def __set_runtime_parameters(self):
         # Most likely deprecated, as we moved from the seg backend to the rads one!
@@ -0,0 +1,91 @@
+import sys
+import time
+import logging
+from contextlib import contextmanager
+from collections import OrderedDict
+
+
+class StartupProfiler:
+    """
+    Singleton class timing the module startup: the execution cost of every module loaded for the first time while
+    profiling imports (inclusive of, and excluding, their own imports, similar to python -X importtime), and the cost
+    of each named setup step.
+    The report is logged once the widget setup is over, and can be retrieved with get_report().
+    """
+    __instance = None
+
+    @staticmethod
+    def getInstance():
+        """ Static access method. """
+        if StartupProfiler.__instance == None:
+            StartupProfiler()
+        return StartupProfiler.__instance
+
+    def __init__(self):
+        """ Virtually private constructor. """
+        if StartupProfiler.__instance != None:
+            raise Exception("This class is a singleton!")
+        else:
+            StartupProfiler.__instance = self
+            self.__init_base_variables()
+
+    def __init_base_variables(self):
+        self.imports = OrderedDict()  # Module name -> [inclusive seconds, self seconds]
+        self.steps = OrderedDict()  # Step name -> seconds
+
+    @contextmanager
+    def measure(self, step_name: str):
+        """
+        Times the enclosed block as a named setup step.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[step_name] = self.steps.get(step_name, 0.) + time.perf_counter() - start
+
+    @contextmanager
+    def profile_imports(self, step_name: str):
+        """
+        Times the enclosed block as a named setup step, and records the cost of each module executed for the first
+        time within it, from the module frames seen by a profile function. The profile function only applies to the
+        calling thread, and is removed once the block is over. Imports performed when 3D Slicer starts, before the
+        module is opened, are not covered: run 3D Slicer with PYTHONPROFILEIMPORTTIME=1 (python -X importtime) for
+        those.
+        """
+        previous_profile = sys.getprofile()
+        module_stack = []  # [frame, start time, seconds spent in nested modules]
+
+        def profile_modules(frame, event, arg):
+            if event == 'call' and frame.f_code.co_name == '<module>':
+                module_stack.append([frame, time.perf_counter(), 0.])
+            elif event == 'return' and module_stack and module_stack[-1][0] is frame:
+                _, start, children = module_stack.pop()
+                elapsed = time.perf_counter() - start
+                if module_stack:
+                    module_stack[-1][2] += elapsed
+                name = frame.f_globals.get('__name__', frame.f_code.co_filename)
+                if name not in self.imports.keys():
+                    self.imports[name] = [elapsed, elapsed - children]
+
+        sys.setprofile(profile_modules)
+        try:
+            with self.measure(step_name):
+                yield
+        finally:
+            sys.setprofile(previous_profile)
+
+    def get_report(self, max_imports: int = 20) -> str:
+        """
+        Formats the recorded timings, with the setup steps in execution order, and the most expensive imports first.
+        """
+        lines = ['Raidionics startup timings (seconds):', '  Setup steps:']
+        for step, elapsed in self.steps.items():
+            lines.append('    {:>8.3f}  {}'.format(elapsed, step))
+        lines.append('  Imports (inclusive, self), {} most expensive:'.format(max_imports))
+        for name, (inclusive, own) in sorted(self.imports.items(), key=lambda x: x[1][0], reverse=True)[:max_imports]:
+            lines.append('    {:>8.3f}  {:>8.3f}  {}'.format(inclusive, own, name))
+        return '\n'.join(lines)
+
+    def log_report(self) -> None:
+        logging.info(self.get_report())